@@ -0,0 +1,93 @@
+''' Benchmark of the union vs unpivot plans of the empty_null check
+
+Usage:
+    python bench/bench_empty_null.py                 # SQL generation only
+    python bench/bench_empty_null.py --execute       # also compile/execute in Snowflake
+    python bench/bench_empty_null.py --execute --columns 10,100,400 --rows 1000000
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib.generic_checks import GenericChecks
+
+PLANS = ['union', 'unpivot']
+
+
+def get_vars(target_table):
+    ''' Class variables as passed by the Detector (no INSERT so the SQL is a plain SELECT) '''
+    return {
+        'insert_sql': '',
+        'dq_run_hour': '2000-01-01 00:00:00',
+        'target_database_name': 'BENCH',
+        'target_schema_name': 'BENCH',
+        'target_table_name': 'BENCH',
+        'target_filter': '1=1',
+        'target_table': target_table,
+        'dq_key': 0,
+        'db_username': 'bench',
+        'unix_username': 'bench',
+        'env': 'NON-PROD',
+    }
+
+
+def gen_sql(plan, num_columns, target_table):
+    columns = ["c{i}".format(i=i) for i in range(1, num_columns + 1)]
+    return GenericChecks().empty_null('empty_null', 0, False, columns, False, 'bench',
+        get_vars(target_table), plan=plan)[0]
+
+
+def timed(fn, repeat=1):
+    ''' Best wall time of fn() in seconds '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark empty_null query plans")
+    parser.add_argument('--columns', default='10,50,100,200,400', help="Comma separated column counts")
+    parser.add_argument('--rows', type=int, default=1000000, help="Rows of the generated table (with --execute)")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeat each measure and keep the best")
+    parser.add_argument('--execute', action='store_true', help="Compile (EXPLAIN) and execute in Snowflake")
+    args = parser.parse_args()
+
+    column_counts = [int(n) for n in args.columns.split(',')]
+    target_table = 'bench_empty_null'
+
+    db = None
+    if args.execute:
+        from lib.snowflake import Snowflake
+        db = Snowflake()
+        db.use_cached_result(False)
+        # One wide table with ~5% nulls per column, reused for all column counts
+        cols = ",\n".join(
+            ["IFF(UNIFORM(0, 100, RANDOM()) < 5, NULL, SEQ4()) AS c{i}".format(i=i)
+             for i in range(1, max(column_counts) + 1)])
+        db.execute("CREATE TEMPORARY TABLE {t} AS SELECT {cols} FROM TABLE(GENERATOR(ROWCOUNT => {r}))".format(
+            t=target_table, cols=cols, r=args.rows))
+
+    print("{:>8s} {:>8s} {:>10s} {:>12s} {:>12s} {:>12s}".format(
+        'columns', 'plan', 'sql_bytes', 'gen_ms', 'compile_ms', 'execute_ms'))
+    for num_columns in column_counts:
+        for plan in PLANS:
+            sql = gen_sql(plan, num_columns, target_table)
+            gen_ms = timed(lambda: gen_sql(plan, num_columns, target_table), args.repeat) * 1000
+            compile_ms = execute_ms = float('nan')
+            if db is not None:
+                compile_ms = timed(lambda: db.query("EXPLAIN " + sql), args.repeat) * 1000
+                execute_ms = timed(lambda: db.query(sql), args.repeat) * 1000
+            print("{:>8d} {:>8s} {:>10d} {:>12.2f} {:>12.2f} {:>12.2f}".format(
+                num_columns, plan, len(sql), gen_ms, compile_ms, execute_ms))
+
+
+if __name__ == '__main__':
+    main()
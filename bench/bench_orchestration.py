@@ -0,0 +1,198 @@
+''' Benchmark of the orchestration paths (Detector, Watcher, Executor) on recorded interactions
+
+Usage:
+    python bench/bench_orchestration.py gen                  # SQL generation cost of the generic checks
+    python bench/bench_orchestration.py record --detector dq.yml --recording dq.jsonl --dq-run-hour '2024-01-01 00:00:00'
+    python bench/bench_orchestration.py replay --detector dq.yml --recording dq.jsonl --dq-run-hour '2024-01-01 00:00:00'
+    python bench/bench_orchestration.py replay --watcher watcher.yml --recording watcher.jsonl
+    python bench/bench_orchestration.py replay --etl etl.yml --recording etl.jsonl
+    python bench/bench_orchestration.py concurrency --recording dq.jsonl --workers 1,2,4,8
+
+The replay runs with no latency (orchestration overhead only) and the recorded latency (end-to-end),
+and concurrency replays all recorded statements with a number of workers (upper bound of the gain).
+'''
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib.generic_checks import GenericChecks
+from lib.replay import ReplayConnection, record
+
+# Latency scales of the replay (0 for the overhead of the library only)
+LATENCY_SCALES = [0.0, 1.0]
+
+
+def get_vars():
+    ''' Class variables as passed by the Detector '''
+    return {
+        'insert_sql': 'INSERT INTO BENCH.BENCH.dq_data_result',
+        'dq_run_hour': '2000-01-01 00:00:00',
+        'target_database_name': 'BENCH',
+        'target_schema_name': 'BENCH',
+        'target_table_name': 'BENCH',
+        'target_filter': '1=1',
+        'target_table': 'BENCH.BENCH.BENCH',
+        'target_partition_columns': ['dl_partition_year', 'dl_partition_month', 'dl_partition_day', 'dl_partition_hour'],
+        'target_date_columns': [],
+        'source_table': 'BENCH.BENCH.SOURCE',
+        'source_database_name': 'BENCH',
+        'source_schema_name': 'BENCH',
+        'source_table_name': 'SOURCE',
+        'source_filter': '1=1',
+        'dq_key': 0,
+        'dq_table': 'BENCH.BENCH.dq_data_result',
+        'dq_table_prod': 'BENCH.BENCH.dq_data_result',
+        'dq_state_table': 'BENCH.BENCH.dq_incremental_state',
+        'db_username': 'bench',
+        'unix_username': 'bench',
+        'env': 'NON-PROD',
+    }
+
+
+def gen_checks(num_columns):
+    ''' Generate the SQLs of each generic check (name, function) '''
+    columns = ["c{i}".format(i=i) for i in range(1, num_columns + 1)]
+    vars = get_vars()
+    return [
+        ('trending', lambda: GenericChecks().trending('trending', '0.1', False, ['count(*)'], False, '', vars)),
+        ('empty_null', lambda: GenericChecks().empty_null('empty_null', '0', False, columns, False, '', vars)),
+        ('unique', lambda: GenericChecks().unique('unique', '0', False, columns, False, '', vars)),
+        ('up_to_date', lambda: GenericChecks().up_to_date('up_to_date', '0', False, ['c1'], False, '', vars)),
+        ('day_to_day', lambda: GenericChecks().day_to_day('day_to_day', '0.1', False, ['count(*)'], False, '', vars,
+            'c1', 7, None)),
+        ('missing_dates', lambda: GenericChecks().missing_dates('missing_dates', '0', False, ['c1'], False, '', vars)),
+        ('profile', lambda: GenericChecks().profile('profile', '0', False, columns, False, '', vars)),
+        ('std_dev', lambda: GenericChecks().std_dev('std_dev', '1', False, ['count(*)'], False, '', vars)),
+    ]
+
+
+def timed(fn, repeat=1):
+    ''' Best wall time of fn() in seconds '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run_gen(args):
+    print("{:>14s} {:>8s} {:>10s} {:>12s}".format('check', 'columns', 'sql_bytes', 'gen_ms'))
+    for num_columns in [int(n) for n in args.columns.split(',')]:
+        for name, fn in gen_checks(num_columns):
+            sql_bytes = sum([len(sql) for sql in fn()])
+            gen_ms = timed(fn, args.repeat) * 1000
+            print("{:>14s} {:>8d} {:>10d} {:>12.2f}".format(name, num_columns, sql_bytes, gen_ms))
+
+
+def run_orchestration(args, connection):
+    ''' Run the orchestration path of the arguments on a DB-API connection '''
+    if args.detector is not None:
+        from lib.detector import Detector
+        from lib.snowflake import Snowflake
+        d = Detector(args.detector, dq_run_hour=args.dq_run_hour, variables=args.variables,
+            db=Snowflake(connection=connection))
+        d.run_dq()
+    elif args.watcher is not None:
+        from lib.watcher import Watcher
+        from lib.snowflake import Snowflake
+        w = Watcher(args.watcher, is_unit_test=True, variables=args.variables, db=Snowflake(connection=connection))
+        w.run_watcher()
+    elif args.etl is not None:
+        from lib.executor import Executor
+        from lib.snowflake import Snowflake
+        from lib.presto import Presto
+        # Watcher and DQ file of the ETL are replayed from the same connection
+        e = Executor(args.etl, variables=args.variables, connection=connection,
+            db=Snowflake(connection=connection), presto=Presto(connection=connection))
+        e.run_etl()
+    else:
+        raise Exception("One of --detector, --watcher or --etl is required")
+
+
+def run_record(args):
+    ''' Run once against the real database and record all the statements '''
+    if args.etl is not None:
+        raise Exception("Record the ETL from the Presto connection of ExecutorForPresto")
+    from lib.snowflake import Snowflake
+    db = record(Snowflake(), args.recording)
+    run_orchestration(args, db.connection)
+
+
+def run_replay(args):
+    print("{:>8s} {:>12s} {:>12s} {:>12s} {:>10s}".format('scale', 'wall_ms', 'db_ms', 'overhead_ms', 'queries'))
+    for scale in LATENCY_SCALES:
+        best = None
+        for _ in range(args.repeat):
+            connection = ReplayConnection(args.recording, latency_scale=scale)
+            start = time.perf_counter()
+            run_orchestration(args, connection)
+            wall = time.perf_counter() - start
+            if best is None or wall < best[0]:
+                best = (wall, connection.total_latency, connection.num_statements)
+        (wall, db_latency, num_statements) = best
+        print("{:>8.1f} {:>12.2f} {:>12.2f} {:>12.2f} {:>10d}".format(
+            scale, wall * 1000, db_latency * 1000, (wall - db_latency) * 1000, num_statements))
+
+
+def run_concurrency(args):
+    ''' Replay all the recorded statements with a number of workers (ie: independent checks run in parallel) '''
+    with open(args.recording) as f:
+        sqls = [json.loads(line)['sql'] for line in f if len(line.strip()) > 0]
+    print("{:>8s} {:>12s} {:>10s}".format('workers', 'wall_ms', 'speedup'))
+    baseline = None
+    for workers in [int(n) for n in args.workers.split(',')]:
+        connection = ReplayConnection(args.recording)
+
+        def run(sql):
+            try:
+                connection.cursor().execute(sql).fetchall()
+            except Exception:
+                # Recorded failures are part of the replay
+                pass
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run, sqls))
+        wall = time.perf_counter() - start
+        if baseline is None:
+            baseline = wall
+        print("{:>8d} {:>12.2f} {:>10.2f}".format(workers, wall * 1000, baseline / wall))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark orchestration paths on recorded interactions")
+    parser.add_argument('mode', choices=['gen', 'record', 'replay', 'concurrency'])
+    parser.add_argument('--detector', help="DQ config of Detector.run_dq")
+    parser.add_argument('--watcher', help="Watcher config of Watcher.run_watcher")
+    parser.add_argument('--etl', help="ETL config of Executor.run_etl")
+    parser.add_argument('--recording', help="JSONL file of the recorded statements")
+    parser.add_argument('--dq-run-hour', default=None, help="Same DQ run hour as the recording (in the SQLs)")
+    parser.add_argument('--variables', nargs='*', default=[], help="Variables of the config (name=value)")
+    parser.add_argument('--columns', default='10,100', help="Comma separated column counts (gen)")
+    parser.add_argument('--workers', default='1,2,4,8', help="Comma separated number of workers (concurrency)")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeat each measure and keep the best")
+    args = parser.parse_args()
+
+    if args.mode != 'gen' and args.recording is None:
+        raise Exception("--recording is required for {m}".format(m=args.mode))
+
+    if args.mode == 'gen':
+        run_gen(args)
+    elif args.mode == 'record':
+        run_record(args)
+    elif args.mode == 'replay':
+        run_replay(args)
+    else:
+        run_concurrency(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+''' Benchmark of the Watcher polling strategies on scripted arrivals (virtual clock, no warehouse)
+
+Usage:
+    python bench/bench_watcher.py --dependencies 20 --start 05:00 --arrival 06:00 --spread 90
+    python bench/bench_watcher.py --script arrivals.yml --start 05:00 --strategies backoff,expected
+
+Each strategy polls the same arrivals (lib.scripted_source) and reports the queries issued, the polls and
+the detection latency (minutes from the arrival of a dependency to its event from Watcher.watch()).
+'''
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib.clock import VirtualClock
+from lib.scripted_source import ScriptedSource
+
+# Watcher settings of each polling strategy (expected_time is set to --arrival)
+STRATEGIES = {
+    'fixed_5': {'min_sleep_time': 5, 'sleep_time': 5},
+    'fixed_30': {'min_sleep_time': 30, 'sleep_time': 30},
+    'backoff': {'min_sleep_time': 1, 'sleep_time': 30},
+    'expected': {'min_sleep_time': 1, 'sleep_time': 30, 'expected_time': None},
+    'predicted': {'min_sleep_time': 1, 'sleep_time': 30, 'predict_arrival': True},
+}
+# Days of arrivals before today (history of the predicted strategy)
+HISTORY_DAYS = 56
+
+
+def gen_script(num_dependencies, day, arrival, spread, seed):
+    ''' Arrivals of today between arrival and arrival + spread mins, and their history (same time +/- 15 mins) '''
+    rng = random.Random(seed)
+    (hour, minute) = [int(v) for v in arrival.split(':')]
+    base = day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    arrivals = []
+    for i in range(num_dependencies):
+        # One task for three tables
+        (check_type, name) = ('task', "etl.task_{i}".format(i=i)) if i % 4 == 3 else \
+            ('table', "sales.table_{i}".format(i=i))
+        offset = rng.uniform(0, spread)
+        arrivals.append({'type': check_type, 'name': name, 'time': base + timedelta(minutes=offset)})
+        for days_ago in range(1, HISTORY_DAYS + 1):
+            jitter = rng.gauss(0, 15)
+            arrivals.append({'type': check_type, 'name': name,
+                'time': base - timedelta(days=days_ago) + timedelta(minutes=offset + jitter)})
+    return {'arrivals': arrivals}
+
+
+def get_today_arrivals(script, day):
+    ''' {(type, name): arrival time} of the day '''
+    arrivals = {}
+    for arrival in script['arrivals']:
+        arrival_time = arrival['time']
+        if isinstance(arrival_time, str):
+            if len(arrival_time) <= 8:
+                arrival_time = "{d} {t}".format(d=day.strftime("%Y-%m-%d"), t=arrival_time)
+            arrival_time = datetime.fromisoformat(arrival_time)
+        if arrival_time.date() == day.date():
+            arrivals[(arrival['type'], arrival['name'].lower())] = arrival_time
+    return arrivals
+
+
+def run_strategy(settings, script, start, deadline, work_dir):
+    ''' Poll the scripted arrivals with the Watcher settings (queries, polls, latencies in mins, real secs) '''
+    from lib.watcher import Watcher
+    clock = VirtualClock(start)
+    source = ScriptedSource(clock, script)
+    arrivals = get_today_arrivals(script, start)
+    config = dict(settings)
+    config.update({
+        'deadline': deadline,
+        'readiness_cache': False,
+        'arrival_cache': os.path.join(work_dir, 'arrival_profiles.json'),
+        'snowflake_tables': sorted([n for (t, n) in arrivals if t == 'table']),
+        'snowflake_tasks': sorted([n for (t, n) in arrivals if t == 'task']),
+        'snowflake_table_metadata': sorted([n for (t, n) in arrivals if t == 'metadata']),
+        'presto_partitions': sorted([n for (t, n) in arrivals if t == 'partition']),
+        })
+    config_file = os.path.join(work_dir, 'watcher.yml')
+    with open(config_file, 'w') as f:
+        yaml.dump(config, f)
+    if os.path.exists(config['arrival_cache']):
+        os.remove(config['arrival_cache'])
+
+    latencies = []
+    error = None
+    real_start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        w = Watcher(config_file, db=source, presto=source, clock=clock)
+        try:
+            for event in w.watch():
+                arrival_time = arrivals[(event['type'], event['name'])]
+                latencies.append((clock.now() - arrival_time).total_seconds() / 60)
+        except Exception as e:
+            error = str(e)
+    return (source.num_queries, w.retry, latencies, time.perf_counter() - real_start, error)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Watcher polling strategies on scripted arrivals")
+    parser.add_argument('--script', help="Arrivals YAML file (generated otherwise)")
+    parser.add_argument('--dependencies', type=int, default=20, help="Number of generated dependencies")
+    parser.add_argument('--start', default='05:00', help="Time the Watcher starts (HH:MM)")
+    parser.add_argument('--arrival', default='06:00', help="Earliest generated arrival (HH:MM)")
+    parser.add_argument('--spread', type=int, default=90, help="Minutes between the first and last arrival")
+    parser.add_argument('--deadline', type=int, default=600, help="Deadline of the Watcher (mins)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the generated arrivals")
+    parser.add_argument('--strategies', default=",".join(STRATEGIES), help="Comma separated strategies")
+    args = parser.parse_args()
+
+    # Same day as current_date of the stand-in database
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    (hour, minute) = [int(v) for v in args.start.split(':')]
+    start = today.replace(hour=hour, minute=minute)
+    if args.script is not None:
+        with open(args.script) as f:
+            script = yaml.load(f, Loader=yaml.FullLoader)
+    else:
+        script = gen_script(args.dependencies, today, args.arrival, args.spread, args.seed)
+
+    print("{:>10s} {:>8s} {:>6s} {:>10s} {:>10s} {:>10s} {:>10s}".format(
+        'strategy', 'queries', 'polls', 'mean_min', 'p90_min', 'max_min', 'real_ms'))
+    for name in args.strategies.split(','):
+        settings = dict(STRATEGIES[name])
+        if 'expected_time' in settings:
+            settings['expected_time'] = args.arrival
+        with tempfile.TemporaryDirectory() as work_dir:
+            (queries, polls, latencies, real, error) = run_strategy(settings, script, start, args.deadline, work_dir)
+        latencies = sorted(latencies)
+        if len(latencies) == 0:
+            print("{:>10s} {:>8d} {:>6d} {}".format(name, queries, polls, error))
+            continue
+        print("{:>10s} {:>8d} {:>6d} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}{e}".format(
+            name, queries, polls,
+            sum(latencies) / len(latencies),
+            latencies[int(0.9 * (len(latencies) - 1))],
+            latencies[-1],
+            real * 1000,
+            e="" if error is None else "  ({e})".format(e=error)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+''' Run the generic checks of dq.yml end-to-end on the local database (DuckDB, no warehouse account)
+
+Usage:
+    python examples/local_dq/run_local_dq.py
+    python examples/local_dq/run_local_dq.py --verbose
+
+The orders of the last 91 days are loaded in the sales (target) and raw (source) tables, then the Detector
+runs in unit test mode on clean data (every check passes) and on broken data (a duplicated order and a
+missing customer). Exits with an error when a check does not give the expected result.
+'''
+import argparse
+import contextlib
+import io
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from lib.local_db import LocalDB
+
+DQ_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dq.yml')
+# Days of orders (missing_dates looks back 90 days from the latest date)
+NUM_DAYS = 91
+# Checks expected to fail on the broken data (dq_name, dq_column)
+BROKEN_FAILURES = set([
+    ('unique', 'order_id'),
+    ('unique', 'customer_id,order_date'),
+    ('empty_null', 'customer_id'),
+    ('compare_to_source', 'count(*)'),
+])
+
+
+def get_orders(num_days):
+    ''' Three orders a day up to today '''
+    today = date.today()
+    return [{'order_id': day * 100 + i, 'customer_id': i + 1, 'amount': 10.0 + i * 2.5, 'status': 'paid',
+        'order_date': today - timedelta(days=day)} for day in range(num_days) for i in range(3)]
+
+
+def run_dq(orders, raw_orders, verbose=False):
+    ''' Run the DQ file on the orders and return {(dq_name, dq_column): is_pass} '''
+    from lib.detector import Detector
+    db = LocalDB()
+    db.load_table('SALES.PUBLIC.ORDERS', rows=orders)
+    db.load_table('RAW.PUBLIC.ORDERS', rows=raw_orders)
+    output = io.StringIO() if not verbose else sys.stdout
+    with contextlib.redirect_stdout(output):
+        d = Detector(DQ_FILE, is_unit_test=True, db=db)
+        # History of the trending and profile checks is read from the production DQ table (empty here)
+        db.create_schema(db.shared_schema)
+        db.execute("CREATE TABLE IF NOT EXISTS {prod} AS SELECT * FROM {dq_table} WHERE 1=0".format(
+            prod=d.dq_table_prod, dq_table=d.dq_table))
+        d.run_dq()
+    rows = db.query("SELECT dq_name, dq_column, is_pass FROM {dq_table}".format(dq_table=d.dq_table))
+    return {(dq_name, dq_column): is_pass for (dq_name, dq_column, is_pass) in rows}
+
+
+def check(name, results, expected_failures):
+    ''' Print the results of a run and return the checks which did not give the expected result '''
+    unexpected = []
+    print("*** {n} ***".format(n=name))
+    for (dq_name, dq_column), is_pass in sorted(results.items()):
+        expected = (dq_name, dq_column) not in expected_failures
+        print("{:>18s} {:<45s} {:>5s}{e}".format(dq_name, dq_column, 'PASS' if is_pass else 'FAIL',
+            e="" if is_pass == expected else "  (expected {r})".format(r='PASS' if expected else 'FAIL')))
+        if is_pass != expected:
+            unexpected.append((dq_name, dq_column))
+    # Expected failures of checks which did not run at all
+    unexpected.extend([c for c in expected_failures if c not in results])
+    print("")
+    return unexpected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the generic checks end-to-end on the local database")
+    parser.add_argument('--verbose', action='store_true', help="Print the output of the Detector")
+    args = parser.parse_args()
+
+    orders = get_orders(NUM_DAYS)
+    unexpected = check('clean data', run_dq(orders, orders, args.verbose), set())
+
+    # Order loaded twice and an order without customer (in an older day than the day_to_day window)
+    broken = [dict(o) for o in orders]
+    broken.append(dict(orders[-1]))
+    broken[-3]['customer_id'] = None
+    unexpected += check('broken data', run_dq(broken, orders, args.verbose), BROKEN_FAILURES)
+
+    if len(unexpected) > 0:
+        raise Exception("Unexpected results for {c}".format(c=", ".join(["{n} ({c})".format(n=n, c=c)
+            for (n, c) in unexpected])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import os
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+
+class ArrivalProfile:
+    ''' Arrival time quantiles of each dependency per weekday (from the upload/task history) '''
+    # Quantiles of the arrival (minutes of the day)
+    QUANTILES = {'p10': 0.1, 'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+    # Days of history to build the profile from
+    HISTORY_DAYS = 56
+    # Minimum arrivals of a weekday to use its own quantiles (all days otherwise)
+    MIN_POINTS = 4
+    # Default file of the profiles (shared by all the Watchers of the host)
+    CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'dq_watcher', 'arrival_profiles.json')
+
+    def __init__(self, cache_file=None, min_points=MIN_POINTS):
+        self.cache_file = cache_file if cache_file is not None else self.CACHE_FILE
+        self.min_points = min_points
+        # {dependency: {'built': YYYY-MM-DD, 'all': {p: minutes}, '0'..'6': {p: minutes}}}
+        self.profiles = self.__load()
+
+    def __load(self):
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Broken cache is rebuilt from the history
+            return {}
+
+    def save(self):
+        ''' Write the profiles to the cache (atomic rename so other Watchers never read a partial file) '''
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        tmp_file = "{f}.{pid}".format(f=self.cache_file, pid=os.getpid())
+        with open(tmp_file, 'w') as f:
+            json.dump(self.profiles, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def get_stale(self, dependencies, today):
+        ''' Dependencies without a profile built today '''
+        return [d for d in dependencies if self.profiles.get(d, {}).get('built') != today.strftime("%Y-%m-%d")]
+
+    def __get_quantiles(self, minutes):
+        values = np.quantile(np.array(minutes, dtype=float), list(self.QUANTILES.values()))
+        return {p: float(v) for p, v in zip(self.QUANTILES, values)}
+
+    def fit(self, dependencies, arrivals, today):
+        ''' Build the profiles of the dependencies from their arrivals (dependency, first arrival time of a day) '''
+        minutes = {d: {} for d in dependencies}
+        for (dependency, arrival) in arrivals:
+            if dependency not in minutes or arrival is None:
+                continue
+            if isinstance(arrival, str):
+                arrival = datetime.fromisoformat(arrival[:19])
+            weekday = str(arrival.weekday())
+            minutes[dependency].setdefault(weekday, []).append(arrival.hour * 60 + arrival.minute)
+
+        for dependency in dependencies:
+            profile = {'built': today.strftime("%Y-%m-%d")}
+            all_minutes = [m for day in minutes[dependency].values() for m in day]
+            if len(all_minutes) > 0:
+                profile['all'] = self.__get_quantiles(all_minutes)
+                profile['n'] = len(all_minutes)
+                for weekday, day_minutes in minutes[dependency].items():
+                    if len(day_minutes) >= self.min_points:
+                        profile[weekday] = self.__get_quantiles(day_minutes)
+            self.profiles[dependency] = profile
+        return self
+
+    def predict(self, dependency, day, quantile='p50'):
+        ''' Predicted arrival time of the day (None without history) '''
+        profile = self.profiles.get(dependency, {})
+        quantiles = profile.get(str(day.weekday()), profile.get('all'))
+        if quantiles is None:
+            return None
+        start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start + timedelta(minutes=quantiles[quantile])
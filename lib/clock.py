@@ -0,0 +1,37 @@
+import time
+import asyncio
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    ''' Wall clock of the Watcher (time of the polls and sleeps between them) '''
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    async def sleep_async(self, seconds):
+        await asyncio.sleep(seconds)
+
+
+class VirtualClock:
+    ''' Clock which jumps forward instead of sleeping (ie: a day of polling simulated in milliseconds) '''
+    def __init__(self, start=None):
+        # Default to the start of today (same day as current_date of the stand-in database)
+        if start is None:
+            start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.current = start
+        self.slept = 0.0
+
+    def now(self):
+        return self.current
+
+    def sleep(self, seconds):
+        self.current += timedelta(seconds=seconds)
+        self.slept += seconds
+
+    async def sleep_async(self, seconds):
+        self.sleep(seconds)
+        # Still give the other tasks of the event loop a turn
+        await asyncio.sleep(0)
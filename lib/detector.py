@@ -2,16 +2,47 @@ import yaml
 import sys
 import time
 import os
-from datetime import datetime
+import getpass
+import math
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from lib import Snowflake
+from lib.dialect import get_dialect
+from lib.seasonal import SeasonalBaseline
+from lib.tracing import get_tracer
 from lib import myEmail
 from lib import mySlack
 from lib import GenericChecks
 
 class Detector:
-    def __init__(self, yaml_file, email=None, dq_run_hour=None, is_dry_run=False, is_unit_test=False, variables=[]):
+    # Clustering keys of the DQ table to match the lookups done by the checks
+    # (dq_key is the time of the run, not dq_run_hour for a backfill, so lookups by dq_key filter dq_run_hour too)
+    DQ_TABLE_CLUSTER_KEYS = "(dq_run_hour::date, database_name, schema_name, table_name, dq_name)"
+    # Default number of days to keep in the DQ table before archiving
+    DQ_TABLE_RETENTION_DAYS = 400
+    # Default number of buckets (per pass) and max rows of a differing bucket to report for data_diff
+    DATA_DIFF_BUCKETS = 16
+    DATA_DIFF_GRANULARITY = 1000
+    # Max number of differing ranges to go into for each data_diff pass
+    DATA_DIFF_MAX_RANGES = 100
+    # Number of retries of a failed Presto query (Presto internal errors only)
+    PRESTO_RETRIES = 2
+    # Default days of history, season and min points per season for the seasonal check
+    SEASONAL_HISTORY_DAYS = 56
+    SEASONAL_SEASON = 'weekday_hour'
+    SEASONAL_MIN_POINTS = 4
+    # Checks whose history values can be the baseline of the seasonal check
+    SEASONAL_HISTORY_DQ_NAMES = ['seasonal', 'trending', 'profile']
+    # Default partition columns of the target table for incremental checks
+    DEFAULT_PARTITION_COLUMNS = ['dl_partition_year', 'dl_partition_month', 'dl_partition_day', 'dl_partition_hour']
+
+    def __init__(self, yaml_file, email=None, dq_run_hour=None, is_dry_run=False, is_unit_test=False, variables=[],
+        db=None):
         # This unique DQ key is to identify all the tests done from each run
         self.dq_key = int(time.time())
+        # Name of the job in the query tags and trace
+        self.job = os.path.basename(yaml_file)
 
         # Time of the DQ run if not specified and default to current
         # (Use this column to group a specific ETL run date)
@@ -20,7 +51,11 @@ class Detector:
         self.dq_run_hour = dq_run_hour
 
         # The unix username who runs the DQ
-        self.unix_username = os.getlogin()
+        # (no login terminal when running from a scheduler or CI)
+        try:
+            self.unix_username = os.getlogin()
+        except OSError:
+            self.unix_username = getpass.getuser()
 
         if is_dry_run and is_unit_test:
             raise Exception("Cannot set both DRY_RUN and UNIT_TEST")
@@ -41,18 +76,49 @@ class Detector:
         self.source_schema_name = None
         self.source_table_name = None
         self.source_filter = "1=1"
-        self.config_data = {}
+        self.source_engine = None
+        self.source_db = None
+        self.target_partition_columns = self.DEFAULT_PARTITION_COLUMNS
+        self.target_date_columns = []
+        self.config_data = self.__read_config(yaml_file)
         self.test_summary = []
+        # If the std_dev history is already seeded (unit test)
+        self.is_stddev_setup = False
+
+        # Database where the checks run and the results are stored (default to Snowflake)
+        # (ie: database: {type: presto, catalog: hive, schema: dq} to run where the data lives)
+        self.database_type = 'snowflake'
+        if 'database' in self.config_data:
+            self.database_type = self.config_data['database'].get('type', 'snowflake').lower()
+        self.dialect = get_dialect(self.database_type)
 
-        # For Snowflake connection
+        # For Snowflake/Presto connection
         # (Use environment variables to setup connection host/user)
-        print("Snowflake Configuration:")
-        self.db = Snowflake()
+        if db is not None:
+            # Connection from the caller (ie: LocalDB to run the unit tests without account)
+            print("Injected Configuration:")
+            self.db = db
+            if hasattr(db, 'dialect'):
+                self.dialect = db.dialect
+        elif self.database_type == 'presto':
+            print("Presto Configuration:")
+            # Imported here as the Presto client is only needed for a Presto database
+            from lib.detector_presto import DetectorForPresto
+            self.db = DetectorForPresto(
+                catalog=self.config_data['database'].get('catalog', 'hive'),
+                schema=self.config_data['database'].get('schema', 'default'),
+                retries_on_query_failure=self.PRESTO_RETRIES,
+                )
+        else:
+            print("Snowflake Configuration:")
+            self.db = Snowflake()
         print("HOST = {host}".format(host=self.db.get_host()))
         print("USER = {user}".format(user=self.db.get_user()))
         print("\n")
         self.db_username = self.db.get_user()
         self.db_user = self.db.user_database
+        # Tag of all the queries of this run (QUERY_TAG and query log)
+        self.__set_query_tag(job=self.job, dq_key=self.dq_key)
         # Ensure detector doesn't use cache
         self.db.use_cached_result(False)
 
@@ -62,12 +128,19 @@ class Detector:
         # Meta table for the DQ test results
         self.dq_table = self.db.dq_table      # Table name will be replaced during unit test
         self.dq_table_prod = self.db.dq_table # For unit test using the production table
+        self.dq_archive_table = self.db.dq_archive_table # Old results moved out of dq_table
+        self.dq_state_table = self.db.dq_state_table     # Partial aggregates for incremental checks
 
         if self.is_dry_run:
             print("*** DRY RUN ***")
         if self.is_unit_test:
             print("*** UNIT TEST ***")
-            self.dq_table = "{db}.{u}.dq_test__{id}".format(db=self.db_user, u=self.db_username, id=self.dq_key)
+            if self.database_type == 'presto':
+                # No temporary table in Presto (dropped at the end of the run instead)
+                self.dq_table = "{s}.dq_test__{id}".format(s=self.db.shared_schema, id=self.dq_key)
+            else:
+                self.dq_table = "{db}.{u}.dq_test__{id}".format(db=self.db_user, u=self.db_username, id=self.dq_key)
+            self.dq_state_table = "{db}.{u}.dq_state_test__{id}".format(db=self.db_user, u=self.db_username, id=self.dq_key)
             self.__run_setup()
 
         self.insert_sql = "INSERT INTO {table}".format(table=self.dq_table)
@@ -75,9 +148,9 @@ class Detector:
         self.notification_email = email # Overwrite the email from command argument
 
         if self.env == 'PROD':
-            self.notification_email_subject_prefix = "[Snowflake] [DQ WARNING]"
+            self.notification_email_subject_prefix = "[{db}] [DQ WARNING]".format(db=self.database_type.capitalize())
         else:
-            self.notification_email_subject_prefix = "*NON-PROD* [Snowflake] [DQ WARNING]"
+            self.notification_email_subject_prefix = "*NON-PROD* [{db}] [DQ WARNING]".format(db=self.database_type.capitalize())
         self.notification_email_subject = None
         self.notification_email_body = ""
         self.notification_email_footer = ""
@@ -100,17 +173,17 @@ class Detector:
         # stop_on_failure is set to True
         self.to_error_out = False
 
-        self.__setup_config(yaml_file)
+        self.__setup_config()
+        # Same tag for the source connection (if any)
+        self.__set_query_tag(job=self.job, dq_key=self.dq_key)
 
     def __read_config(self, config_file):
         ''' For reading and converting YAML file '''
         with open(config_file) as f:
             return yaml.load(f, Loader=yaml.FullLoader)
 
-    def __setup_config(self, config_file):
+    def __setup_config(self):
         ''' Parse the YAML file to global variables '''
-        self.config_data = self.__read_config(config_file)
-
         if 'target_table' not in self.config_data:
             raise Exception("Missing target_table")
         else:
@@ -121,6 +194,15 @@ class Detector:
             self.target_database_name = self.target_table.split('.')[0]
             self.target_schema_name = self.target_table.split('.')[1]
             self.target_table_name = self.target_table.split('.')[2]
+            # Partition columns of the target table (to answer some checks from partition metadata)
+            if 'partition_columns' in self.config_data['target_table']:
+                self.target_partition_columns = self.config_data['target_table']['partition_columns']
+            # Partition columns of DATE or TIMESTAMP_NTZ type (up_to_date/missing_dates on the column itself)
+            if 'date_columns' in self.config_data['target_table']:
+                self.target_date_columns = self.config_data['target_table']['date_columns']
+                for column in self.target_date_columns:
+                    if column.lower() not in [c.lower() for c in self.target_partition_columns]:
+                        raise Exception("Date column '{c}' has to be one of the partition columns".format(c=column))
             # Add double quote for schema name with space or upper character
             #if ' ' in self.target_table or \
             #  self.target_schema_name[0:1].isupper() or \
@@ -135,6 +217,24 @@ class Detector:
             self.source_database_name = self.source_table.split('.')[0]
             self.source_schema_name = self.source_table.split('.')[1]
             self.source_table_name = self.source_table.split('.')[2]
+            # Source table can be in another database for cross-database comparison
+            self.source_engine = self.database_type
+            if 'engine' in self.config_data['source_table']:
+                self.source_engine = self.config_data['source_table']['engine'].lower()
+            if self.source_engine not in ('snowflake', 'presto'):
+                raise Exception("Unknown source_table engine (snowflake or presto)")
+            if self.source_engine != self.database_type:
+                if self.source_engine == 'presto':
+                    print("Presto Configuration (source):")
+                    # Imported here as the Presto client is only needed for a Presto source
+                    from lib.presto import Presto
+                    self.source_db = Presto(retries_on_query_failure=self.PRESTO_RETRIES)
+                else:
+                    print("Snowflake Configuration (source):")
+                    self.source_db = Snowflake()
+                print("HOST = {host}".format(host=self.source_db.get_host()))
+                print("USER = {user}".format(user=self.source_db.get_user()))
+                print("\n")
             # Add double quote for schema name with space or upper character
             #if ' ' in self.source_table or \
             #  self.source_schema_name[0:1].isupper() or \
@@ -216,42 +316,139 @@ class Detector:
         ''' For initial setup such as creating the meta table '''
         print("*** SETUP ***")
         table = "TABLE"
-        if self.is_unit_test:
+        cluster_by = "CLUSTER BY {keys}".format(keys=self.DQ_TABLE_CLUSTER_KEYS)
+        if self.database_type == 'presto':
+            cluster_by = ""
+        elif self.is_unit_test:
             table = "LOCAL TEMPORARY TABLE"
+            cluster_by = ""
         create = """
             CREATE {table} {dq_table} (
-                dq_run_hour TIMESTAMP WITHOUT TIME ZONE,
+                dq_run_hour {timestamp},
+                database_name {string},
+                schema_name {string},
+                table_name {string},
+                table_filter {string},
+                dq_name {string},
+                dq_column {string},
+                dq_description {string},
+                dq_tgt_value {string},
+                dq_src_value {string},
+                dq_threshold {string},
+                is_pass {boolean},
+                stop_on_failure {boolean},
+                is_dq_custom {boolean},
+                dq_key {bigint},
+                dq_start_tstamp {timestamp},
+                dq_end_tstamp {timestamp},
+                db_username {string},
+                unix_username {string},
+                env {string},
+                is_trial {boolean}
+            ) {cluster_by};
+        """.format(table=table, dq_table=self.dq_table, cluster_by=cluster_by, **self.dialect.columns_mapping)
+        self.__run_sql(create, description="Create DQ table structure")        
+        # Incremental state and archive are only for Snowflake
+        if self.dialect.supports_incremental:
+            self.__run_state_setup()
+        if self.dialect.supports_archive and not self.is_unit_test:
+            self.__run_archive_setup()
+
+    def __run_teardown(self):
+        ''' For dropping the DQ table of the unit test (when it is not a temporary table) '''
+        if self.is_unit_test and self.database_type == 'presto':
+            self.__run_sql("DROP TABLE IF EXISTS {dq_table}".format(dq_table=self.dq_table),
+                description="Drop DQ unit test table")
+
+    def __run_state_setup(self):
+        ''' For creating the state table of the incremental checks '''
+        table = "TABLE IF NOT EXISTS"
+        cluster_by = "CLUSTER BY (database_name, schema_name, table_name, dq_name)"
+        if self.is_unit_test:
+            table = "LOCAL TEMPORARY TABLE"
+            cluster_by = ""
+        # One row per partition of the target table for each check and column
+        create = """
+            CREATE {table} {dq_state_table} (
                 database_name string,
                 schema_name string,
                 table_name string,
-                table_filter string,
                 dq_name string,
                 dq_column string,
-                dq_description string,
-                dq_tgt_value string,
-                dq_src_value string,
-                dq_threshold string,
-                is_pass boolean,
-                stop_on_failure boolean,
-                is_dq_custom boolean,
-                dq_key BIGINT,
-                dq_start_tstamp TIMESTAMP WITHOUT TIME ZONE,
-                dq_end_tstamp TIMESTAMP WITHOUT TIME ZONE,
-                db_username string,
-                unix_username string,
                 env string,
-                is_trial boolean
-            );
-        """.format(table=table, dq_table=self.dq_table)
-        self.__run_sql(create, description="Create DQ table structure")        
+                dq_filter string,
+                partition_value string,
+                total_cnt BIGINT,
+                value_cnt BIGINT,
+                key_sketch VARIANT,
+                date_values ARRAY,
+                dq_key BIGINT,
+                dq_update_tstamp TIMESTAMP WITHOUT TIME ZONE
+            ) {cluster_by};
+        """.format(table=table, dq_state_table=self.dq_state_table, cluster_by=cluster_by)
+        self.__run_sql(create, description="Create DQ incremental state table structure")
+
+    def __run_archive_setup(self):
+        ''' For creating the archive table of dq_table_result '''
+        # Archive keeps the same structure (and clustering keys) as the DQ table
+        create_archive = """
+            CREATE TABLE IF NOT EXISTS {archive_table} LIKE {dq_table};
+        """.format(archive_table=self.dq_archive_table, dq_table=self.dq_table)
+        self.__run_sql(create_archive, description="Create DQ archive table structure")
 
     def __alter_setup(self):
         ''' For making any changes to dq_table_result '''
         print("*** ALTER SETUP ***")
+        if self.database_type != 'snowflake':
+            raise Exception("Setup update is only supported for Snowflake")
         alter = """
-            ALTER TABLE {dq_table} ADD COLUMN is_trial TYPE boolean;
+            ALTER TABLE {dq_table} ADD COLUMN IF NOT EXISTS is_trial boolean;
         """.format(dq_table=self.dq_table)
         self.__run_sql(alter, description="Alter DQ table structure")        
+        alter = """
+            ALTER TABLE {dq_table} CLUSTER BY {keys};
+        """.format(dq_table=self.dq_table, keys=self.DQ_TABLE_CLUSTER_KEYS)
+        self.__run_sql(alter, description="Alter DQ table clustering keys")
+        self.__run_state_setup()
+        # State rows are keyed by the target filter (rows without it are rebuilt by the next run)
+        alter = """
+            ALTER TABLE {dq_state_table} ADD COLUMN IF NOT EXISTS dq_filter string;
+        """.format(dq_state_table=self.dq_state_table)
+        self.__run_sql(alter, description="Alter DQ incremental state table structure")
+        self.__run_sql("DELETE FROM {dq_state_table} WHERE dq_filter IS NULL".format(dq_state_table=self.dq_state_table),
+            description="Delete DQ incremental state without filter")
+        self.__run_archive_setup()
+
+    def __archive(self, retention_days):
+        ''' For moving DQ results older than retention_days to the archive table '''
+        # Fix the cutoff once so that archive and delete see the same rows
+        cutoff = (datetime.now() - timedelta(days=int(retention_days))).strftime("%Y-%m-%d 00:00:00")
+        print("*** ARCHIVE (dq_run_hour < {cutoff}) ***".format(cutoff=cutoff))
+
+        # Insert sorted by the clustering keys so archived micro-partitions stay compact
+        archive = """
+            INSERT INTO {archive_table}
+            SELECT * FROM {dq_table}
+            WHERE dq_run_hour < '{cutoff}'
+            ORDER BY dq_run_hour::date, database_name, schema_name, table_name, dq_name
+            ;
+        """.format(archive_table=self.dq_archive_table, dq_table=self.dq_table, cutoff=cutoff)
+
+        delete = """
+            DELETE FROM {dq_table} WHERE dq_run_hour < '{cutoff}';
+        """.format(dq_table=self.dq_table, cutoff=cutoff)
+
+        # Archive and delete have to be applied all together (or not at all)
+        sqls = [archive, delete]
+        print("### [{t}]: {desc} ###".format(
+            t=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            desc="Archive old DQ results",
+        ))
+        for sql in sqls:
+            print(sql)
+        print("\n")
+        if not self.is_dry_run:
+            self.db.execute_transaction(sqls)
 
     def run_setup(self):
         ''' Public function to run setup when user requested '''
@@ -263,22 +460,47 @@ class Detector:
         self.__alter_setup()
         sys.exit(0)
 
-    def run_setup_stddev(self, is_exit=True):
+    def run_archive(self, retention_days=None, is_exit=True):
+        ''' Public function to archive old DQ results (to be scheduled, ie: daily) '''
+        if not self.dialect.supports_archive:
+            raise Exception("Archive is not supported for {db}".format(db=self.database_type))
+        if retention_days is None:
+            retention_days = self.config_data.get('retention_days', self.DQ_TABLE_RETENTION_DAYS)
+        # Trending checks look back up to a year (year-over-year)
+        if int(retention_days) < 366:
+            raise Exception("Retention days cannot be less than 366")
+        self.__archive(retention_days)
+        if is_exit:
+            sys.exit(0)
+
+    def run_setup_stddev(self, is_exit=True, targets=None):
         ''' Public function to insert initial data for standard deviation '''
-        if 'columns' in self.config_data['dq']['std_dev']:
-            columns = self.config_data['dq']['std_dev']['columns']
-        else:
+        # All std_dev checks of this config if no (table, column) targets (ie: from the bulk setup)
+        if targets is None:
+            targets = self.get_stddev_targets()
+        if len(targets) == 0:
             raise Exception("ERROR: Missing column(s) for std_dev check")
 
-        for column in columns:
-            insert = GenericChecks().get_stddev_setup(
-                column=column,
-                vars=self.__get_class_variables()
-                )
-            self.__run_sql(insert, description="Insert initial data for std_dev")
+        insert = GenericChecks(self.dialect).get_stddev_setup(
+            targets=targets,
+            vars=self.__get_class_variables()
+            )
+        self.__run_sql(insert, description="Insert initial data for std_dev ({n} columns)".format(n=len(targets)))
+        self.is_stddev_setup = True
         if is_exit:
             sys.exit(0)
 
+    def get_stddev_targets(self):
+        ''' Get (table, column) of all the std_dev checks of this config '''
+        targets = []
+        for dq_name in self.config_data.get('dq', {}):
+            if dq_name.startswith('std_dev') and 'columns' in self.config_data['dq'][dq_name]:
+                for column in self.config_data['dq'][dq_name]['columns']:
+                    target = (self.target_table, self.__replace_variables(column))
+                    if target not in targets:
+                        targets.append(target)
+        return targets
+
     def __replace_variables(self, str):
         ''' To replace any string with the variables list '''
         for variable in self.variables:
@@ -295,6 +517,8 @@ class Detector:
         d['target_schema_name'] = self.target_schema_name
         d['target_table_name'] = self.target_table_name
         d['target_filter'] = self.target_filter
+        d['target_partition_columns'] = self.target_partition_columns
+        d['target_date_columns'] = self.target_date_columns
         d['source_table'] = self.source_table
         d['source_database_name'] = self.source_database_name
         d['source_schema_name'] = self.source_schema_name
@@ -305,6 +529,7 @@ class Detector:
         d['dq_key'] = self.dq_key
         d['dq_table'] = self.dq_table
         d['dq_table_prod'] = self.dq_table_prod
+        d['dq_state_table'] = self.dq_state_table
         d['db_username'] = self.db_username
         d['unix_username'] = self.unix_username
         d['env'] = self.env
@@ -312,6 +537,19 @@ class Detector:
 
     def run_dq(self):
         ''' Main function to execute the DQ SQLs '''
+        # Root span of the run unless it is a phase of an ETL run
+        with get_tracer().span('run', self.job, dq_key=self.dq_key):
+            try:
+                self.__run_dq()
+            finally:
+                # DQ table of the unit test is dropped and queries are logged for a failed check too
+                self.__set_query_tag(check=None)
+                try:
+                    self.__run_teardown()
+                finally:
+                    self.__flush_query_log()
+
+    def __run_dq(self):
         if 'dq' not in self.config_data:
             raise Exception("ERROR: Missing DQ rules")
         else:
@@ -333,7 +571,7 @@ class Detector:
                             threshold_min = threshold.split(',')[0]
                             threshold = threshold.split(',')[1]
                         # Valid range rules for threshold and min threshold
-                        if dq_name.startswith('std_dev'):
+                        if dq_name.startswith('std_dev') or dq_name.startswith('seasonal'):
                             if float(threshold) > 10.0 or float(threshold) < -10.0:
                                 raise Exception("Unexpected threshold number (between -10.0 and 10.0)")
                             if threshold_min is not None:
@@ -349,6 +587,8 @@ class Detector:
                         # Default threshold
                         if dq_name.startswith('std_dev'):
                             threshold = '1'
+                        elif dq_name.startswith('seasonal'):
+                            threshold = '3'
                         else:
                             threshold = '0'
 
@@ -384,18 +624,108 @@ class Detector:
                     else:
                         compare_type = None
 
-                    self.__run_generic_sql(
-                        dq_name=dq_name,
-                        threshold=threshold,
-                        threshold_min=threshold_min,
-                        stop_on_failure=stop_on_failure,
-                        columns=columns,
-                        is_trial=is_trial,
-                        description=description,
-                        group_by=group_by,
-                        num_days=num_days,
-                        compare_type=compare_type,
-                        )
+                    # Incremental mode only scans the partitions since the last run
+                    # (either True for the default partition columns or the list of partition columns)
+                    incremental = None
+                    if 'incremental' in self.config_data['dq'][dq_name]:
+                        partition_columns = self.config_data['dq'][dq_name]['incremental']
+                        if partition_columns is True:
+                            partition_columns = self.DEFAULT_PARTITION_COLUMNS
+                        if partition_columns:
+                            incremental = {'partition_columns': partition_columns}
+
+                    # Execution mode to trade accuracy for cost (exact, approx or sample)
+                    if 'mode' in self.config_data['dq'][dq_name]:
+                        mode = self.config_data['dq'][dq_name]['mode']
+                    else:
+                        mode = None
+
+                    if 'sample_rate' in self.config_data['dq'][dq_name]:
+                        sample_rate = self.config_data['dq'][dq_name]['sample_rate']
+                        if float(sample_rate) <= 0 or float(sample_rate) > 100:
+                            raise Exception("Sample rate can only between 0 and 100 (percent)")
+                    else:
+                        sample_rate = None
+
+                    # Query plan for wide empty_null checks (union or unpivot)
+                    if 'plan' in self.config_data['dq'][dq_name]:
+                        plan = self.config_data['dq'][dq_name]['plan']
+                    else:
+                        plan = None
+
+                    # Numeric key to bucket the rows by for data_diff
+                    if 'key' in self.config_data['dq'][dq_name]:
+                        key = self.config_data['dq'][dq_name]['key']
+                    else:
+                        key = None
+
+                    if 'buckets' in self.config_data['dq'][dq_name]:
+                        buckets = int(self.config_data['dq'][dq_name]['buckets'])
+                        if buckets < 2 or buckets > 1000:
+                            raise Exception("Buckets can only between 2 and 1000")
+                    else:
+                        buckets = self.DATA_DIFF_BUCKETS
+
+                    if 'granularity' in self.config_data['dq'][dq_name]:
+                        granularity = int(self.config_data['dq'][dq_name]['granularity'])
+                    else:
+                        granularity = self.DATA_DIFF_GRANULARITY
+
+                    # History, season (weekday_hour, weekday, hour or none) and min points of the seasonal baseline
+                    if 'history_days' in self.config_data['dq'][dq_name]:
+                        history_days = int(self.config_data['dq'][dq_name]['history_days'])
+                        if history_days < 7 or history_days > 366:
+                            raise Exception("History days can only between 7 and 366")
+                    else:
+                        history_days = self.SEASONAL_HISTORY_DAYS
+
+                    if 'season' in self.config_data['dq'][dq_name]:
+                        season = self.config_data['dq'][dq_name]['season']
+                    else:
+                        season = self.SEASONAL_SEASON
+
+                    if 'min_points' in self.config_data['dq'][dq_name]:
+                        min_points = int(self.config_data['dq'][dq_name]['min_points'])
+                    else:
+                        min_points = self.SEASONAL_MIN_POINTS
+
+                    # Stats of the profile check (min, max, null_cnt, distinct, mean and length)
+                    if 'stats' in self.config_data['dq'][dq_name]:
+                        stats = self.config_data['dq'][dq_name]['stats']
+                    else:
+                        stats = None
+
+                    # Trending check can also compare to the stats of the profile check
+                    if 'baseline_profile' in self.config_data['dq'][dq_name]:
+                        baseline_profile = self.config_data['dq'][dq_name]['baseline_profile']
+                    else:
+                        baseline_profile = False
+
+                    with get_tracer().span('check', dq_name):
+                        self.__run_generic_sql(
+                            dq_name=dq_name,
+                            threshold=threshold,
+                            threshold_min=threshold_min,
+                            stop_on_failure=stop_on_failure,
+                            columns=columns,
+                            is_trial=is_trial,
+                            description=description,
+                            group_by=group_by,
+                            num_days=num_days,
+                            compare_type=compare_type,
+                            incremental=incremental,
+                            mode=mode,
+                            sample_rate=sample_rate,
+                            plan=plan,
+                            key=key,
+                            buckets=buckets,
+                            granularity=granularity,
+                            history_days=history_days,
+                            season=season,
+                            min_points=min_points,
+                            stats=stats,
+                            baseline_profile=baseline_profile,
+                            )
                 else:
                     print("Skipped '{dq_name}'".format(dq_name=dq_name))
                     print("\n")
@@ -420,33 +750,35 @@ class Detector:
                     else:
                         is_trial = False
 
-                    if 'sql_file' in self.config_data['dq_custom'][dq_name]:
-                        sql_file = self.config_data['dq_custom'][dq_name]['sql_file']
-                        # Enable environment variables in file path
-                        sql_file = os.path.expandvars(sql_file)
-                        custom_sql = open(sql_file, 'r').read()
-                        self.__run_custom_sql(
-                            dq_name=dq_name,
-                            custom_sql=custom_sql,
-                            stop_on_failure=stop_on_failure,
-                            is_trial=is_trial,
-                            description=description,
-                            )
-                    elif 'sql' in self.config_data['dq_custom'][dq_name]:
-                        custom_sql = self.config_data['dq_custom'][dq_name]['sql']
-                        self.__run_custom_sql(
-                            dq_name=dq_name,
-                            custom_sql=custom_sql,
-                            stop_on_failure=stop_on_failure,
-                            is_trial=is_trial,
-                            description=description,
-                            )
-                    else:
-                        raise Exception("No custom SQL or SQL file specified")
+                    with get_tracer().span('check', dq_name):
+                        if 'sql_file' in self.config_data['dq_custom'][dq_name]:
+                            sql_file = self.config_data['dq_custom'][dq_name]['sql_file']
+                            # Enable environment variables in file path
+                            sql_file = os.path.expandvars(sql_file)
+                            custom_sql = open(sql_file, 'r').read()
+                            self.__run_custom_sql(
+                                dq_name=dq_name,
+                                custom_sql=custom_sql,
+                                stop_on_failure=stop_on_failure,
+                                is_trial=is_trial,
+                                description=description,
+                                )
+                        elif 'sql' in self.config_data['dq_custom'][dq_name]:
+                            custom_sql = self.config_data['dq_custom'][dq_name]['sql']
+                            self.__run_custom_sql(
+                                dq_name=dq_name,
+                                custom_sql=custom_sql,
+                                stop_on_failure=stop_on_failure,
+                                is_trial=is_trial,
+                                description=description,
+                                )
+                        else:
+                            raise Exception("No custom SQL or SQL file specified")
                 else:
                     print("Skipped '{dq_name}'".format(dq_name=dq_name))
                     print("\n")
 
+        self.__set_query_tag(check=None)
         self.__print_summary()
 
         # No slack sent out for unit test and dry run (for PROD only)
@@ -497,12 +829,67 @@ class Detector:
         else:
             return None
 
+    def __get_incremental_hwm(self, dq_name, columns, partition_columns):
+        ''' Get the high-water mark partition for an incremental check (None to scan everything) '''
+        sql = GenericChecks(self.dialect).get_incremental_hwm(dq_name, columns, partition_columns,
+            self.__get_class_variables())
+        result = self.__run_sql(sql, description="Get high-water mark for '{dq}'".format(dq=dq_name))
+        if result is None:
+            return None
+        hwm = {}
+        for row in result:
+            hwm[row[0]] = row[1]
+        # A column without any state (ie: newly added) requires a full scan
+        for column in columns:
+            if hwm.get(column) is None:
+                return None
+        # Rescan from the lowest mark of all columns (the last partition might have been reloaded)
+        # (same order as the high-water mark: numbers as numbers, ie: 2024|9|30 < 2024|10|1)
+        hwm = min([hwm[column] for column in columns],
+            key=lambda v: [(0, int(p), '') if p.isdigit() else (1, 0, p) for p in v.split('|')])
+        if len(hwm.split('|')) != len(partition_columns):
+            raise Exception("Partition columns of '{dq}' do not match the incremental state".format(dq=dq_name))
+        return hwm
+
+    def __run_source_sql(self, sql, description=None):
+        ''' To execute SQL statement in the source database (when it is not the DQ database) '''
+        if description is not None:
+            print("### [{t}]: {desc} ###".format(
+                t=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                desc=description,
+            ))
+            print(sql)
+            print("\n")
+        if not self.is_dry_run:
+            try:
+                return self.source_db.query(sql)
+            except Exception as error:
+                raise Exception("Found error in run_source_sql! ({e})".format(e=error))
+        else:
+            return None
+
     def __run_generic_sql(self, dq_name, threshold='0', threshold_min=None, stop_on_failure=False, columns=[], is_trial=False,
-        description="", group_by=None, num_days=None, compare_type=None):
+        description="", group_by=None, num_days=None, compare_type=None, incremental=None, mode=None, sample_rate=None,
+        plan=None, key=None, buckets=None, granularity=None, history_days=None, season=None, min_points=None,
+        stats=None, baseline_profile=False):
         ''' Contains/compiles all the generic SQLs to be executed '''
+        self.__set_query_tag(check=dq_name)
         sqls = []
         dq_columns = []
-        generic_checks = GenericChecks()
+        generic_checks = GenericChecks(self.dialect)
+
+        if mode is not None and mode.lower() != 'exact':
+            if not (dq_name.startswith('trending') or dq_name in ('empty_null', 'unique')):
+                raise Exception("Mode '{m}' is not supported for '{dq}'".format(m=mode, dq=dq_name))
+
+        if incremental is not None:
+            if not self.dialect.supports_incremental:
+                raise Exception("Incremental mode is not supported for {db}".format(db=self.database_type))
+            if dq_name not in ('empty_null', 'unique', 'missing_dates'):
+                raise Exception("Incremental mode is not supported for '{dq}'".format(dq=dq_name))
+            if mode is not None and mode.lower() != 'exact':
+                raise Exception("Incremental mode cannot be used with mode '{m}'".format(m=mode))
+            incremental['hwm'] = self.__get_incremental_hwm(dq_name, columns, incremental['partition_columns'])
 
         if dq_name.startswith('trending'):
             # Any variations of trending test cases consider trending dq_name
@@ -511,19 +898,48 @@ class Detector:
                 column = self.__replace_variables(column)
                 dq_columns.append(column)
             sqls.extend(generic_checks.trending(dq_name, threshold, stop_on_failure, dq_columns, is_trial, description,
-                self.__get_class_variables(), compare_type, threshold_min))               
+                self.__get_class_variables(), compare_type, threshold_min, mode, baseline_profile))               
         elif dq_name == 'compare_to_source':
             dq_columns = ['count(*)']
-            sqls.extend(generic_checks.compare_to_source(dq_name, threshold, stop_on_failure, columns, is_trial, description,
-                self.__get_class_variables()))
+            if self.source_engine == self.database_type:
+                sqls.extend(generic_checks.compare_to_source(dq_name, threshold, stop_on_failure, columns, is_trial,
+                    description, self.__get_class_variables()))
+            else:
+                # Count both sides at the same time from their own database and compare here
+                tgt_sql = self.__replace_variables(generic_checks.count_rows(self.target_table, self.target_filter))
+                src_sql = self.__replace_variables(generic_checks.count_rows(self.source_table, self.source_filter))
+                # Each thread runs in a copy of the context (its queries are spans of this check)
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    tgt_future = executor.submit(contextvars.copy_context().run,
+                        self.__run_sql, tgt_sql, "Count target for '{dq}'".format(dq=dq_name))
+                    src_future = executor.submit(contextvars.copy_context().run,
+                        self.__run_source_sql, src_sql, "Count source for '{dq}'".format(dq=dq_name))
+                    tgt_result = tgt_future.result()
+                    src_result = src_future.result()
+                tgt_cnt = tgt_result[0][0] if tgt_result else None
+                src_cnt = src_result[0][0] if src_result else None
+                sqls.extend(generic_checks.compare_counts(dq_name, threshold, stop_on_failure, columns, is_trial,
+                    description, self.__get_class_variables(), tgt_cnt, src_cnt))
+        elif dq_name == 'data_diff':
+            if key is None:
+                raise Exception("DATA_DIFF check requires [key] to be specified")
+            if not self.dialect.supports_data_diff:
+                raise Exception("DATA_DIFF check is not supported for {db}".format(db=self.database_type))
+            if self.source_engine != self.database_type:
+                raise Exception("DATA_DIFF check requires source_table in the same database as target_table")
+            dq_columns = [key]
+            diff_ranges, tgt_cnt, src_cnt, null_key_diff = self.__run_data_diff(key, columns, buckets, granularity)
+            sqls.extend(generic_checks.data_diff(dq_name, threshold, stop_on_failure, key, is_trial, description,
+                self.__get_class_variables(), diff_ranges, tgt_cnt, src_cnt, null_key_diff))
         elif dq_name == 'empty_null':
             dq_columns.append('^'.join(columns))
             sqls.extend(generic_checks.empty_null(dq_name, threshold, stop_on_failure, columns, is_trial, description,
-                self.__get_class_variables()))
+                self.__get_class_variables(), incremental, mode, sample_rate, plan))
         elif dq_name == 'unique':
-            dq_columns.append('^'.join(columns))
+            # Composite keys (list of columns) are checked as a single key set
+            dq_columns.append('^'.join([','.join(c) if isinstance(c, list) else c for c in columns]))
             sqls.extend(generic_checks.unique(dq_name, threshold, stop_on_failure, columns, is_trial, description,
-                self.__get_class_variables()))
+                self.__get_class_variables(), incremental, mode))
         elif dq_name == 'up_to_date':
             for column in columns:
                 dq_columns.append(column)
@@ -538,12 +954,29 @@ class Detector:
             for column in columns:
                 dq_columns.append(column)
             sqls.extend(generic_checks.missing_dates(dq_name, threshold, stop_on_failure, columns, is_trial, description,
-                self.__get_class_variables()))
+                self.__get_class_variables(), incremental))
+        elif dq_name.startswith('seasonal'):
+            # Any variations of seasonal test cases consider seasonal dq_name
+            dq_name = 'seasonal'
+            for column in columns:
+                dq_columns.append(self.__replace_variables(column))
+            results = self.__run_seasonal(dq_columns, threshold, history_days, season, min_points)
+            sqls.extend(generic_checks.seasonal(dq_name, threshold, stop_on_failure, dq_columns, is_trial, description,
+                self.__get_class_variables(), results))
+            dq_columns = ['^'.join(dq_columns)]
+        elif dq_name.startswith('profile'):
+            # Any variations of profile test cases consider profile dq_name (ie: numeric vs text columns)
+            dq_name = 'profile'
+            for column in columns:
+                dq_columns.append(self.__replace_variables(column))
+            sqls.extend(generic_checks.profile(dq_name, threshold, stop_on_failure, dq_columns, is_trial, description,
+                self.__get_class_variables(), stats))
+            dq_columns = ['^'.join(generic_checks.profile_columns(dq_columns, stats))]
         elif dq_name.startswith('std_dev'):
             # Any variations of standard deviation test cases consider std_dev dq_name
             dq_name = 'std_dev'
-            # For testing the INSERT statement in unit_test mode
-            if self.is_unit_test:
+            # For testing the INSERT statement in unit_test mode (once for all std_dev checks)
+            if self.is_unit_test and not self.is_stddev_setup:
                 self.run_setup_stddev(is_exit=False)
             for column in columns:
                 column = self.__replace_variables(column)
@@ -553,10 +986,141 @@ class Detector:
         else:
             raise Exception("Unknown Generic DQ name")
 
+        # Refresh the incremental state before checking the result from it
+        for sql in generic_checks.state_sqls:
+            self.__run_sql(self.__replace_variables(sql), "Update incremental state for '{dq}'".format(dq=dq_name))
+
         self.__execute_dq(sqls, dq_name, dq_columns, stop_on_failure)
 
+    def __run_seasonal(self, columns, threshold, history_days, season, min_points):
+        ''' Get {column: (value, bounds, is_pass)} from the current values and seasonal baseline of all columns '''
+        generic_checks = GenericChecks(self.dialect)
+        vars = self.__get_class_variables()
+        values = self.__run_sql(self.__replace_variables(generic_checks.seasonal_values(columns, vars)),
+            "Get current values for 'seasonal'")
+        history = self.__run_sql(generic_checks.seasonal_history(columns, history_days, self.SEASONAL_HISTORY_DQ_NAMES, vars),
+            "Get history for 'seasonal'")
+        values = [None] * len(columns) if values is None else list(values[0])
+        history = [] if history is None else history
+
+        # Same threshold rules as std_dev (number of deviations with +/- for upward/downward only)
+        direction = None
+        if '+' in str(threshold):
+            direction = 'upward'
+        elif '-' in str(threshold):
+            direction = 'downward'
+        baseline = SeasonalBaseline(season=season, min_points=min_points).fit(
+            [row[0] for row in history],
+            [row[1] for row in history],
+            [self.__to_float(row[2]) for row in history],
+            )
+        result = baseline.evaluate(columns, self.dq_run_hour, [self.__to_float(v) for v in values],
+            abs(float(threshold)), direction)
+
+        results = {}
+        for i, column in enumerate(columns):
+            if result['has_baseline'][i]:
+                src_value = "{lo:.2f}|{hi:.2f} (median={m:.2f}, mad={mad:.2f}, n={n}, {s})".format(
+                    lo=result['lower'][i],
+                    hi=result['upper'][i],
+                    m=result['median'][i],
+                    mad=result['mad'][i],
+                    n=result['count'][i],
+                    s=season if result['is_seasonal'][i] else 'all',
+                    )
+            else:
+                src_value = "(n={n}, no baseline)".format(n=result['count'][i])
+            results[column] = (values[i], src_value, bool(result['is_pass'][i]))
+        return results
+
+    def __to_float(self, value):
+        ''' Metric value as float (NaN if it is missing or not a number) '''
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return float('nan')
+
+    def __get_data_diff_buckets(self, table, filter, key, columns, ranges, buckets, description):
+        ''' Get {bucket: (row count, hash)} of the key ranges of a table '''
+        sql = GenericChecks(self.dialect).data_diff_buckets(table, filter, key, columns, ranges, buckets)
+        result = self.__run_sql(self.__replace_variables(sql), description)
+        bucket_hashes = {}
+        if result is not None:
+            for row in result:
+                bucket_hashes[int(row[0])] = (row[1], row[2])
+        return bucket_hashes
+
+    def __run_data_diff(self, key, columns, buckets, granularity):
+        ''' Find the key ranges where source and target differ by bisecting the buckets with different hashes '''
+        if self.source_table is None:
+            raise Exception("DATA_DIFF check requires source_table to be specified")
+        if len(columns) == 0:
+            raise Exception("DATA_DIFF check requires [columns] to be specified")
+
+        generic_checks = GenericChecks(self.dialect)
+        tgt = self.__run_sql(self.__replace_variables(
+            generic_checks.data_diff_range(self.target_table, self.target_filter, key)), "Get key range of target")
+        src = self.__run_sql(self.__replace_variables(
+            generic_checks.data_diff_range(self.source_table, self.source_filter, key)), "Get key range of source")
+        # Nothing to compare for dry run
+        if tgt is None or src is None:
+            return ([], None, None, False)
+        (tgt_min, tgt_max, tgt_cnt, tgt_null_cnt) = tgt[0]
+        (src_min, src_max, src_cnt, src_null_cnt) = src[0]
+
+        # Rows with a NULL key are not in any bucket, so compare their count and hash separately
+        null_key_diff = False
+        if tgt_null_cnt > 0 or src_null_cnt > 0:
+            tgt_null = self.__run_sql(self.__replace_variables(generic_checks.data_diff_null_keys(
+                self.target_table, self.target_filter, key, columns)), "Get hash of NULL keys of target")
+            src_null = self.__run_sql(self.__replace_variables(generic_checks.data_diff_null_keys(
+                self.source_table, self.source_filter, key, columns)), "Get hash of NULL keys of source")
+            null_key_diff = tuple(tgt_null[0]) != tuple(src_null[0])
+
+        keys = [k for k in (tgt_min, tgt_max, src_min, src_max) if k is not None]
+        if len(keys) == 0:
+            return ([], tgt_cnt, src_cnt, null_key_diff)
+
+        diff_ranges = []
+        ranges = [(math.floor(min(keys)), math.floor(max(keys)) + 1)]
+        while len(ranges) > 0:
+            tgt_buckets = self.__get_data_diff_buckets(self.target_table, self.target_filter, key, columns,
+                ranges, buckets, "Get bucket hashes of target")
+            src_buckets = self.__get_data_diff_buckets(self.source_table, self.source_filter, key, columns,
+                ranges, buckets, "Get bucket hashes of source")
+
+            # Only go into the buckets with different hashes until they are small enough
+            split_ranges = []
+            for bucket in set(tgt_buckets) | set(src_buckets):
+                if tgt_buckets.get(bucket) == src_buckets.get(bucket):
+                    continue
+                (i, j) = divmod(bucket, buckets)
+                (start, end) = ranges[i]
+                width = max(-(-(end - start) // buckets), 1)
+                bucket_range = (start + j * width, min(start + (j + 1) * width, end))
+                num_rows = max(tgt_buckets.get(bucket, (0, None))[0], src_buckets.get(bucket, (0, None))[0])
+                if num_rows <= granularity or bucket_range[1] - bucket_range[0] <= 1:
+                    diff_ranges.append(bucket_range)
+                else:
+                    split_ranges.append(bucket_range)
+
+            # Limit the number of ranges to go into for each pass (report the rest as is)
+            split_ranges.sort()
+            diff_ranges.extend(split_ranges[self.DATA_DIFF_MAX_RANGES:])
+            ranges = split_ranges[:self.DATA_DIFF_MAX_RANGES]
+
+        # Merge the adjacent ranges
+        merged_ranges = []
+        for (start, end) in sorted(diff_ranges):
+            if len(merged_ranges) > 0 and merged_ranges[-1][1] == start:
+                merged_ranges[-1] = (merged_ranges[-1][0], end)
+            else:
+                merged_ranges.append((start, end))
+        return (merged_ranges, tgt_cnt, src_cnt, null_key_diff)
+
     def __run_custom_sql(self, dq_name, custom_sql, stop_on_failure=False, is_trial=False, description=""):
         ''' For gathering any custom sql or sql file to be executed '''
+        self.__set_query_tag(check=dq_name)
         sqls = []
         dq_columns = ['']
 
@@ -564,7 +1128,7 @@ class Detector:
         sqls.append("""
             {insert}
             SELECT
-                '{dq_run_hour}' AS dq_run_hour
+                {dq_run_hour} AS dq_run_hour
                 ,'{database_name}' AS database_name
                 ,'{schema_name}' AS schema_name
                 ,'{table_name}' AS table_name
@@ -579,7 +1143,7 @@ class Detector:
                 ,{stop} AS stop_on_failure
                 ,True AS is_dq_custom
                 ,{dq_key} AS dq_key
-                ,CURRENT_TIMESTAMP AS dq_start_tstamp
+                ,{current_timestamp} AS dq_start_tstamp
                 ,NULL AS dq_end_tstamp
                 ,'{db_username}' AS db_username
                 ,'{unix_username}' AS unix_username
@@ -592,7 +1156,8 @@ class Detector:
             ;
         """.format(
             insert=self.insert_sql,
-            dq_run_hour=self.dq_run_hour,
+            dq_run_hour=self.dialect.timestamp(self.dq_run_hour),
+            current_timestamp=self.dialect.current_timestamp(),
             database_name=self.target_database_name,
             schema_name=self.target_schema_name,
             table_name=self.target_table_name,
@@ -619,9 +1184,17 @@ class Detector:
 
             # Get result from DQ table to see if it passes or not
             sql_test_result = 'true'
-            for column in dq_columns[i].split('^'):
-                if dq_name == 'day_to_day':
-                    col = "AND dq_column ilike '{dq_column}%'".format(dq_column=column.replace("'", "''"))
+            columns = dq_columns[i].split('^')
+            # Get the results of all the metrics of the seasonal check at once (other checks read each column)
+            column_results = None
+            if dq_name == 'seasonal' and len(columns) > 1:
+                column_results = self.__get_column_results(dq_name, columns)
+            for column in columns:
+                if column_results is not None:
+                    test_sql = None
+                elif dq_name == 'day_to_day':
+                    col = "AND {ilike}".format(
+                        ilike=self.dialect.ilike("dq_column", "'{c}%'".format(c=column.replace("'", "''"))))
                     test_sql = """
                         SELECT
                             CASE WHEN SUM(num_fails) = 0 THEN true ELSE false END AS is_pass,
@@ -632,9 +1205,11 @@ class Detector:
                             (SELECT is_pass, dq_tgt_value, dq_src_value, dq_threshold,
                             CASE WHEN not is_pass THEN 1 ELSE 0 END AS num_fails
                             FROM {dq_table}
-                            WHERE dq_key = {dq_key} AND dq_name = '{dq_name}' {dq_column}) x
+                            WHERE dq_run_hour = {dq_run_hour} AND dq_key = {dq_key}
+                            AND dq_name = '{dq_name}' {dq_column}) x
                         """.format(
                         dq_table=self.dq_table,
+                        dq_run_hour=self.dialect.timestamp(self.dq_run_hour),
                         dq_key=self.dq_key,
                         dq_name=dq_name,
                         dq_column=col,
@@ -644,17 +1219,22 @@ class Detector:
                     test_sql = """
                         SELECT is_pass, dq_tgt_value, dq_src_value, dq_threshold
                         FROM {dq_table}
-                        WHERE dq_key = {dq_key} AND dq_name = '{dq_name}' {dq_column}
+                        WHERE dq_run_hour = {dq_run_hour} AND dq_key = {dq_key}
+                        AND dq_name = '{dq_name}' {dq_column}
                         ORDER BY dq_end_tstamp DESC LIMIT 1
                         """.format(
                         dq_table=self.dq_table,
+                        dq_run_hour=self.dialect.timestamp(self.dq_run_hour),
                         dq_key=self.dq_key,
                         dq_name=dq_name,
                         dq_column=col,
                         )
 
                 # Check test result
-                sql_test_result = self.__run_sql(test_sql, "Check result for '{dq}'".format(dq=dq_name))
+                if test_sql is None:
+                    sql_test_result = column_results.get(column, []) if not self.is_dry_run else None
+                else:
+                    sql_test_result = self.__run_sql(test_sql, "Check result for '{dq}'".format(dq=dq_name))
                 if sql_test_result is not None:
                     try:
                         sql_test_result = sql_test_result[0]
@@ -722,6 +1302,42 @@ class Detector:
                         if stop_on_failure:
                             self.to_error_out = True
 
+    def __get_column_results(self, dq_name, columns):
+        ''' Get {column: [(is_pass, tgt_value, src_value, threshold)]} of the columns of a check in one query '''
+        test_sql = """
+            SELECT dq_column, is_pass, dq_tgt_value, dq_src_value, dq_threshold
+            FROM {dq_table}
+            WHERE dq_run_hour = {dq_run_hour} AND dq_key = {dq_key}
+            AND dq_name = '{dq_name}' AND dq_column IN ('{dq_columns}')
+            ORDER BY dq_end_tstamp DESC
+            """.format(
+            dq_table=self.dq_table,
+            dq_run_hour=self.dialect.timestamp(self.dq_run_hour),
+            dq_key=self.dq_key,
+            dq_name=dq_name,
+            dq_columns="','".join([c.replace("'", "''") for c in columns]),
+            )
+        result = self.__run_sql(test_sql, "Check results for '{dq}'".format(dq=dq_name))
+        column_results = {}
+        if result is not None:
+            for row in result:
+                # Keep the first (latest) row of each column
+                if row[0] not in column_results:
+                    column_results[row[0]] = [tuple(row[1:])]
+        return column_results
+
+    def __set_query_tag(self, **fields):
+        ''' Tag the next queries of the DQ and source connections (job, check, dq_key) '''
+        for db in (self.db, self.source_db):
+            if db is not None and hasattr(db, 'query_log'):
+                db.query_log.set_tag(**fields)
+
+    def __flush_query_log(self):
+        ''' Write the timing of the queries of this run (with bytes scanned) '''
+        for db in (self.db, self.source_db):
+            if db is not None and hasattr(db, 'flush_query_log'):
+                db.flush_query_log()
+
     def __print_summary(self):
         print("{s} Data Validation Summary {s}".format(s='*'*90))
         for t in self.test_summary:
@@ -0,0 +1,48 @@
+import os
+
+from .presto import Presto
+
+class DetectorForPresto(Presto):
+    def __init__(self, catalog, schema, PRESTO_ENV='PRESTO_ENV', *args, **kwargs):
+        Presto.__init__(self, *args, **kwargs)
+
+        # Presto catalog/schema of the DQ tables
+        self.catalog = catalog
+        self.schema = schema
+
+        # Presto has no account per environment so it is set from environment variable
+        self.presto_env = os.environ.get(PRESTO_ENV, 'NON-PROD')
+
+    @property
+    def env(self) -> str:
+        if self.presto_env.upper() == 'PROD':
+            return 'PROD'
+        return 'NON-PROD'
+
+    @property
+    def shared_schema(self) -> str:
+        return ".".join([self.catalog, self.schema])
+
+    @property
+    def user_database(self) -> str:
+        return self.catalog
+
+    @property
+    def dq_table(self) -> str:
+        return f"{self.shared_schema}.dq_data_result"
+
+    @property
+    def dq_archive_table(self) -> str:
+        return f"{self.shared_schema}.dq_data_result_archive"
+
+    @property
+    def dq_state_table(self) -> str:
+        return f"{self.shared_schema}.dq_incremental_state"
+
+    def query(self, sql):
+        # Each DQ SQL is a single statement (trailing ';' would be run as an empty statement)
+        return Presto.query(self, sql.strip().rstrip(';'))
+
+    def use_cached_result(self, use_cache=True):
+        # Presto does not cache query results
+        print("*** USE_CACHE={use_cache} (ignored for Presto) ***".format(**locals()))
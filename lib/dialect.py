@@ -0,0 +1,191 @@
+class SnowflakeDialect:
+    ''' SQL snippets for the generic checks running in Snowflake '''
+    name = 'snowflake'
+
+    # Snowflake only features (HLL sketches, FLATTEN, HASH_AGG, MERGE, clustering)
+    supports_incremental = True
+    supports_data_diff = True
+    supports_archive = True
+    # If a column can be compared to a date without casting it (ie: to prune on the raw column)
+    implicit_casts = True
+    approx_count_distinct_function = 'APPROX_COUNT_DISTINCT'
+
+    # This is to define how to map column types of the DQ tables to database
+    columns_mapping = {
+        'string': 'string',
+        'bigint': 'BIGINT',
+        'boolean': 'boolean',
+        'timestamp': 'TIMESTAMP WITHOUT TIME ZONE',
+    }
+
+    def to_date(self, expr):
+        return "{e}::date".format(e=expr)
+
+    def to_varchar(self, expr):
+        return "{e}::VARCHAR".format(e=expr)
+
+    def cast(self, expr, data_type):
+        return "{e}::{t}".format(e=expr, t=data_type)
+
+    def timestamp(self, value):
+        ''' Timestamp literal (ie: dq_run_hour) '''
+        return "'{v}'".format(v=value)
+
+    def current_timestamp(self):
+        return "CURRENT_TIMESTAMP"
+
+    def interval(self, num, unit):
+        return "interval '{n} {u}'".format(n=num, u=unit)
+
+    def date_add(self, unit, num, expr):
+        return "DATEADD({u}, '{n}', {e})".format(u=unit, n=num, e=expr)
+
+    def ilike(self, expr, pattern):
+        return "{e} ilike {p}".format(e=expr, p=pattern)
+
+    def concat(self, exprs, separator):
+        return (" || '" + separator + "' || ").join(exprs)
+
+    def approx_count_distinct(self, exprs):
+        return "{f}({e})".format(f=self.approx_count_distinct_function, e=", ".join(exprs))
+
+    def grouping_id(self, exprs):
+        return "GROUPING_ID({e})".format(e=", ".join(exprs))
+
+    def date_series(self, max_date, days):
+        ''' Rows of the last number of days (date_col) up to the max_date column of the max_date CTE '''
+        return """
+                SELECT
+                  DATEADD(day, '-' ||
+                    ROW_NUMBER() OVER (ORDER BY NULL), DATEADD(day, '+1', m.{max_date})) AS date_col
+                FROM table (generator(rowcount => {days})),
+                    max_date m
+        """.format(max_date=max_date, days=days)
+
+    def unpivot(self, names, values, from_clause, name_alias, value_alias):
+        ''' Turn an aggregate row of values (with total_cnt) into one row per name '''
+        return """
+                SELECT s.total_cnt, GET(s.col_nms, f.index)::VARCHAR AS {name_alias}, f.value::INT AS {value_alias}
+                FROM
+                (SELECT count(*) total_cnt
+                    ,ARRAY_CONSTRUCT({names}) AS col_nms
+                    ,ARRAY_CONSTRUCT(
+                    {values}
+                    ) AS col_cnts
+                {from_clause}) s,
+                LATERAL FLATTEN(input => s.col_cnts) f
+        """.format(
+            names=", ".join(names),
+            values="\n                    ,".join(values),
+            from_clause=from_clause,
+            name_alias=name_alias,
+            value_alias=value_alias,
+            )
+
+    def partitions_table(self, table):
+        ''' Table of the partition values (None if it is not available) '''
+        return None
+
+
+class PrestoDialect(SnowflakeDialect):
+    ''' SQL snippets for the generic checks running in Presto '''
+    name = 'presto'
+
+    supports_incremental = False
+    supports_data_diff = False
+    supports_archive = False
+    implicit_casts = False
+    approx_count_distinct_function = 'approx_distinct'
+
+    columns_mapping = {
+        'string': 'varchar',
+        'bigint': 'bigint',
+        'boolean': 'boolean',
+        'timestamp': 'timestamp',
+    }
+
+    # Snowflake data types which are not the same in Presto
+    types_mapping = {
+        'INT': 'INTEGER',
+        'FLOAT': 'DOUBLE',
+    }
+
+    def to_date(self, expr):
+        return "CAST({e} AS date)".format(e=expr)
+
+    def to_varchar(self, expr):
+        return "CAST({e} AS VARCHAR)".format(e=expr)
+
+    def cast(self, expr, data_type):
+        return "CAST({e} AS {t})".format(e=expr, t=self.types_mapping.get(data_type.upper(), data_type))
+
+    def timestamp(self, value):
+        return "CAST('{v}' AS timestamp)".format(v=value)
+
+    def current_timestamp(self):
+        return "CAST(current_timestamp AS timestamp)"
+
+    def interval(self, num, unit):
+        return "interval '{n}' {u}".format(n=num, u=unit)
+
+    def date_add(self, unit, num, expr):
+        return "date_add('{u}', {n}, {e})".format(u=unit, n=num, e=expr)
+
+    def ilike(self, expr, pattern):
+        return "lower({e}) LIKE lower({p})".format(e=expr, p=pattern)
+
+    def concat(self, exprs, separator):
+        # || only takes varchar (keep a single column as is, ie: for ordering)
+        if len(exprs) == 1:
+            return exprs[0]
+        return (" || '" + separator + "' || ").join([self.to_varchar(e) for e in exprs])
+
+    def approx_count_distinct(self, exprs):
+        # approx_distinct only takes a single column
+        if len(exprs) > 1:
+            return "{f}({e})".format(f=self.approx_count_distinct_function, e=self.concat(exprs, '|'))
+        return "{f}({e})".format(f=self.approx_count_distinct_function, e=exprs[0])
+
+    def grouping_id(self, exprs):
+        return "grouping({e})".format(e=", ".join(exprs))
+
+    def date_series(self, max_date, days):
+        return """
+                SELECT d.date_col
+                FROM max_date m
+                CROSS JOIN UNNEST(sequence(date_add('day', -{last_day}, m.{max_date}), m.{max_date})) AS d(date_col)
+        """.format(max_date=max_date, last_day=days - 1)
+
+    def unpivot(self, names, values, from_clause, name_alias, value_alias):
+        return """
+                SELECT s.total_cnt, f.{name_alias}, f.{value_alias}
+                FROM
+                (SELECT count(*) total_cnt
+                    ,ARRAY[{names}] AS col_nms
+                    ,ARRAY[
+                    {values}
+                    ] AS col_cnts
+                {from_clause}) s
+                CROSS JOIN UNNEST(s.col_nms, s.col_cnts) AS f({name_alias}, {value_alias})
+        """.format(
+            names=", ".join(names),
+            values="\n                    ,".join(values),
+            from_clause=from_clause,
+            name_alias=name_alias,
+            value_alias=value_alias,
+            )
+
+    def partitions_table(self, table):
+        # Hive connector exposes the partition values as catalog.schema."table$partitions"
+        (catalog, schema, table_name) = table.split('.')
+        return '{c}.{s}."{t}$partitions"'.format(c=catalog, s=schema, t=table_name)
+
+
+def get_dialect(database_type):
+    ''' Dialect of the generic checks for a database type '''
+    if database_type is None or database_type.lower() == 'snowflake':
+        return SnowflakeDialect()
+    elif database_type.lower() == 'presto':
+        return PrestoDialect()
+    else:
+        raise Exception("Unknown database type!")
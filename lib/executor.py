@@ -8,9 +8,11 @@ from yamlinclude import YamlIncludeConstructor
 from .executor_presto import ExecutorForPresto
 from .watcher import Watcher
 from .detector import Detector
+from .tracing import get_tracer
 
 class Executor:
-    def __init__(self, yaml_file, run_setup=False, steps=None, is_dry_run=False, is_unit_test=False, variables=[]):
+    def __init__(self, yaml_file, run_setup=False, steps=None, is_dry_run=False, is_unit_test=False, variables=[],
+        connection=None, db=None, presto=None):
         # This unique key is to identify all the ETL steps for each run
         self.etl_run_key = int(time.time())
 
@@ -30,6 +32,11 @@ class Executor:
         self.is_unit_test = is_unit_test
 
         self.variables = variables
+        # DB-API connection of the ETL steps (ie: ReplayConnection, otherwise connect from environment variables)
+        self.connection = connection
+        # Connections of the Watcher and DQ detector (ie: on a ReplayConnection, otherwise from environment variables)
+        self.db = db
+        self.presto = presto
         self.database_type = None
         self.database_catalog = None
         self.target_table = None
@@ -47,6 +54,10 @@ class Executor:
         self.yaml_path = os.path.dirname(os.path.abspath(yaml_file))
         self.dq_file = None
         self.watcher_file = None
+        # Dependencies of each ETL step (a step starts once its own ones are ready)
+        self.step_dependencies = None
+        self.watch_events = None
+        self.ready_dependencies = set()
         self.etl_file = os.path.abspath(yaml_file)
 
         self.__setup_config(yaml_file)
@@ -101,6 +112,10 @@ class Executor:
         if 'wait_for' in self.config_data:
             watcher_filename = self.config_data['wait_for']['file']
             self.watcher_file = self.yaml_path + "/" + watcher_filename
+            if 'steps' in self.config_data['wait_for']:
+                self.step_dependencies = {}
+                for step, dependencies in self.config_data['wait_for']['steps'].items():
+                    self.step_dependencies[step] = [self.__replace_variables(d).lower() for d in dependencies]
 
         if 'etl' not in self.config_data:
             raise Exception("Missing etl")
@@ -170,6 +185,7 @@ class Executor:
                 if self.etl[etl_name]['enabled']:
                     sql = None
                     print(">= {n} =<".format(n=etl_name))
+                    exe.query_log.set_tag(step=etl_name)
                     if etl_name.startswith("tmp"):
                         etl_sql = self.etl[etl_name]['sql']
                         self.tmp_tables[etl_name] = {}
@@ -225,24 +241,61 @@ class Executor:
                     else:
                         raise Exception("Unknown ETL name")
                     sql = self.__replace_variables(sql)
-                    print('[' + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + '] Running')
-                    exe.execute_sql(sql)
-                    print('[' + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + '] Done')
+                    with get_tracer().span('step', etl_name):
+                        self.__wait_for_step(etl_name)
+                        print('[' + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + '] Running')
+                        exe.execute_sql(sql)
+                        print('[' + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + '] Done')
                 else:
                     print("*** {e} IS SKIPPED ***".format(e=etl_name))
 
+    def __wait_for_step(self, etl_name):
+        ''' Wait until the dependencies of the ETL step are ready (all of them if the step is not mapped) '''
+        if self.watch_events is None:
+            return
+        dependencies = self.step_dependencies.get(etl_name)
+        with get_tracer().span('wait', etl_name or 'all', dependencies=dependencies):
+            while dependencies is None or not set(dependencies) <= self.ready_dependencies:
+                try:
+                    event = next(self.watch_events)
+                except StopIteration:
+                    # All the dependencies are ready
+                    self.watch_events = None
+                    return
+                self.ready_dependencies.add(event['name'])
+        print('[' + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + '] Dependencies of {e} are ready'.format(
+            e=etl_name))
+
     def run_etl(self):
         ''' Main function to generate and execute the ETL '''
+        # Root span of the run (written to DQ_TRACE when it ends)
+        with get_tracer().span('run', os.path.basename(self.etl_file), etl_run_key=self.etl_run_key):
+            self.__run_etl()
+
+    def __run_etl(self):
         # If watcher file is set, run Watcher
         if self.watcher_file is not None and len(self.steps) == 0:
-            print('>= Execute Watcher file: {f} =<'.format(f=self.dq_file))
+            print('>= Execute Watcher file: {f} =<'.format(f=self.watcher_file))
             w = Watcher(
                 yaml_file=self.watcher_file,
                 is_dry_run=self.is_dry_run,
                 is_unit_test=self.is_unit_test,
                 variables=self.variables,
+                db=self.db,
+                presto=self.presto,
                 )
-            w.run_watcher()
+            if self.step_dependencies is None or self.run_setup:
+                with get_tracer().span('phase', 'watcher'):
+                    w.run_watcher()
+            else:
+                # Start each ETL step as soon as its dependencies are ready (the others are still waited for)
+                for step, dependencies in self.step_dependencies.items():
+                    if step not in self.etl:
+                        raise Exception("Unknown ETL step {s} in wait_for".format(s=step))
+                    for dependency in dependencies:
+                        if dependency not in w.get_dependencies():
+                            raise Exception("{d} of {s} is not in the Watcher file".format(d=dependency, s=step))
+                self.watch_events = w.watch()
 
         # ETL execution step
         print('>= Execute ETL file: {f} =<'.format(f=self.etl_file))
@@ -258,10 +311,20 @@ class Executor:
                 self.staging_tables[staging_table]['table'] = table
             # Update tmp_tables with catalog
             # => have to be done during ETL execution in __execute_all_etl() <=
-            exe = ExecutorForPresto(self.database_catalog, self.is_dry_run)
+            exe = ExecutorForPresto(self.database_catalog, self.is_dry_run, connection=self.connection)
         else:
             raise Exception("Unknown database type!")
-        self.__execute_all_etl(exe)
+        # Tag of all the queries of this run (step is set by each ETL step)
+        exe.query_log.set_tag(job=os.path.basename(self.etl_file), etl_run_key=self.etl_run_key)
+        with get_tracer().span('phase', 'etl'):
+            try:
+                self.__execute_all_etl(exe)
+            finally:
+                # Queries of a failed step are logged too
+                exe.query_log.set_tag(step=None)
+                exe.flush_query_log()
+            # Still wait for the dependencies not needed by any step (same as the Watcher before the ETL)
+            self.__wait_for_step(None)
         print('')
 
         # If DQ file is set, run DQ detector
@@ -272,5 +335,7 @@ class Executor:
                 is_dry_run=self.is_dry_run,
                 is_unit_test=self.is_unit_test,
                 variables=self.variables,
+                db=self.db,
                 )
-            d.run_dq()
+            with get_tracer().span('phase', 'dq'):
+                d.run_dq()
@@ -1,4 +1,5 @@
 import os
+import getpass
 
 from .presto import Presto
 
@@ -24,8 +25,11 @@ class ExecutorForPresto(Presto):
             'boolean' : 'boolean',
         }
 
-        # Get current unix username
-        username = os.getlogin()
+        # Get current unix username (no login terminal when running from a scheduler or replay)
+        try:
+            username = os.getlogin()
+        except OSError:
+            username = getpass.getuser()
 
         # Default columns DDL structure
         self.default_columns_type = {
@@ -1,11 +1,240 @@
+import re
+import hashlib
+from lib.dialect import SnowflakeDialect
+
 class GenericChecks:
-    def __init__(self):
+    # Relative error of the HLL estimates merged from the incremental state (Snowflake average error is ~1.6%)
+    HLL_ERROR = 0.0325
+    # z-score for the confidence bounds of sampled estimates (95%)
+    SAMPLE_Z = 1.96
+    # Stats computed by the profile check for each column
+    PROFILE_STATS = ['min', 'max', 'null_cnt', 'distinct', 'mean', 'length']
+    # SQL words which are not columns when checking the columns used by an expression
+    SQL_KEYWORDS = ['and', 'or', 'not', 'in', 'is', 'null', 'between', 'like', 'as', 'true', 'false',
+        'case', 'when', 'then', 'else', 'end', 'date', 'timestamp', 'varchar', 'integer', 'bigint',
+        'interval', 'day', 'month', 'year', 'current_date']
+
+    def __init__(self, dialect=None):
         self.sqls = []
+        # Statements to run before the DQ SQLs (ie: to refresh incremental state)
+        self.state_sqls = []
+        # SQL dialect of the database where the checks run (default to Snowflake)
+        self.dialect = dialect if dialect is not None else SnowflakeDialect()
+
+    def __is_plain_column(self, column):
+        ''' If the column is a column name (not an expression) so it can be answered from metadata '''
+        return re.match(r'^([A-Za-z_][A-Za-z0-9_$]*|"[^"]+")$', column.strip()) is not None
+
+    def __is_date_partition(self, column, vars):
+        ''' If the column is a partition column declared as DATE/TIMESTAMP_NTZ (same order as its dates) '''
+        date_columns = set([c.lower() for c in vars['target_date_columns']])
+        return self.__is_plain_column(column) and column.strip().lower() in date_columns
+
+    def __max_date(self, column, vars):
+        ''' MAX of a column as date (on the column itself for a date partition to use partition metadata) '''
+        # Other columns might be dates as strings (ie: MM/DD/YYYY) or with a time zone
+        if self.__is_date_partition(column, vars):
+            return self.dialect.to_date("MAX({column})".format(column=column))
+        return "MAX({column})".format(column=self.dialect.to_date(column))
+
+    def __get_columns(self, expr):
+        ''' Column names used by an expression (without functions, keywords and literals) '''
+        expr = re.sub(r"'[^']*'", "", expr)
+        names = re.findall(r'\b([A-Za-z_][A-Za-z0-9_]*)\b(?!\s*\()', expr)
+        return set([n.lower() for n in names if n.lower() not in self.SQL_KEYWORDS])
+
+    def __metadata_table(self, column, vars):
+        ''' Table to query the column from: the partitions table when the column and filter only use partition columns '''
+        partitions_table = self.dialect.partitions_table(vars['target_table'])
+        partition_columns = set([c.lower() for c in vars['target_partition_columns']])
+        if partitions_table is None or len(partition_columns) == 0:
+            return vars['target_table']
+        if not self.__get_columns(column) <= partition_columns:
+            return vars['target_table']
+        if not self.__get_columns(vars['target_filter']) <= partition_columns:
+            return vars['target_table']
+        return partitions_table
+
+    def __check_mode(self, check_name, mode, supported_modes):
+        ''' Validate the execution mode (exact/approx/sample) of a check '''
+        if mode is None:
+            mode = 'exact'
+        mode = mode.lower()
+        if mode not in supported_modes:
+            raise Exception('{c} check does not support [mode] {m} (only {s})'.format(
+                c=check_name, m=mode, s='/'.join(supported_modes)))
+        return mode
+
+    def __incremental_filter(self, incremental):
+        ''' Filter on the partition columns for partitions at or after the high-water mark '''
+        partition_columns = incremental['partition_columns']
+        hwm = incremental.get('hwm')
+        if hwm is None:
+            return "1=1"
+        # Numbers are compared as numbers (ie: unpadded month 9 < 10), other values on the column type
+        hwm_values = [v if v.isdigit() else "'{v}'".format(v=v.replace("'", "''")) for v in hwm.split('|')]
+        # Expand (c1, c2, ...) >= (v1, v2, ...) on the raw columns so it can be used for pruning
+        conditions = []
+        for i, column in enumerate(partition_columns):
+            equals = ["{c} = {v}".format(c=c, v=v) for c, v in zip(partition_columns[:i], hwm_values[:i])]
+            op = '>=' if i == len(partition_columns) - 1 else '>'
+            equals.append("{c} {op} {v}".format(c=column, op=op, v=hwm_values[i]))
+            conditions.append("(" + " AND ".join(equals) + ")")
+        return "{c} >= {v} AND ({cond})".format(
+            c=partition_columns[0],
+            v=hwm_values[0],
+            cond="\n                      OR ".join(conditions),
+            )
+
+    def __partition_parts(self, num_columns):
+        ''' Partition values of a state row (as strings) from its partition_value '''
+        return ["SPLIT_PART(partition_value, '|', {i})".format(i=i) for i in range(1, num_columns + 1)]
+
+    def __dq_filter(self, vars):
+        ''' Key of the target filter in the state rows (before variables are replaced) '''
+        return hashlib.md5(' '.join(vars['target_filter'].split()).encode()).hexdigest()
+
+    def __incremental_prune_sql(self, dq_name, incremental, vars):
+        ''' Delete the state rows of partitions a full scan would not see anymore '''
+        partition_columns = incremental['partition_columns']
+        parts = self.__partition_parts(len(partition_columns))
+        # Partitions dropped from the target table (before its first partition)
+        prune_condition = "{p} < (SELECT MIN({c}) FROM {target_table})".format(
+            p=parts[0], c=partition_columns[0], target_table=vars['target_table'])
+        # Partitions out of a (rolling) filter on the partition columns
+        partition_set = set([c.lower() for c in partition_columns])
+        if self.__get_columns(vars['target_filter']) <= partition_set:
+            prune_condition += """
+                   OR partition_value NOT IN (
+                       SELECT partition_value
+                       FROM (SELECT partition_value, {columns} FROM {dq_state_table} WHERE {state_filter}) p
+                       WHERE {target_filter})""".format(
+                columns=", ".join(["{p} AS {c}".format(p=p, c=c) for p, c in zip(parts, partition_columns)]),
+                dq_state_table=vars['dq_state_table'],
+                state_filter=self.__incremental_state_filter(dq_name, vars),
+                target_filter=vars['target_filter'],
+                )
+        return """
+            DELETE FROM {dq_state_table}
+            WHERE {state_filter}
+              AND ({prune_condition})
+            ;
+        """.format(
+            dq_state_table=vars['dq_state_table'],
+            state_filter=self.__incremental_state_filter(dq_name, vars),
+            prune_condition=prune_condition,
+            )
+
+    def __incremental_state_sqls(self, dq_name, column_list, partials, incremental, vars):
+        ''' Prune the state and merge partial aggregates of the new partitions into it '''
+        partition_columns = incremental['partition_columns']
+        partition_value = " || '|' || ".join(["CAST({c} AS VARCHAR)".format(c=c) for c in partition_columns])
+        select_list = []
+        with_clause = """
+                WITH subq AS
+                (SELECT {partition_value} AS partition_value, count(*) total_cnt
+        """.format(partition_value=partition_value)
+        i = 1
+        for column in column_list:
+            for partial in partials:
+                with_clause += """
+                    ,{expr} AS col{i}_{name}
+                """.format(expr=partials[partial].format(column=column), i=i, name=partial)
+            select_list.append("""
+                SELECT partition_value, '{column}'::VARCHAR AS dq_column, total_cnt
+                    ,{value_cnt} AS value_cnt
+                    ,{key_sketch} AS key_sketch
+                    ,{date_values} AS date_values
+                FROM subq
+            """.format(
+                column=column.replace("'", "''"),
+                value_cnt="col{i}_value_cnt".format(i=i) if 'value_cnt' in partials else "NULL",
+                key_sketch="col{i}_key_sketch".format(i=i) if 'key_sketch' in partials else "NULL",
+                date_values="col{i}_date_values".format(i=i) if 'date_values' in partials else "NULL",
+                ))
+            i += 1
+        with_clause += """
+                FROM {target_table}
+                WHERE ({target_filter})
+                  AND {incremental_filter}
+                GROUP BY 1)
+        """.format(
+            target_table=vars['target_table'],
+            target_filter=vars['target_filter'],
+            incremental_filter=self.__incremental_filter(incremental),
+            )
+        with_clause += ' UNION ALL '.join(select_list)
+
+        return [self.__incremental_prune_sql(dq_name, incremental, vars), """
+            MERGE INTO {dq_state_table} s
+            USING (
+                {with_clause}
+            ) n
+            ON (s.database_name = '{database_name}' AND s.schema_name = '{schema_name}' AND s.table_name = '{table_name}'
+                AND s.dq_name = '{dq_name}' AND s.env = '{env}' AND s.dq_filter = '{dq_filter}'
+                AND s.dq_column = n.dq_column AND s.partition_value = n.partition_value)
+            WHEN MATCHED THEN UPDATE SET
+                total_cnt = n.total_cnt
+                ,value_cnt = n.value_cnt
+                ,key_sketch = n.key_sketch
+                ,date_values = n.date_values
+                ,dq_key = {dq_key}
+                ,dq_update_tstamp = CURRENT_TIMESTAMP
+            WHEN NOT MATCHED THEN INSERT
+                (database_name, schema_name, table_name, dq_name, dq_column, env, dq_filter, partition_value,
+                 total_cnt, value_cnt, key_sketch, date_values, dq_key, dq_update_tstamp)
+            VALUES
+                ('{database_name}', '{schema_name}', '{table_name}', '{dq_name}', n.dq_column, '{env}', '{dq_filter}',
+                 n.partition_value, n.total_cnt, n.value_cnt, n.key_sketch, n.date_values, {dq_key}, CURRENT_TIMESTAMP)
+            ;
+        """.format(
+            dq_state_table=vars['dq_state_table'],
+            with_clause=with_clause,
+            database_name=vars['target_database_name'],
+            schema_name=vars['target_schema_name'],
+            table_name=vars['target_table_name'],
+            dq_name=dq_name,
+            env=vars['env'],
+            dq_filter=self.__dq_filter(vars),
+            dq_key=vars['dq_key'],
+            )]
+
+    def __incremental_state_filter(self, dq_name, vars):
+        ''' Filter of the incremental state rows for a check on the target table '''
+        return """database_name = '{database_name}' AND schema_name = '{schema_name}' AND table_name = '{table_name}'
+                    AND dq_name = '{dq_name}' AND env = '{env}' AND dq_filter = '{dq_filter}'""".format(
+            database_name=vars['target_database_name'],
+            schema_name=vars['target_schema_name'],
+            table_name=vars['target_table_name'],
+            dq_name=dq_name,
+            env=vars['env'],
+            dq_filter=self.__dq_filter(vars),
+            )
+
+    def get_incremental_hwm(self, dq_name, columns, partition_columns, vars):
+        ''' SQL to get the high-water mark partition of each column for a check '''
+        # Latest partition on each partition column in turn (as a number when it is one, ie: 2024|9|30 < 2024|10|1)
+        order_by = []
+        for part in self.__partition_parts(len(partition_columns)):
+            order_by.append("TRY_TO_NUMBER({p}) DESC NULLS LAST, {p} DESC".format(p=part))
+        return """
+            SELECT dq_column, partition_value
+            FROM {dq_state_table}
+            WHERE {state_filter}
+              AND dq_column IN ('{columns}')
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY dq_column ORDER BY {order_by}) = 1
+        """.format(
+            dq_state_table=vars['dq_state_table'],
+            state_filter=self.__incremental_state_filter(dq_name, vars),
+            columns="','".join([c.replace("'", "''") for c in columns]),
+            order_by=", ".join(order_by),
+            )
 
     def trending(self, dq_name, threshold, stop_on_failure, columns, is_trial, description, vars,
-        compare_type=None, threshold_min=None):
+        compare_type=None, threshold_min=None, mode=None, baseline_profile=False):
         if len(columns) == 0:
             raise Exception('TRENDING check requires [columns] to be specified')
+        mode = self.__check_mode('TRENDING', mode, ['exact', 'approx'])
 
         # If there's a min threshold specified, execute a different logic
         # and no more for up and down
@@ -40,27 +269,44 @@ class GenericChecks:
 
         # Set comparison type (default to last previous run)
         desc = description.replace("'", "''")
+        dq_run_date = self.dialect.to_date("dq_run_hour")
         if compare_type == 'day':
-            dq_date_range = "dq_run_hour::date = current_date - interval '1 day'"
+            dq_date_range = "{d} = current_date - {i}".format(d=dq_run_date, i=self.dialect.interval(1, 'day'))
             desc += " (day-over-day)"
         elif compare_type == 'week':
-            dq_date_range = "dq_run_hour::date = current_date - interval '7 day'"
+            dq_date_range = "{d} = current_date - {i}".format(d=dq_run_date, i=self.dialect.interval(7, 'day'))
             desc += " (week-over-week)"
         elif compare_type == 'month':
-            dq_date_range = "dq_run_hour::date = current_date - interval '1 month'"
+            dq_date_range = "{d} = current_date - {i}".format(d=dq_run_date, i=self.dialect.interval(1, 'month'))
             desc += " (month-over-month)"
         elif compare_type == 'year':
-            dq_date_range = "dq_run_hour::date = current_date - interval '1 year'"
+            dq_date_range = "{d} = current_date - {i}".format(d=dq_run_date, i=self.dialect.interval(1, 'year'))
             desc += " (year-over-year)"
         else:
             dq_date_range = "1=1"
 
+        # Approx mode replaces distinct counts with HLL estimates
+        if mode == 'approx':
+            desc += " (approx)"
+
+        # Baseline of the previous trending runs, or also of the profile stats if opted in
+        # (a profile of this run is not the previous value)
+        baseline_dq_names = "'trending'"
+        baseline_filter = ""
+        if baseline_profile:
+            baseline_dq_names = "'trending', 'profile'"
+            baseline_filter = "AND COALESCE(dq_key, 0) <> {dq_key}".format(dq_key=vars['dq_key'])
+
         for column in columns:
+            column_expr = column
+            if mode == 'approx':
+                column_expr = re.sub(r'count\s*\(\s*distinct\s+', self.dialect.approx_count_distinct_function + '(',
+                    column, flags=re.IGNORECASE)
             self.sqls.append("""
                 -- Trending type: {trending_type}
                 {insert}
                 SELECT
-                    '{dq_run_hour}' AS dq_run_hour
+                    {dq_run_hour} AS dq_run_hour
                     ,'{database_name}' AS database_name
                     ,'{schema_name}' AS schema_name
                     ,'{table_name}' AS table_name
@@ -79,7 +325,7 @@ class GenericChecks:
                     ,{stop} AS stop_on_failure
                     ,false AS is_dq_custom
                     ,{dq_key} AS dq_key
-                    ,CURRENT_TIMESTAMP AS dq_start_tstamp
+                    ,{current_timestamp} AS dq_start_tstamp
                     ,NULL AS dq_end_tstamp
                     ,'{db_username}' AS db_username
                     ,'{unix_username}' AS unix_username
@@ -92,12 +338,13 @@ class GenericChecks:
                         WHERE {target_filter}
                     ) t LEFT OUTER JOIN
                     (
-                        SELECT table_name, CAST(dq_tgt_value AS FLOAT) AS dq_src_value
+                        SELECT table_name, CAST(dq_tgt_value AS DOUBLE) AS dq_src_value
                         FROM {dq_table_prod}
                         WHERE database_name = '{database_name}' AND schema_name = '{schema_name}' AND table_name = '{table_name}'
-                          AND dq_name = 'trending' AND dq_column = '{column_desc}'
+                          AND dq_name IN ({baseline_dq_names}) AND dq_column = '{column_desc}'
                           AND env = '{env}'
                           AND {dq_date_range}
+                          {baseline_filter}
                         ORDER BY dq_run_hour DESC LIMIT 1
                     ) s
                     ON (1=1)
@@ -105,13 +352,14 @@ class GenericChecks:
             """.format(
                 trending_type=trending_type,
                 insert=vars['insert_sql'],
-                dq_run_hour=vars['dq_run_hour'],
+                dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+                current_timestamp=self.dialect.current_timestamp(),
                 database_name=vars['target_database_name'],
                 schema_name=vars['target_schema_name'],
                 table_name=vars['target_table_name'],
                 table_filter=vars['target_filter'].replace("1=1","").replace("'", "''"),
                 column_desc=column.replace("'", "''"),
-                column=column,
+                column=column_expr,
                 desc=desc,
                 target_table=vars['target_table'],
                 target_filter=vars['target_filter'],
@@ -126,6 +374,8 @@ class GenericChecks:
                 env=vars['env'],
                 trial=is_trial,
                 dq_date_range=dq_date_range,
+                baseline_dq_names=baseline_dq_names,
+                baseline_filter=baseline_filter,
                 )
             )
 
@@ -135,7 +385,7 @@ class GenericChecks:
         self.sqls.append("""
             {insert}
             SELECT
-                '{dq_run_hour}' AS dq_run_hour
+                {dq_run_hour} AS dq_run_hour
                 ,'{database_name}' AS database_name
                 ,'{schema_name}' AS schema_name
                 ,'{table_name}' AS table_name
@@ -154,7 +404,7 @@ class GenericChecks:
                 ,{stop} AS stop_on_failure
                 ,false AS is_dq_custom
                 ,{dq_key} AS dq_key
-                ,CURRENT_TIMESTAMP AS dq_start_tstamp
+                ,{current_timestamp} AS dq_start_tstamp
                 ,NULL AS dq_end_tstamp
                 ,'{db_username}' AS db_username
                 ,'{unix_username}' AS unix_username
@@ -166,7 +416,8 @@ class GenericChecks:
             ;
         """.format(
             insert=vars['insert_sql'],
-            dq_run_hour=vars['dq_run_hour'],
+            dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+            current_timestamp=self.dialect.current_timestamp(),
             database_name=vars['target_database_name'],
             schema_name=vars['target_schema_name'],
             table_name=vars['target_table_name'],
@@ -188,43 +439,286 @@ class GenericChecks:
 
         return self.sqls
 
-    def empty_null(self, dq_name, threshold, stop_on_failure, columns, is_trial, description, vars):
+    def count_rows(self, table, filter):
+        ''' SQL to count the rows of a table (portable between Snowflake and Presto) '''
+        return "SELECT count(*) FROM {table} WHERE {filter}".format(table=table, filter=filter)
+
+    def compare_counts(self, dq_name, threshold, stop_on_failure, columns, is_trial, description, vars,
+        tgt_cnt, src_cnt):
+        ''' Result of compare_to_source from the counts queried by the Detector (ie: from different databases) '''
+        if src_cnt is None or src_cnt == 0 or tgt_cnt is None or tgt_cnt == 0:
+            is_pass = False
+        else:
+            is_pass = abs(tgt_cnt - src_cnt) / (src_cnt * 1.0) <= float(threshold)
+        self.sqls.append("""
+            {insert}
+            SELECT
+                {dq_run_hour} AS dq_run_hour
+                ,'{database_name}' AS database_name
+                ,'{schema_name}' AS schema_name
+                ,'{table_name}' AS table_name
+                ,'{table_filter}' AS table_filter
+                ,'compare_to_source' AS dq_name
+                ,'count(*)' AS dq_column
+                ,'{desc}' AS dq_description
+                ,{tgt_cnt} AS dq_tgt_value
+                ,{src_cnt} AS dq_src_value
+                ,'{threshold}' AS dq_threshold
+                ,{is_pass} AS is_pass
+                ,{stop} AS stop_on_failure
+                ,false AS is_dq_custom
+                ,{dq_key} AS dq_key
+                ,{current_timestamp} AS dq_start_tstamp
+                ,NULL AS dq_end_tstamp
+                ,'{db_username}' AS db_username
+                ,'{unix_username}' AS unix_username
+                ,'{env}' AS env
+                ,{trial} AS is_trial
+            ;
+        """.format(
+            insert=vars['insert_sql'],
+            dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+            current_timestamp=self.dialect.current_timestamp(),
+            database_name=vars['target_database_name'],
+            schema_name=vars['target_schema_name'],
+            table_name=vars['target_table_name'],
+            table_filter=vars['target_filter'].replace("1=1","").replace("'", "''"),
+            desc=description.replace("'", "''"),
+            tgt_cnt="NULL" if tgt_cnt is None else "'{c}'".format(c=tgt_cnt),
+            src_cnt="NULL" if src_cnt is None else "'{c}'".format(c=src_cnt),
+            threshold=threshold,
+            is_pass=is_pass,
+            stop=stop_on_failure,
+            dq_key=vars['dq_key'],
+            db_username=vars['db_username'],
+            unix_username=vars['unix_username'],
+            env=vars['env'],
+            trial=is_trial,
+            )
+        )
+
+        return self.sqls
+
+    def data_diff_range(self, table, filter, key):
+        ''' SQL to get the key range, row count and NULL key row count of a table for data_diff '''
+        return """
+            SELECT MIN({key}), MAX({key}), count(*), count(*) - count({key})
+            FROM {table}
+            WHERE {filter}
+        """.format(key=key, table=table, filter=filter)
+
+    def data_diff_null_keys(self, table, filter, key, columns):
+        ''' SQL to get the row count and hash of the rows with a NULL key for data_diff '''
+        return """
+            SELECT
+                count(*) AS row_cnt
+                ,HASH_AGG({key}, {columns}) AS row_hash
+            FROM {table}
+            WHERE ({filter})
+              AND {key} IS NULL
+        """.format(key=key, columns=", ".join(columns), table=table, filter=filter)
+
+    def data_diff_buckets(self, table, filter, key, columns, ranges, buckets):
+        ''' SQL to get the row count and hash of each bucket of the key ranges for data_diff '''
+        # Each range [start, end) is split into buckets of the same width and numbered
+        # (range index * buckets + bucket index) so all ranges are done in one query
+        bucket_cases = []
+        range_filters = []
+        for i, (start, end) in enumerate(ranges):
+            width = max(-(-(end - start) // buckets), 1)
+            bucket_cases.append("WHEN {key} >= {start} AND {key} < {end} THEN {offset} + FLOOR(({key} - {start}) / {width})".format(
+                key=key, start=start, end=end, offset=i * buckets, width=width))
+            range_filters.append("({key} >= {start} AND {key} < {end})".format(key=key, start=start, end=end))
+        return """
+            SELECT
+                CASE {bucket_cases} END AS bucket
+                ,count(*) AS row_cnt
+                ,HASH_AGG({key}, {columns}) AS row_hash
+            FROM {table}
+            WHERE ({filter})
+              AND ({range_filters})
+            GROUP BY 1
+        """.format(
+            bucket_cases="\n                    ".join(bucket_cases),
+            key=key,
+            columns=", ".join(columns),
+            table=table,
+            filter=filter,
+            range_filters="\n                OR ".join(range_filters),
+            )
+
+    def data_diff(self, dq_name, threshold, stop_on_failure, key, is_trial, description, vars,
+        diff_ranges, tgt_cnt, src_cnt, null_key_diff=False):
+        ''' Result of data_diff from the differing key ranges found by the Detector '''
+        ranges = ",".join(["[{s},{e})".format(s=start, e=end) for (start, end) in diff_ranges])
+        # Rows with a NULL key are outside of every range and compared on their own
+        if null_key_diff:
+            ranges = ",".join([r for r in ("NULL", ranges) if len(r) > 0])
+        # Keep the list of ranges to a reasonable size in the DQ table
+        if len(ranges) > 1000:
+            ranges = ranges[:1000] + "..."
+        self.sqls.append("""
+            {insert}
+            SELECT
+                {dq_run_hour} AS dq_run_hour
+                ,'{database_name}' AS database_name
+                ,'{schema_name}' AS schema_name
+                ,'{table_name}' AS table_name
+                ,'{table_filter}' AS table_filter
+                ,'data_diff' AS dq_name
+                ,'{column_desc}' AS dq_column
+                ,'{desc}' AS dq_description
+                ,'{num_ranges}' AS dq_tgt_value
+                ,'{ranges} (tgt_cnt={tgt_cnt}; src_cnt={src_cnt})' AS dq_src_value
+                ,'{threshold}' AS dq_threshold
+                ,{is_pass} AS is_pass
+                ,{stop} AS stop_on_failure
+                ,false AS is_dq_custom
+                ,{dq_key} AS dq_key
+                ,{current_timestamp} AS dq_start_tstamp
+                ,NULL AS dq_end_tstamp
+                ,'{db_username}' AS db_username
+                ,'{unix_username}' AS unix_username
+                ,'{env}' AS env
+                ,{trial} AS is_trial
+            ;
+        """.format(
+            insert=vars['insert_sql'],
+            dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+            current_timestamp=self.dialect.current_timestamp(),
+            database_name=vars['target_database_name'],
+            schema_name=vars['target_schema_name'],
+            table_name=vars['target_table_name'],
+            table_filter=vars['target_filter'].replace("1=1","").replace("'", "''"),
+            column_desc=key.replace("'", "''"),
+            desc=description.replace("'", "''"),
+            num_ranges=len(diff_ranges) + (1 if null_key_diff else 0),
+            ranges=ranges,
+            tgt_cnt=tgt_cnt,
+            src_cnt=src_cnt,
+            threshold=threshold,
+            is_pass=len(diff_ranges) == 0 and not null_key_diff and tgt_cnt == src_cnt,
+            stop=stop_on_failure,
+            dq_key=vars['dq_key'],
+            db_username=vars['db_username'],
+            unix_username=vars['unix_username'],
+            env=vars['env'],
+            trial=is_trial,
+            )
+        )
+
+        return self.sqls
+
+    def empty_null(self, dq_name, threshold, stop_on_failure, columns, is_trial, description, vars,
+        incremental=None, mode=None, sample_rate=None, plan=None):
         # Default threshold to 0
         threshold = 0
 
         if len(columns) == 0:
             raise Exception('EMPTY_NULL check requires [columns] to be specified')
-        # This is for a single query for all columns
-        select_list = []
-        with_clause = """
-                WITH subq AS
-                (SELECT count(*) total_cnt
-        """
-        i = 1
-        # Keep dq_columns as 1 element since we have a single query to do it for all columns
-        # and expand later when checking for pass/fail result
-        for column in columns:
+        mode = self.__check_mode('EMPTY_NULL', mode, ['exact', 'sample'])
+        if mode == 'sample' and sample_rate is None:
+            raise Exception('EMPTY_NULL check requires [sample_rate] to be specified for sample mode')
+        if plan is None:
+            plan = 'union'
+        plan = plan.lower()
+        if plan not in ('union', 'unpivot'):
+            raise Exception('EMPTY_NULL check does not support [plan] {p} (only union/unpivot)'.format(p=plan))
+
+        # Sample mode scans a percentage of the blocks and reports the estimated null count
+        # with the upper bound of the null rate (rule of three if no null is found in the sample)
+        target_sample = ""
+        tgt_value = "CAST(x.empty_null_cnt AS VARCHAR)"
+        src_value = "'0'"
+        if mode == 'sample':
+            target_sample = "TABLESAMPLE SYSTEM ({r})".format(r=sample_rate)
+            tgt_value = "CAST(ROUND(x.empty_null_cnt * 100.0 / {r}) AS VARCHAR)".format(r=sample_rate)
+            src_value = """'0 (sample={r}%, rows=' || CAST(x.total_cnt AS VARCHAR) || ', null_rate<=' ||
+                        CAST(ROUND(CASE WHEN x.total_cnt = 0 THEN 1
+                            WHEN x.empty_null_cnt = 0 THEN 3.0 / x.total_cnt
+                            ELSE x.empty_null_cnt * 1.0 / x.total_cnt
+                                + {z} * SQRT((x.empty_null_cnt * 1.0 / x.total_cnt) * (1 - x.empty_null_cnt * 1.0 / x.total_cnt) / x.total_cnt)
+                            END, 6) AS VARCHAR) || ')'""".format(r=sample_rate, z=self.SAMPLE_Z)
+
+        # Unpivot plan computes all null counts as a single aggregate row and flattens
+        # it into one row per column (instead of a UNION ALL branch per column)
+        if plan == 'unpivot':
+            column_names = []
+            column_cnts = []
+            for column in columns:
+                column_names.append("'{column}'".format(column=column.replace("'", "''")))
+                column_cnts.append("""sum(case when length(CAST({column} AS VARCHAR)) = 0
+                        or {column} is null then 1 else 0 end)""".format(column=column))
+            with_clause = self.dialect.unpivot(
+                names=column_names,
+                values=column_cnts,
+                from_clause="""FROM {target_table} {target_sample}
+                WHERE {target_filter}""".format(
+                    target_table=vars['target_table'],
+                    target_sample=target_sample,
+                    target_filter=vars['target_filter'],
+                    ),
+                name_alias='dq_column',
+                value_alias='empty_null_cnt',
+                )
+        else:
+            # This is for a single query for all columns
+            select_list = []
+            with_clause = """
+                    WITH subq AS
+                    (SELECT count(*) total_cnt
+            """
+            i = 1
+            # Keep dq_columns as 1 element since we have a single query to do it for all columns
+            # and expand later when checking for pass/fail result
+            for column in columns:
+                with_clause += """
+                        ,{column1} AS col{i}_nm
+                        ,sum(case when length(CAST({column2} AS VARCHAR)) = 0
+                            or {column2} is null then 1 else 0 end) AS col{i}_cnt
+                """.format(column1=self.dialect.to_varchar("'{c}'".format(c=column.replace("'", "''"))), column2=column, i=i)
+                select_list.append("""
+                    SELECT total_cnt, col{i}_nm AS dq_column, col{i}_cnt AS empty_null_cnt FROM subq
+                """.format(i=i))
+                i += 1
             with_clause += """
-                    ,'{column1}'::VARCHAR AS col{i}_nm
-                    ,sum(case when length(CAST({column2} AS VARCHAR)) = 0
-                        or {column2} is null then 1 else 0 end) AS col{i}_cnt
-            """.format(column1=column.replace("'", "''"), column2=column, i=i)
-            select_list.append("""
-                SELECT total_cnt, col{i}_nm AS dq_column, col{i}_cnt AS empty_null_cnt FROM subq
-            """.format(i=i))
-            i += 1
-        with_clause += """
-                FROM {target_table}
-                WHERE {target_filter})
-        """.format(
-            target_table=vars['target_table'],
-            target_filter=vars['target_filter'],
-            )
-        with_clause += ' UNION ALL '.join(select_list)
+                    FROM {target_table} {target_sample}
+                    WHERE {target_filter})
+            """.format(
+                target_table=vars['target_table'],
+                target_sample=target_sample,
+                target_filter=vars['target_filter'],
+                )
+            with_clause += ' UNION ALL '.join(select_list)
+
+        # For incremental mode, only scan the new partitions into the state table
+        # and sum up the null counts of all partitions from there
+        if incremental is not None:
+            self.state_sqls.extend(self.__incremental_state_sqls(
+                dq_name='empty_null',
+                column_list=columns,
+                partials={
+                    'value_cnt': """sum(case when length(CAST({column} AS VARCHAR)) = 0
+                        or {column} is null then 1 else 0 end)""",
+                    },
+                incremental=incremental,
+                vars=vars,
+                ))
+            with_clause = """
+                SELECT SUM(total_cnt) AS total_cnt, dq_column, SUM(value_cnt) AS empty_null_cnt
+                FROM {dq_state_table}
+                WHERE {state_filter}
+                  AND dq_column IN ('{columns}')
+                GROUP BY dq_column
+            """.format(
+                dq_state_table=vars['dq_state_table'],
+                state_filter=self.__incremental_state_filter('empty_null', vars),
+                columns="','".join([c.replace("'", "''") for c in columns]),
+                )
         self.sqls.append("""
                 {insert}
                 SELECT
-                    '{dq_run_hour}' AS dq_run_hour
+                    {dq_run_hour} AS dq_run_hour
                     ,'{database_name}' AS database_name
                     ,'{schema_name}' AS schema_name
                     ,'{table_name}' AS table_name
@@ -232,15 +726,15 @@ class GenericChecks:
                     ,'empty_null' AS dq_name
                     ,x.dq_column AS dq_column
                     ,'{desc}' AS dq_description
-                    ,CAST(x.empty_null_cnt AS VARCHAR) AS dq_tgt_value
-                    ,'0' AS dq_src_value
+                    ,{tgt_value} AS dq_tgt_value
+                    ,{src_value} AS dq_src_value
                     ,'{threshold}' AS dq_threshold
                     ,CASE WHEN x.empty_null_cnt = 0 THEN true
                         ELSE false END AS is_pass
                     ,{stop} AS stop_on_failure
                     ,false AS is_dq_custom
                     ,{dq_key} AS dq_key
-                    ,CURRENT_TIMESTAMP AS dq_start_tstamp
+                    ,{current_timestamp} AS dq_start_tstamp
                     ,NULL AS dq_end_tstamp
                     ,'{db_username}' AS db_username
                     ,'{unix_username}' AS unix_username
@@ -252,7 +746,8 @@ class GenericChecks:
                 ) x
         """.format(
                 insert=vars['insert_sql'],
-                dq_run_hour=vars['dq_run_hour'],
+                dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+                current_timestamp=self.dialect.current_timestamp(),
                 database_name=vars['target_database_name'],
                 schema_name=vars['target_schema_name'],
                 table_name=vars['target_table_name'],
@@ -267,18 +762,37 @@ class GenericChecks:
                 unix_username=vars['unix_username'],
                 env=vars['env'],
                 with_clause=with_clause,
+                tgt_value=tgt_value,
+                src_value=src_value,
                 trial=is_trial,
                 )
         )
 
         return self.sqls
 
-    def unique(self, dq_name, threshold, stop_on_failure, columns, is_trial, description, vars):
-        # Default threshold to 0
-        threshold = 0
-
+    def unique(self, dq_name, threshold, stop_on_failure, columns, is_trial, description, vars,
+        incremental=None, mode=None):
         if len(columns) == 0:
             raise Exception('UNIQUE check requires [columns] to be specified')
+        mode = self.__check_mode('UNIQUE', mode, ['exact', 'approx'])
+
+        # Approx mode estimates the distinct count with HLL: the threshold is the fraction of duplicates
+        # allowed for the estimation error (default to 0 like exact mode, ie: 0.0325 for the HLL error)
+        if mode == 'approx':
+            threshold = abs(float(threshold))
+            pass_logic = "x.distinct_cnt >= x.total_cnt * (1 - {t})".format(t=threshold)
+            description += " (approx)"
+        else:
+            # Default threshold to 0
+            threshold = 0
+            pass_logic = "x.distinct_cnt = x.total_cnt"
+
+        # A column can also be a list of columns for a composite key (key set)
+        key_sets = [column if isinstance(column, list) else [column] for column in columns]
+        has_composite_key = any(len(key_set) > 1 for key_set in key_sets)
+        if has_composite_key and incremental is not None:
+            raise Exception('UNIQUE check does not support composite keys for incremental mode')
+
         # This is for a single query for all columns
         select_list = []
         with_clause = """
@@ -288,13 +802,21 @@ class GenericChecks:
         i = 1
         # Keep dq_columns as 1 element since we have a single query to do it for all columns
         # and expand later when checking for pass/fail result
-        for column in columns:
+        for key_set in key_sets:
+            if mode == 'approx':
+                distinct_cnt = self.dialect.approx_count_distinct(key_set)
+            else:
+                distinct_cnt = "count(distinct {column})".format(column=', '.join(key_set))
             # For coalesce with default character, we need to replace single quote
             # for dq_column when inserting to dq_result_table
             with_clause += """
-                    ,'{column1}'::VARCHAR AS col{i}_nm
-                    ,count(distinct {column2}) AS col{i}_cnt
-            """.format(column1=column.replace("'", "''"), column2=column, i=i)
+                    ,{column1} AS col{i}_nm
+                    ,{distinct_cnt} AS col{i}_cnt
+            """.format(
+                column1=self.dialect.to_varchar("'{c}'".format(c=','.join(key_set).replace("'", "''"))),
+                distinct_cnt=distinct_cnt,
+                i=i,
+                )
             select_list.append("""
                 SELECT total_cnt, col{i}_nm AS dq_column, col{i}_cnt AS distinct_cnt FROM subq
             """.format(i=i))
@@ -307,10 +829,88 @@ class GenericChecks:
             target_filter=vars['target_filter'],
             )
         with_clause += ' UNION ALL '.join(select_list)
+
+        # For composite keys, count the duplicates of all key sets in one aggregation
+        # with GROUPING SETS (one group per distinct key of each key set)
+        if has_composite_key and mode == 'exact':
+            group_columns = []
+            for key_set in key_sets:
+                for column in key_set:
+                    if column not in group_columns:
+                        group_columns.append(column)
+            key_set_list = []
+            grouping_sets = []
+            # Keys with a NULL are not distinct keys (same as count(distinct ...) of the other key sets)
+            null_key_cases = []
+            for key_set in key_sets:
+                # GROUPING_ID sets the bit (first column is the highest) of the columns not in the set
+                grouping_key = 0
+                for column in group_columns:
+                    grouping_key = (grouping_key << 1) | (0 if column in key_set else 1)
+                key_set_list.append("({k}, '{c}')".format(k=grouping_key, c=','.join(key_set).replace("'", "''")))
+                grouping_sets.append("({c})".format(c=', '.join(key_set)))
+                null_key_cases.append("WHEN {k} THEN {cond}".format(
+                    k=grouping_key, cond=' OR '.join(["{c} IS NULL".format(c=c) for c in key_set])))
+            with_clause = """
+                WITH subq AS
+                (SELECT {grouping_id} AS grouping_key, count(*) AS key_cnt
+                    ,CASE {grouping_id} {null_key_cases} END AS has_null_key
+                FROM {target_table}
+                WHERE {target_filter}
+                GROUP BY GROUPING SETS ({grouping_sets}))
+                SELECT COALESCE(SUM(s.key_cnt), 0) AS total_cnt, k.dq_column
+                    ,COUNT(CASE WHEN NOT s.has_null_key THEN s.grouping_key END) AS distinct_cnt
+                FROM
+                    (VALUES {key_set_list}) AS k(grouping_key, dq_column)
+                    LEFT JOIN subq s
+                    ON (s.grouping_key = k.grouping_key)
+                GROUP BY k.dq_column
+            """.format(
+                grouping_id=self.dialect.grouping_id(group_columns),
+                null_key_cases=' '.join(null_key_cases),
+                target_table=vars['target_table'],
+                target_filter=vars['target_filter'],
+                grouping_sets=', '.join(grouping_sets),
+                key_set_list=', '.join(key_set_list),
+                )
+
+        # For incremental mode, keep exact distinct counts and HLL sketches per partition:
+        # duplicates within a partition are exact and across partitions are estimated
+        if incremental is not None:
+            self.state_sqls.extend(self.__incremental_state_sqls(
+                dq_name='unique',
+                column_list=columns,
+                partials={
+                    'value_cnt': "count(distinct {column})",
+                    'key_sketch': "HLL_EXPORT(HLL_ACCUMULATE({column}))",
+                    },
+                incremental=incremental,
+                vars=vars,
+                ))
+            with_clause = """
+                SELECT total_cnt, dq_column
+                    ,CASE WHEN value_cnt < total_cnt THEN value_cnt
+                        WHEN estimate_cnt < total_cnt * (1 - {hll_error}) THEN estimate_cnt
+                        ELSE total_cnt END AS distinct_cnt
+                FROM
+                (
+                    SELECT dq_column, SUM(total_cnt) AS total_cnt, SUM(value_cnt) AS value_cnt
+                        ,HLL_ESTIMATE(HLL_COMBINE(HLL_IMPORT(key_sketch))) AS estimate_cnt
+                    FROM {dq_state_table}
+                    WHERE {state_filter}
+                      AND dq_column IN ('{columns}')
+                    GROUP BY dq_column
+                ) st
+            """.format(
+                hll_error=self.HLL_ERROR,
+                dq_state_table=vars['dq_state_table'],
+                state_filter=self.__incremental_state_filter('unique', vars),
+                columns="','".join([c.replace("'", "''") for c in columns]),
+                )
         self.sqls.append("""
                 {insert}
                 SELECT
-                    '{dq_run_hour}' AS dq_run_hour
+                    {dq_run_hour} AS dq_run_hour
                     ,'{database_name}' AS database_name
                     ,'{schema_name}' AS schema_name
                     ,'{table_name}' AS table_name
@@ -321,12 +921,12 @@ class GenericChecks:
                     ,CAST(x.distinct_cnt AS VARCHAR) AS dq_tgt_value
                     ,CAST(x.total_cnt AS VARCHAR) AS dq_src_value
                     ,'{threshold}' AS dq_threshold
-                    ,CASE WHEN x.distinct_cnt = x.total_cnt THEN true
+                    ,CASE WHEN {pass_logic} THEN true
                         ELSE false END AS is_pass
                     ,{stop} AS stop_on_failure
                     ,false AS is_dq_custom
                     ,{dq_key} AS dq_key
-                    ,CURRENT_TIMESTAMP AS dq_start_tstamp
+                    ,{current_timestamp} AS dq_start_tstamp
                     ,NULL AS dq_end_tstamp
                     ,'{db_username}' AS db_username
                     ,'{unix_username}' AS unix_username
@@ -338,7 +938,8 @@ class GenericChecks:
                 ) x
         """.format(
                 insert=vars['insert_sql'],
-                dq_run_hour=vars['dq_run_hour'],
+                dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+                current_timestamp=self.dialect.current_timestamp(),
                 database_name=vars['target_database_name'],
                 schema_name=vars['target_schema_name'],
                 table_name=vars['target_table_name'],
@@ -354,6 +955,7 @@ class GenericChecks:
                 env=vars['env'],
                 trial=is_trial,
                 with_clause=with_clause,
+                pass_logic=pass_logic,
                 )
         )
 
@@ -366,7 +968,7 @@ class GenericChecks:
             self.sqls.append("""
                 {insert}
                 SELECT
-                    '{dq_run_hour}' AS dq_run_hour
+                    {dq_run_hour} AS dq_run_hour
                     ,'{database_name}' AS database_name
                     ,'{schema_name}' AS schema_name
                     ,'{table_name}' AS table_name
@@ -374,15 +976,15 @@ class GenericChecks:
                     ,'up_to_date' AS dq_name
                     ,'{column_desc}' AS dq_column
                     ,'{desc}' AS dq_description
-                    ,CAST(MAX({column}::date) AS VARCHAR) AS dq_tgt_value
-                    ,CAST(CURRENT_TIMESTAMP::date AS VARCHAR) AS dq_src_value
+                    ,CAST({max_date} AS VARCHAR) AS dq_tgt_value
+                    ,CAST({current_date} AS VARCHAR) AS dq_src_value
                     ,NULL AS dq_threshold
-                    ,CASE WHEN MAX({column}::date) >= CURRENT_TIMESTAMP::date THEN true
+                    ,CASE WHEN {max_date} >= {current_date} THEN true
                         ELSE false END AS is_pass
                     ,{stop} AS stop_on_failure
                     ,false AS is_dq_custom
                     ,{dq_key} AS dq_key
-                    ,CURRENT_TIMESTAMP AS dq_start_tstamp
+                    ,{current_timestamp} AS dq_start_tstamp
                     ,NULL AS dq_end_tstamp
                     ,'{db_username}' AS db_username
                     ,'{unix_username}' AS unix_username
@@ -395,15 +997,18 @@ class GenericChecks:
                 ;
             """.format(
                 insert=vars['insert_sql'],
-                dq_run_hour=vars['dq_run_hour'],
+                dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+                current_timestamp=self.dialect.current_timestamp(),
+                current_date=self.dialect.to_date("CURRENT_TIMESTAMP"),
                 database_name=vars['target_database_name'],
                 schema_name=vars['target_schema_name'],
                 table_name=vars['target_table_name'],
                 table_filter=vars['target_filter'].replace("1=1","").replace("'", "''"),
-                target_table=vars['target_table'],
+                target_table=self.__metadata_table(column, vars),
                 target_filter=vars['target_filter'],
                 column_desc=column.replace("'", "''"),
                 column=column,
+                max_date=self.__max_date(column, vars),
                 desc=description.replace("'", "''"),
                 threshold=threshold,
                 stop=stop_on_failure,
@@ -457,7 +1062,7 @@ class GenericChecks:
                 trending_type = 'absolute'
 
         # Keep group_by AS single column in DQ
-        group_by1 = group_by.replace(",", "|| ',' || ")
+        group_by1 = self.dialect.concat(group_by.split(","), ",")
 
         for column in columns:
             self.sqls.append("""
@@ -480,22 +1085,22 @@ class GenericChecks:
                 FROM subq 
                 )
                 SELECT
-                    '{dq_run_hour}' AS dq_run_hour
+                    {dq_run_hour} AS dq_run_hour
                     ,'{database_name}' AS database_name
                     ,'{schema_name}' AS schema_name
                     ,'{table_name}' AS table_name
                     ,'{table_filter}' AS table_filter
                     ,'day_to_day' AS dq_name
-                    ,'{column_desc} [' || col || ']' AS dq_column
+                    ,'{column_desc} [' || {col} || ']' AS dq_column
                     ,'{desc}' AS dq_description
-                    ,dq_tgt_value AS dq_tgt_value
-                    ,dq_src_value AS dq_src_value
+                    ,CAST(dq_tgt_value AS VARCHAR) AS dq_tgt_value
+                    ,CAST(dq_src_value AS VARCHAR) AS dq_src_value
                     ,'{threshold}' AS dq_threshold
                     ,is_pass
                     ,{stop} AS stop_on_failure
                     ,false AS is_dq_custom
                     ,{dq_key} AS dq_key
-                    ,CURRENT_TIMESTAMP AS dq_start_tstamp
+                    ,{current_timestamp} AS dq_start_tstamp
                     ,NULL AS dq_end_tstamp
                     ,'{db_username}' AS db_username
                     ,'{unix_username}' AS unix_username
@@ -518,7 +1123,8 @@ class GenericChecks:
             """.format(
                 trending_type=trending_type,
                 insert=vars['insert_sql'],
-                dq_run_hour=vars['dq_run_hour'],
+                dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+                current_timestamp=self.dialect.current_timestamp(),
                 database_name=vars['target_database_name'],
                 schema_name=vars['target_schema_name'],
                 table_name=vars['target_table_name'],
@@ -530,6 +1136,7 @@ class GenericChecks:
                 desc=description.replace("'", "''") + " [groupby (" + group_by + ") for " + str(num_days) + " days]",
                 threshold=threshold,
                 group_by=group_by1,
+                col=self.dialect.to_varchar("col"),
                 num_days=num_days,
                 logic=compare_logic,
                 stop=stop_on_failure,
@@ -543,28 +1150,78 @@ class GenericChecks:
 
         return self.sqls
 
-    def missing_dates(self, dq_name, threshold, stop_on_failure, columns, is_trial, description, vars):
+    def missing_dates(self, dq_name, threshold, stop_on_failure, columns, is_trial, description, vars,
+        incremental=None):
         if len(columns) == 0:
             raise Exception('MISSING_DATES check requires [columns] to be specified')
+
+        # For incremental mode, keep the distinct dates per partition in the state table
+        if incremental is not None:
+            self.state_sqls.extend(self.__incremental_state_sqls(
+                dq_name='missing_dates',
+                column_list=columns,
+                partials={
+                    'date_values': "ARRAY_AGG(DISTINCT {column}::date)",
+                    },
+                incremental=incremental,
+                vars=vars,
+                ))
+
         for column in columns:
+            if incremental is not None:
+                dates_sql = """
+                        SELECT DISTINCT f.value::date AS date_col
+                        FROM {dq_state_table}, LATERAL FLATTEN(input => date_values) f
+                        WHERE {state_filter}
+                          AND dq_column = '{column_desc}'
+                """.format(
+                    dq_state_table=vars['dq_state_table'],
+                    state_filter=self.__incremental_state_filter('missing_dates', vars),
+                    column_desc=column.replace("'", "''"),
+                    )
+                max_date_sql = """
+                SELECT MAX(date_col) AS max_date
+                FROM ({dates_sql}) d
+                """.format(dates_sql=dates_sql)
+            else:
+                # Only scan the dates within the checked window (on the column itself for a date partition
+                # so the window prunes, the max date itself is then answered from partition metadata)
+                date_window = "AND {column} >= (SELECT {min_date} FROM max_date)".format(
+                    column=column if self.__is_date_partition(column, vars) else self.dialect.to_date(column),
+                    min_date=self.dialect.date_add('day', -90, 'max_date'))
+                dates_sql = """
+                        SELECT DISTINCT {column} AS date_col
+                        FROM {target_table}
+                        WHERE {target_filter}
+                        {date_window}
+                """.format(
+                    column=self.dialect.to_date(column),
+                    target_table=self.__metadata_table(column, vars),
+                    target_filter=vars['target_filter'],
+                    date_window=date_window,
+                    )
+                max_date_sql = """
+                SELECT {max_date} AS max_date
+                FROM {target_table}
+                WHERE {target_filter}
+                """.format(
+                    max_date=self.__max_date(column, vars),
+                    target_table=self.__metadata_table(column, vars),
+                    target_filter=vars['target_filter'],
+                    )
+
             self.sqls.append("""
                 {insert}
                 WITH max_date AS
                 (
-                SELECT MAX({column}::date) AS max_date
-                FROM {target_table}
-                WHERE {target_filter}
+                {max_date_sql}
                 )
                 ,all_dates AS
                 (
-                SELECT
-                  DATEADD(day, '-' || 
-                    ROW_NUMBER() OVER (ORDER BY NULL), DATEADD(day, '+1', m.max_date)) AS date_col
-                FROM table (generator(rowcount => 90)),
-                    max_date m
+                {all_dates_sql}
                 )
                 SELECT
-                    '{dq_run_hour}' AS dq_run_hour
+                    {dq_run_hour} AS dq_run_hour
                     ,'{database_name}' AS database_name
                     ,'{schema_name}' AS schema_name
                     ,'{table_name}' AS table_name
@@ -572,15 +1229,15 @@ class GenericChecks:
                     ,'missing_dates' AS dq_name
                     ,'{column_desc}' AS dq_column
                     ,'{desc}' AS dq_description
-                    ,total_cnt AS dq_tgt_value
-                    ,0 AS dq_src_value
+                    ,CAST(total_cnt AS VARCHAR) AS dq_tgt_value
+                    ,'0' AS dq_src_value
                     ,NULL AS dq_threshold
                     ,CASE WHEN total_cnt = 0 THEN true
                         ELSE false END AS is_pass
                     ,{stop} AS stop_on_failure
                     ,false AS is_dq_custom
                     ,{dq_key} AS dq_key
-                    ,CURRENT_TIMESTAMP AS dq_start_tstamp
+                    ,{current_timestamp} AS dq_start_tstamp
                     ,NULL AS dq_end_tstamp
                     ,'{db_username}' AS db_username
                     ,'{unix_username}' AS unix_username
@@ -594,16 +1251,18 @@ class GenericChecks:
                         all_dates a
                         LEFT JOIN
                         (
-                        SELECT DISTINCT {column}::date AS date_col
-                        FROM {target_table}
-                        WHERE {target_filter}
+                        {dates_sql}
                         ) b
                         ON (a.date_col = b.date_col)
                     ) x
                 ;
             """.format(
                 insert=vars['insert_sql'],
-                dq_run_hour=vars['dq_run_hour'],
+                max_date_sql=max_date_sql,
+                all_dates_sql=self.dialect.date_series('max_date', 90),
+                dates_sql=dates_sql,
+                dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+                current_timestamp=self.dialect.current_timestamp(),
                 database_name=vars['target_database_name'],
                 schema_name=vars['target_schema_name'],
                 table_name=vars['target_table_name'],
@@ -625,19 +1284,227 @@ class GenericChecks:
 
         return self.sqls
 
-    def get_stddev_setup(self, column, vars):
+    def profile_columns(self, columns, stats=None):
+        ''' Expressions (dq_column) of the profile check: count(*) and the stats of each column '''
+        if stats is None:
+            stats = self.PROFILE_STATS
+        for stat in stats:
+            if stat not in self.PROFILE_STATS:
+                raise Exception('PROFILE check does not support [stats] {s} (only {l})'.format(
+                    s=stat, l='/'.join(self.PROFILE_STATS)))
+        exprs = ['count(*)']
+        for column in columns:
+            length = "length(CAST({c} AS VARCHAR))".format(c=column)
+            if 'min' in stats:
+                exprs.append("min({c})".format(c=column))
+            if 'max' in stats:
+                exprs.append("max({c})".format(c=column))
+            if 'null_cnt' in stats:
+                exprs.append("count(*) - count({c})".format(c=column))
+            if 'distinct' in stats:
+                exprs.append(self.dialect.approx_count_distinct([column]))
+            if 'mean' in stats:
+                exprs.append("avg({c})".format(c=column))
+            if 'length' in stats:
+                exprs.append("min({l})".format(l=length))
+                exprs.append("max({l})".format(l=length))
+                exprs.append("avg({l})".format(l=length))
+        return exprs
+
+    def profile(self, dq_name, threshold, stop_on_failure, columns, is_trial, description, vars, stats=None):
+        if len(columns) == 0:
+            raise Exception('PROFILE check requires [columns] to be specified')
+
+        # Single aggregate for all stats, then one row per stat by joining to the stat index
+        # (stats are stored with the expression as dq_column so other checks can use them as baseline)
+        exprs = self.profile_columns(columns, stats)
+        aggregates = []
+        stat_list = []
+        stat_values = []
+        for i, expr in enumerate(exprs):
+            aggregates.append("CAST({e} AS VARCHAR) AS v{i}".format(e=expr, i=i))
+            stat_list.append("({i}, '{e}')".format(i=i, e=expr.replace("'", "''")))
+            stat_values.append("WHEN {i} THEN p.v{i}".format(i=i))
+        self.sqls.append("""
+            {insert}
+            SELECT
+                {dq_run_hour} AS dq_run_hour
+                ,'{database_name}' AS database_name
+                ,'{schema_name}' AS schema_name
+                ,'{table_name}' AS table_name
+                ,'{table_filter}' AS table_filter
+                ,'profile' AS dq_name
+                ,k.dq_column AS dq_column
+                ,'{desc}' AS dq_description
+                ,CASE k.stat_id
+                    {stat_values}
+                    END AS dq_tgt_value
+                ,NULL AS dq_src_value
+                ,NULL AS dq_threshold
+                ,true AS is_pass
+                ,{stop} AS stop_on_failure
+                ,false AS is_dq_custom
+                ,{dq_key} AS dq_key
+                ,{current_timestamp} AS dq_start_tstamp
+                ,NULL AS dq_end_tstamp
+                ,'{db_username}' AS db_username
+                ,'{unix_username}' AS unix_username
+                ,'{env}' AS env
+                ,{trial} AS is_trial
+            FROM
+                (SELECT
+                    {aggregates}
+                FROM {target_table}
+                WHERE {target_filter}) p
+                CROSS JOIN
+                (VALUES {stat_list}) AS k(stat_id, dq_column)
+            ;
+        """.format(
+            insert=vars['insert_sql'],
+            dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+            current_timestamp=self.dialect.current_timestamp(),
+            database_name=vars['target_database_name'],
+            schema_name=vars['target_schema_name'],
+            table_name=vars['target_table_name'],
+            table_filter=vars['target_filter'].replace("1=1","").replace("'", "''"),
+            desc=description.replace("'", "''"),
+            stat_values="\n                    ".join(stat_values),
+            aggregates="\n                    ,".join(aggregates),
+            stat_list=", ".join(stat_list),
+            target_table=vars['target_table'],
+            target_filter=vars['target_filter'],
+            stop=stop_on_failure,
+            dq_key=vars['dq_key'],
+            db_username=vars['db_username'],
+            unix_username=vars['unix_username'],
+            env=vars['env'],
+            trial=is_trial,
+            )
+        )
+
+        return self.sqls
+
+    def seasonal_values(self, columns, vars):
+        ''' SQL to get the current value of all columns of a seasonal check in one scan '''
+        if len(columns) == 0:
+            raise Exception('SEASONAL check requires [columns] to be specified')
+        return """
+            SELECT {columns}
+            FROM {target_table}
+            WHERE {target_filter}
+        """.format(
+            columns="\n                ,".join(columns),
+            target_table=vars['target_table'],
+            target_filter=vars['target_filter'],
+            )
+
+    def seasonal_history(self, columns, history_days, dq_names, vars):
+        ''' SQL to get the history of all columns of a seasonal check (one value per column and run hour) '''
+        return """
+            SELECT dq_column, dq_run_hour, MIN(dq_tgt_value) AS dq_tgt_value
+            FROM {dq_table_prod}
+            WHERE database_name = '{database_name}' AND schema_name = '{schema_name}' AND table_name = '{table_name}'
+              AND dq_name IN ('{dq_names}')
+              AND dq_column IN ('{columns}')
+              AND env = '{env}'
+              AND dq_run_hour >= current_date - {interval}
+              AND dq_run_hour < {dq_run_hour}
+            GROUP BY dq_column, dq_run_hour
+        """.format(
+            dq_table_prod=vars['dq_table_prod'],
+            database_name=vars['target_database_name'],
+            schema_name=vars['target_schema_name'],
+            table_name=vars['target_table_name'],
+            dq_names="','".join(dq_names),
+            columns="','".join([c.replace("'", "''") for c in columns]),
+            env=vars['env'],
+            interval=self.dialect.interval(history_days, 'day'),
+            dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+            )
+
+    def seasonal(self, dq_name, threshold, stop_on_failure, columns, is_trial, description, vars, results):
+        ''' Result of seasonal from the values and bounds computed by the Detector (one row per column) '''
+        rows = []
+        for column in columns:
+            (tgt_value, src_value, is_pass) = results[column]
+            rows.append("('{column}', {tgt_value}, '{src_value}', {is_pass})".format(
+                column=column.replace("'", "''"),
+                tgt_value="NULL" if tgt_value is None else "'{v}'".format(v=tgt_value),
+                src_value=src_value.replace("'", "''"),
+                is_pass=is_pass,
+                ))
+        self.sqls.append("""
+            {insert}
+            SELECT
+                {dq_run_hour} AS dq_run_hour
+                ,'{database_name}' AS database_name
+                ,'{schema_name}' AS schema_name
+                ,'{table_name}' AS table_name
+                ,'{table_filter}' AS table_filter
+                ,'seasonal' AS dq_name
+                ,v.dq_column AS dq_column
+                ,'{desc}' AS dq_description
+                ,CAST(v.dq_tgt_value AS VARCHAR) AS dq_tgt_value
+                ,v.dq_src_value AS dq_src_value
+                ,'{threshold}' AS dq_threshold
+                ,v.is_pass AS is_pass
+                ,{stop} AS stop_on_failure
+                ,false AS is_dq_custom
+                ,{dq_key} AS dq_key
+                ,{current_timestamp} AS dq_start_tstamp
+                ,NULL AS dq_end_tstamp
+                ,'{db_username}' AS db_username
+                ,'{unix_username}' AS unix_username
+                ,'{env}' AS env
+                ,{trial} AS is_trial
+            FROM
+                (VALUES
+                {rows}
+                ) AS v(dq_column, dq_tgt_value, dq_src_value, is_pass)
+            ;
+        """.format(
+            insert=vars['insert_sql'],
+            dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+            current_timestamp=self.dialect.current_timestamp(),
+            database_name=vars['target_database_name'],
+            schema_name=vars['target_schema_name'],
+            table_name=vars['target_table_name'],
+            table_filter=vars['target_filter'].replace("1=1","").replace("'", "''"),
+            desc=description.replace("'", "''"),
+            rows="\n                ,".join(rows),
+            threshold=threshold,
+            stop=stop_on_failure,
+            dq_key=vars['dq_key'],
+            db_username=vars['db_username'],
+            unix_username=vars['unix_username'],
+            env=vars['env'],
+            trial=is_trial,
+            )
+        )
+
+        return self.sqls
+
+    def get_stddev_setup(self, targets, vars):
+        ''' Seed std_dev from the trending history of all targets (table, column) in a single statement '''
+        if len(targets) == 0:
+            raise Exception('STD_DEV setup requires at least one table and column')
+        target_list = []
+        for (table, column) in targets:
+            (database, schema, table_name) = table.split('.')
+            target_list.append("('{d}', '{s}', '{t}', '{c}')".format(
+                d=database, s=schema, t=table_name, c=column.replace("'", "''")))
         return '''
             INSERT INTO {dq_table}
             SELECT
-                dq_run_hour
-                ,database_name
-                ,schema_name
-                ,table_name
-                ,table_filter
+                p.dq_run_hour
+                ,p.database_name
+                ,p.schema_name
+                ,p.table_name
+                ,p.table_filter
                 ,'std_dev' AS dq_name
-                ,dq_column
+                ,p.dq_column
                 ,'Initial trending for std_dev' AS dq_description
-                ,dq_tgt_value
+                ,p.dq_tgt_value
                 ,NULL AS dq_src_value
                 ,NULL AS dq_threshold
                 ,false AS is_pass
@@ -648,26 +1515,37 @@ class GenericChecks:
                 ,NULL AS dq_end_tstamp
                 ,NULL AS db_username
                 ,NULL AS unix_username
-                ,env
+                ,p.env
                 ,true AS is_trial
             FROM
-                {dq_table_prod}
+                {dq_table_prod} p
+                JOIN (VALUES {target_list}) AS k(database_name, schema_name, table_name, dq_column)
+                ON p.database_name = k.database_name
+                AND p.schema_name = k.schema_name
+                AND p.table_name = k.table_name
+                AND p.dq_column = k.dq_column
             WHERE
-                database_name = '{database}'
-                AND schema_name = '{schema}'
-                AND table_name = '{table}'
-                AND dq_name = 'trending'
-                AND dq_column = '{dq_column}'
-                AND env = '{env}'
-                AND dq_run_hour > current_date - interval '9 week'
+                p.dq_name = 'trending'
+                AND p.env = '{env}'
+                AND p.dq_run_hour > current_date - {interval}
+                -- Already seeded (ie: setup run again or columns shared by many configs)
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM {dq_table} d
+                    WHERE d.database_name = p.database_name
+                      AND d.schema_name = p.schema_name
+                      AND d.table_name = p.table_name
+                      AND d.dq_name = 'std_dev'
+                      AND d.dq_column = p.dq_column
+                      AND d.env = p.env
+                      AND d.dq_run_hour = p.dq_run_hour
+                )
             ;
         '''.format(
+            interval=self.dialect.interval(63, 'day'),
             dq_table=vars['dq_table'],
             dq_table_prod=vars['dq_table_prod'],
-            database=vars['target_database_name'],
-            schema=vars['target_schema_name'],
-            table=vars['target_table_name'],
-            dq_column=column,
+            target_list=",\n                    ".join(target_list),
             env=vars['env'],
             )
 
@@ -675,32 +1553,40 @@ class GenericChecks:
         if len(columns) == 0:
             raise Exception('STD_DEV check requires [columns] to be specified')
 
+        cast = self.dialect.cast
         # Top and bottom standard deviation range
-        calc_logic_top = 'MAX(last_src_value) + AVG(diff)::INT + ({t} * STDDEV(diff))::INT'.format(
-            t=threshold.replace('+', '')
+        calc_logic_top = 'MAX(last_src_value) + {avg} + {stddev}'.format(
+            avg=cast('AVG(diff)', 'INT'),
+            stddev=cast('({t} * STDDEV(diff))'.format(t=threshold.replace('+', '')), 'INT'),
             )
-        calc_logic_bottom = 'MAX(last_src_value) - AVG(diff)::INT - ({t} * STDDEV(diff))::INT'.format(
-            t=threshold.replace('+', '')
+        calc_logic_bottom = 'MAX(last_src_value) - {avg} - {stddev}'.format(
+            avg=cast('AVG(diff)', 'INT'),
+            stddev=cast('({t} * STDDEV(diff))'.format(t=threshold.replace('+', '')), 'INT'),
             )
         
         # Feature for checking up and down trending
         #commented DM-6823 std_dev_logic = '((t.dq_tgt_value::INT - s.last_src_value - s.avg_diff)/s.std_dev_diff)::DECIMAL(10,2)'
         if '+' in str(threshold):
-            compare_logic = 't.dq_tgt_value::INT < s.top_value::INT'
+            compare_logic = '{tgt} < {top}'.format(tgt=cast('t.dq_tgt_value', 'INT'), top=cast('s.top_value', 'INT'))
             src_logic = calc_logic_top
             trending_type = 'upward'
         elif '-' in str(threshold):
-            compare_logic = 't.dq_tgt_value::INT > s.bottom_value'
+            compare_logic = '{tgt} > s.bottom_value'.format(tgt=cast('t.dq_tgt_value', 'INT'))
             src_logic = calc_logic_bottom
             trending_type = 'downward'
         else:
-            compare_logic = 't.dq_tgt_value between s.bottom_value::INT and s.top_value::INT'
+            compare_logic = 't.dq_tgt_value between {bottom} and {top}'.format(
+                bottom=cast('s.bottom_value', 'INT'), top=cast('s.top_value', 'INT'))
             src_logic = 'CAST({bottom} AS VARCHAR) || \'|\' || CAST({top} AS VARCHAR)'.format(
                 top=calc_logic_top,
                 bottom=calc_logic_bottom,
                 )
             trending_type = 'absolute'
 
+        # Same weekday of the last 8 weeks
+        same_weekdays = "\n                      OR ".join(["{d} = current_date - {i}".format(
+            d=self.dialect.to_date('dq_run_hour'), i=self.dialect.interval(7 * week, 'day')) for week in range(1, 9)])
+
         for column in columns:
             self.sqls.append("""
                 -- Trending type: {trending_type}
@@ -709,22 +1595,15 @@ class GenericChecks:
                 (
                 SELECT
                     *,
-                    ROW_NUMBER() OVER (PARTITION BY dq_run_hour::DATE ORDER BY dq_run_hour DESC) rnk
+                    ROW_NUMBER() OVER (PARTITION BY {run_date} ORDER BY dq_run_hour DESC) rnk
                 FROM {dq_table_prod}
                 WHERE database_name = '{database_name}' AND schema_name = '{schema_name}' AND table_name = '{table_name}'
                     AND dq_name = 'std_dev' AND dq_column = '{column}'
                     AND env = '{env}'
-                    AND (dq_run_hour::date = current_date - interval '7 day'
-                      OR dq_run_hour::date = current_date - interval '14 day'
-                      OR dq_run_hour::date = current_date - interval '21 day'
-                      OR dq_run_hour::date = current_date - interval '28 day'
-                      OR dq_run_hour::date = current_date - interval '35 day'
-                      OR dq_run_hour::date = current_date - interval '42 day'
-                      OR dq_run_hour::date = current_date - interval '49 day'
-                      OR dq_run_hour::date = current_date - interval '56 day')
+                    AND ({same_weekdays})
                 )
                 SELECT
-                    '{dq_run_hour}' AS dq_run_hour
+                    {dq_run_hour} AS dq_run_hour
                     ,'{database_name}' AS database_name
                     ,'{schema_name}' AS schema_name
                     ,'{table_name}' AS table_name
@@ -747,7 +1626,7 @@ class GenericChecks:
                     ,{stop} AS stop_on_failure
                     ,false AS is_dq_custom
                     ,{dq_key} AS dq_key
-                    ,CURRENT_TIMESTAMP AS dq_start_tstamp
+                    ,{current_timestamp} AS dq_start_tstamp
                     ,NULL AS dq_end_tstamp
                     ,'{db_username}' AS db_username
                     ,'{unix_username}' AS unix_username
@@ -766,19 +1645,19 @@ class GenericChecks:
                             ,MAX(last_src_value) AS last_src_value
                             ,{calc_top} AS top_value
                             ,{calc_bottom} AS bottom_value
-                            ,AVG(diff)::INT AS avg_diff
-                            ,STDDEV(diff)::INT AS std_dev_diff
+                            ,{avg_diff} AS avg_diff
+                            ,{std_dev_diff} AS std_dev_diff
                             ,COUNT(*) AS num_of_weeks
                         FROM
                         (
                             SELECT
                                 table_name
                                 ,dq_run_hour
-                                ,CASE WHEN (dq_run_hour::DATE = current_date - interval '7 day')
-                                    THEN dq_tgt_value::INT ELSE 0 END last_src_value
-                                ,dq_tgt_value::INT AS dq_run_value
-                                ,LAG(dq_tgt_value::INT) OVER (ORDER BY dq_run_hour) AS prev_dq_run_value
-                                ,dq_tgt_value::INT - LAG(dq_tgt_value::INT) OVER (ORDER BY dq_run_hour ASC) AS diff
+                                ,CASE WHEN ({run_date} = current_date - {last_week})
+                                    THEN {tgt_value} ELSE 0 END last_src_value
+                                ,{tgt_value} AS dq_run_value
+                                ,LAG({tgt_value}) OVER (ORDER BY dq_run_hour) AS prev_dq_run_value
+                                ,{tgt_value} - LAG({tgt_value}) OVER (ORDER BY dq_run_hour ASC) AS diff
                             FROM dq_dedup
                             WHERE rnk = 1
                             ORDER BY dq_run_hour ASC 
@@ -790,7 +1669,8 @@ class GenericChecks:
             """.format(
                 trending_type=trending_type,
                 insert=vars['insert_sql'],
-                dq_run_hour=vars['dq_run_hour'],
+                dq_run_hour=self.dialect.timestamp(vars['dq_run_hour']),
+                current_timestamp=self.dialect.current_timestamp(),
                 database_name=vars['target_database_name'],
                 schema_name=vars['target_schema_name'],
                 table_name=vars['target_table_name'],
@@ -805,6 +1685,12 @@ class GenericChecks:
                 src_logic=src_logic,
                 calc_top=calc_logic_top,
                 calc_bottom=calc_logic_bottom,
+                run_date=self.dialect.to_date('dq_run_hour'),
+                last_week=self.dialect.interval(7, 'day'),
+                same_weekdays=same_weekdays,
+                tgt_value=cast('dq_tgt_value', 'INT'),
+                avg_diff=cast('AVG(diff)', 'INT'),
+                std_dev_diff=cast('STDDEV(diff)', 'INT'),
                 stop=stop_on_failure,
                 dq_key=vars['dq_key'],
                 dq_table=vars['dq_table'],
@@ -0,0 +1,229 @@
+import re
+import time
+from datetime import date, datetime
+
+import duckdb
+import yaml
+
+from lib.dialect import SnowflakeDialect
+from lib.query_log import QueryLog
+
+
+class LocalDialect(SnowflakeDialect):
+    ''' SQL snippets for the generic checks running in the local (DuckDB) database '''
+    name = 'local'
+
+    # No HLL sketches, HASH_AGG, MERGE or clustering in DuckDB
+    supports_incremental = False
+    supports_data_diff = False
+    supports_archive = False
+
+    columns_mapping = {
+        'string': 'VARCHAR',
+        'bigint': 'BIGINT',
+        'boolean': 'BOOLEAN',
+        'timestamp': 'TIMESTAMP',
+    }
+
+    def date_series(self, max_date, days):
+        return """
+                SELECT CAST(m.{max_date} - (r.range * interval '1 day') AS date) AS date_col
+                FROM range({days}) r,
+                    max_date m
+        """.format(max_date=max_date, days=days)
+
+
+class LocalDB:
+    ''' In-memory DuckDB with the same interface as the Snowflake connection (ie: unit tests without account) '''
+    # Snowflake functions which are not in DuckDB
+    MACROS = [
+        "CREATE OR REPLACE MACRO iff(c, a, b) AS CASE WHEN c THEN a ELSE b END",
+        "CREATE OR REPLACE MACRO to_date(e) AS CAST(e AS date)",
+        "CREATE OR REPLACE MACRO to_varchar(e) AS CAST(e AS VARCHAR)",
+        "CREATE OR REPLACE MACRO equal_null(a, b) AS a IS NOT DISTINCT FROM b",
+        "CREATE OR REPLACE MACRO dq_dateadd(u, n, e) AS e + CAST(CAST(n AS BIGINT) || ' ' || u AS INTERVAL)",
+    ]
+    # Snowflake syntax rewritten for DuckDB (pattern, replacement)
+    REWRITES = [
+        # Temporary tables cannot be in another catalog than temp (in-memory database anyway)
+        (r'\bLOCAL\s+TEMPORARY\s+TABLE\b', 'TABLE'),
+        (r'\bCLUSTER\s+BY\s*\([^;]*?\)\s*(?=;|$)', ''),
+        (r'\bDATEADD\s*\(\s*(\w+)\s*,', r"dq_dateadd('\1',"),
+        (r'\btable\s*\(\s*generator\s*\(\s*rowcount\s*=>\s*(\d+)\s*\)\s*\)', r'range(\1)'),
+        (r'\bORDER\s+BY\s+NULL\s*\)', ')'),
+        (r'\bTIMESTAMP\s+WITHOUT\s+TIME\s+ZONE\b', 'TIMESTAMP'),
+    ]
+
+    def __init__(self, database=':memory:', user='local', env='NON-PROD', fixtures=None):
+        self.connection = duckdb.connect(database)
+        self.cursor = self.connection.cursor()
+        self.db_host = "duckdb:{d}".format(d=database)
+        self.db_user = user
+        self.local_env = env
+        self.dialect = LocalDialect()
+        self.query_log = QueryLog('local')
+        self.result = None
+        self.row_count = -1
+        for macro in self.MACROS:
+            self.cursor.execute(macro)
+        # Same databases/schemas as Snowflake for the DQ tables and unit test tables
+        self.create_schema(self.shared_schema)
+        self.create_schema("{db}.{u}".format(db=self.user_database, u=self.db_user))
+        if fixtures is not None:
+            self.load_fixtures(fixtures)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.commit()
+        self.connection.close()
+
+    def commit(self):
+        pass
+
+    @property
+    def env(self) -> str:
+        return self.local_env
+
+    @property
+    def shared_schema(self) -> str:
+        return ".".join(["COMMON", "SHARED"])
+
+    @property
+    def watcher_databases(self) -> str:
+        return "'DB1', 'DB2', 'DB3', 'DB4'"
+
+    @property
+    def user_database(self) -> str:
+        return "SF_USER"
+
+    @property
+    def dq_table(self) -> str:
+        return f"{self.shared_schema}.dq_data_result"
+
+    @property
+    def dq_archive_table(self) -> str:
+        return f"{self.shared_schema}.dq_data_result_archive"
+
+    @property
+    def dq_state_table(self) -> str:
+        return f"{self.shared_schema}.dq_incremental_state"
+
+    def create_schema(self, schema):
+        ''' Attach the database (in-memory) and create the schema of database.schema if missing '''
+        (database, schema_name) = schema.split('.')
+        attached = [row[0].lower() for row in self.connection.execute("SELECT database_name FROM duckdb_databases()").fetchall()]
+        if database.lower() not in attached:
+            self.connection.execute("ATTACH ':memory:' AS {d}".format(d=database))
+        self.connection.execute("CREATE SCHEMA IF NOT EXISTS {d}.{s}".format(d=database, s=schema_name))
+
+    def translate(self, sql):
+        ''' Rewrite the Snowflake syntax which is not supported by DuckDB '''
+        for (pattern, replacement) in self.REWRITES:
+            sql = re.sub(pattern, replacement, sql, flags=re.IGNORECASE)
+        return sql
+
+    def execute(self, sql):
+        start = time.perf_counter()
+        try:
+            self.cursor.execute(self.translate(sql))
+            self.result = self.cursor.fetchall() if self.cursor.description is not None else None
+        except(Exception) as error:
+            self.query_log.record(sql, None, time.perf_counter() - start, None, error=str(error))
+            print("ERROR ==> {e}".format(e=error))
+            raise Exception(error)
+        # No rowcount in DuckDB cursor (DML returns the number of changed rows as result instead)
+        self.row_count = len(self.result) if self.result is not None else -1
+        self.query_log.record(sql, None, time.perf_counter() - start, self.row_count)
+
+    def execute_transaction(self, sqls):
+        ''' To execute a list of statements as a single transaction '''
+        try:
+            self.cursor.execute("BEGIN TRANSACTION")
+            for sql in sqls:
+                self.cursor.execute(self.translate(sql))
+        except(Exception) as error:
+            print("ERROR ==> {e}".format(e=error))
+            self.cursor.execute("ROLLBACK")
+            raise Exception(error)
+        self.cursor.execute("COMMIT")
+
+    def query(self, sql, header=False):
+        self.execute(sql)
+        if self.result is None:
+            return None
+        if header:
+            head_row = [desc[0] for desc in self.cursor.description]
+            return (self.result, head_row)
+        else:
+            return self.result
+
+    def rows(self):
+        return self.row_count
+
+    def get_host(self):
+        return self.db_host
+
+    def get_user(self):
+        return self.db_user
+
+    def flush_query_log(self):
+        ''' Write the query log (DQ_QUERY_LOG) '''
+        self.query_log.flush()
+
+    def use_cached_result(self, use_cache=True):
+        # No result cache in DuckDB
+        print("*** USE_CACHE={use_cache} (ignored for local database) ***".format(**locals()))
+
+    def load_table(self, table, rows=None, csv_file=None, columns=None):
+        ''' Create a fixture table (database.schema.table) from a list of dicts or a CSV file '''
+        self.create_schema('.'.join(table.split('.')[0:2]))
+        if csv_file is not None:
+            self.cursor.execute("CREATE OR REPLACE TABLE {t} AS SELECT * FROM read_csv_auto('{f}', header=true)".format(
+                t=table, f=csv_file.replace("'", "''")))
+            return
+        if rows is None or len(rows) == 0:
+            if columns is None:
+                raise Exception("Fixture '{t}' requires rows, csv or columns".format(t=table))
+            rows = []
+        if columns is None:
+            columns = {c: self.__get_type(rows, c) for c in rows[0]}
+        self.cursor.execute("CREATE OR REPLACE TABLE {t} ({cols})".format(
+            t=table, cols=", ".join(["{c} {t}".format(c=c, t=t) for c, t in columns.items()])))
+        if len(rows) > 0:
+            self.cursor.executemany("INSERT INTO {t} ({cols}) VALUES ({params})".format(
+                t=table, cols=", ".join(columns), params=", ".join(['?'] * len(columns))),
+                [[row.get(c) for c in columns] for row in rows])
+
+    def load_fixtures(self, fixtures):
+        ''' Load the tables of a fixture YAML file (tables: {name: {columns, rows or csv}}) '''
+        if isinstance(fixtures, str):
+            with open(fixtures) as f:
+                fixtures = yaml.load(f, Loader=yaml.FullLoader)
+        for table, fixture in fixtures.get('tables', {}).items():
+            self.load_table(
+                table,
+                rows=fixture.get('rows'),
+                csv_file=fixture.get('csv'),
+                columns=fixture.get('columns'),
+                )
+
+    def __get_type(self, rows, column):
+        ''' DuckDB type of a fixture column from the first non null value '''
+        for row in rows:
+            value = row.get(column)
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                return 'BOOLEAN'
+            if isinstance(value, int):
+                return 'BIGINT'
+            if isinstance(value, float):
+                return 'DOUBLE'
+            if isinstance(value, datetime):
+                return 'TIMESTAMP'
+            if isinstance(value, date):
+                return 'DATE'
+            return 'VARCHAR'
+        return 'VARCHAR'
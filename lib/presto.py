@@ -1,16 +1,34 @@
 import prestodb
 import os
+import time
 from lib.run_with_retry import run_with_retry
+from lib.query_log import QueryLog
 
 class Presto:
     SSL_CERT_PATH = os.environ.get('SSL_CERT', '/etc/ssl/certs/ca-certificates.crt')
 
     def __init__(self, PRESTO_HOST='PRESTO_HOST', PRESTO_PORT='PRESTO_PORT', PRESTO_USER='PRESTO_USER',
-                 PRESTO_PASSWORD='PRESTO_PASSWORD', skip_cert_validation=False, retries_on_query_failure=0):
+                 PRESTO_PASSWORD='PRESTO_PASSWORD', skip_cert_validation=False, retries_on_query_failure=0,
+                 connection=None):
         """
         :param skip_cert_validation: Forces skipping validation of the SSL certificate (useful in development)
         :param ratries_on_query_failure: Number of retries when received PresotQueryError
+        :param connection: DB-API connection to use instead of connecting (ie: ReplayConnection)
         """
+        # Tag and timing of each query (bytes scanned from the stats of the query)
+        self.query_log = QueryLog('presto')
+        # Headers of the client session: the same dict is kept by the session, so the client info
+        # (tag of the query) can be changed before each statement (an empty dict would be replaced)
+        self.http_headers = {'X-Presto-Client-Info': ''}
+
+        if connection is not None:
+            self.connection = connection
+            self.cursor = self.connection.cursor()
+            self.db_host = os.environ.get(PRESTO_HOST, 'replay')
+            self.db_user = os.environ.get(PRESTO_USER, 'replay')
+            self.cursor_result = None
+            self.retries_on_query_failure = retries_on_query_failure
+            return
 
         if PRESTO_HOST not in os.environ:
             raise Exception("Missing {v} as environment variable".format(v=PRESTO_HOST))
@@ -33,6 +51,7 @@ class Presto:
                 user=user,
                 http_scheme='https',
                 auth=prestodb.auth.BasicAuthentication(user, password),
+                http_headers=self.http_headers,
             )
             if skip_cert_validation is True:
                 self.connection._http_session.verify = False
@@ -59,15 +78,35 @@ class Presto:
         self.connection.commit()
 
     def execute(self, sql):
+        for s in sql.split(';'):
+            if len(s) > 0:
+                self.__execute(s.rstrip(';'))
+        #self.commit()
+
+    def __execute(self, sql):
+        ''' Execute a statement with the tag of the query log and record its timing '''
+        # Tag of the query in the client info (Presto UI and event listeners)
+        self.http_headers['X-Presto-Client-Info'] = self.query_log.get_tag() or ''
+        start = time.perf_counter()
         try:
-            for s in sql.split(';'):
-                if len(s) > 0:
-                    self.cursor.execute(s.rstrip(';'))
-                    self.cursor_result = self.cursor.fetchall()
+            self.cursor.execute(sql)
+            self.cursor_result = self.cursor.fetchall()
         except(Exception) as error:
+            self.query_log.record(sql, self.__get_stats().get('queryId'), time.perf_counter() - start, None,
+                error=str(error))
             print("ERROR ==> {e}".format(e=error))
             raise error
-        #self.commit()
+        stats = self.__get_stats()
+        self.query_log.record(sql, stats.get('queryId'), time.perf_counter() - start, len(self.cursor_result),
+            bytes_scanned=stats.get('processedBytes'))
+
+    def __get_stats(self):
+        ''' Stats of the last query (queryId, processedBytes, ...) from the client (none for a replay) '''
+        return getattr(self.cursor, 'stats', None) or {}
+
+    def flush_query_log(self):
+        ''' Write the query log (DQ_QUERY_LOG) '''
+        self.query_log.flush()
 
     def __check_if_internal_error(self, ex: Exception) -> bool:
         # Returns true if error_type for exception is 'INTERNAL_ERROR'
@@ -0,0 +1,84 @@
+import os
+import re
+import json
+from datetime import datetime
+
+from lib.tracing import get_tracer
+
+
+class QueryLog:
+    ''' Tag (job, step, check, keys) and timing record of each query of a Snowflake/Presto connection '''
+    # Fields of the tag (in the order of the QUERY_TAG JSON)
+    TAG_FIELDS = ['job', 'step', 'check', 'dq_key', 'etl_run_key']
+    # Length of the SQL kept in a record
+    SQL_LENGTH = 1000
+    # Environment variable of the JSONL file the records are appended to
+    LOG_FILE_ENV = 'DQ_QUERY_LOG'
+
+    def __init__(self, database_type, log_file=None):
+        self.database_type = database_type
+        self.log_file = log_file if log_file is not None else os.environ.get(self.LOG_FILE_ENV)
+        self.tag = {}
+        # Records since the last flush
+        self.records = []
+
+    def set_tag(self, **fields):
+        ''' Tag of the next queries (a field set to None is removed) '''
+        for (field, value) in fields.items():
+            if field not in self.TAG_FIELDS:
+                raise Exception("Unknown query tag field '{f}'".format(f=field))
+            if value is None:
+                self.tag.pop(field, None)
+            else:
+                self.tag[field] = value
+
+    @property
+    def enabled(self):
+        ''' Whether the records are written anywhere (log file or trace) '''
+        return self.log_file is not None or get_tracer().enabled
+
+    def get_tag(self):
+        ''' JSON of the tag (None if not tagged) '''
+        if len(self.tag) == 0:
+            return None
+        return json.dumps({f: self.tag[f] for f in self.TAG_FIELDS if f in self.tag}, separators=(',', ':'))
+
+    def record(self, sql, query_id, elapsed, rows, bytes_scanned=None, error=None):
+        ''' Timing record of a query (bytes scanned is back-filled later for Snowflake) '''
+        # Nothing to keep when neither the log file nor the trace is set
+        if not self.enabled:
+            return None
+        record = {
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'database_type': self.database_type,
+            }
+        record.update({f: self.tag.get(f) for f in self.TAG_FIELDS})
+        record.update({
+            'query_id': query_id,
+            'elapsed': round(elapsed, 3),
+            'rows': rows,
+            'bytes_scanned': bytes_scanned,
+            'error': error,
+            'sql': re.sub(r'\s+', ' ', sql).strip()[:self.SQL_LENGTH],
+            })
+        self.records.append(record)
+        # Same dict as the record (the back-filled bytes scanned are in the trace too)
+        get_tracer().add_span('sql', self.database_type, elapsed, record)
+        return record
+
+    def get_missing(self):
+        ''' Query ids of the records without bytes scanned '''
+        return [r['query_id'] for r in self.records if r['query_id'] is not None and r['bytes_scanned'] is None]
+
+    def update(self, query_id, **fields):
+        for record in self.records:
+            if record['query_id'] == query_id:
+                record.update(fields)
+
+    def flush(self):
+        ''' Append the records to the log file (if set) and start over '''
+        if self.log_file is not None and len(self.records) > 0:
+            with open(self.log_file, 'a') as f:
+                for record in self.records:
+                    f.write(json.dumps(record, default=str) + "\n")
+        self.records = []
@@ -0,0 +1,80 @@
+import os
+import time
+import sqlite3
+
+class ReadinessCache:
+    ''' Host-local readiness of the Watcher dependencies shared by all the processes (SQLite) '''
+    # Default file of the cache (shared by all the Watchers of the host)
+    CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'dq_watcher', 'readiness.db')
+    # Seconds a WAITING verdict is reused (READY is reused for the whole day)
+    WAITING_TTL = 60
+    # Seconds to wait for the lock of another process
+    LOCK_TIMEOUT = 30
+
+    def __init__(self, cache_file=None, waiting_ttl=WAITING_TTL, source=''):
+        self.cache_file = cache_file if cache_file is not None else self.CACHE_FILE
+        self.waiting_ttl = waiting_ttl
+        # Account the verdicts come from (host, user and databases of the connection)
+        self.source = source
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        # Autocommit, transactions are explicit (BEGIN IMMEDIATE takes the write lock)
+        # (used by one thread at a time, but not always the one which opened it, ie: async Watcher)
+        self.connection = sqlite3.connect(self.cache_file, timeout=self.LOCK_TIMEOUT, isolation_level=None,
+            check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # Cache of a previous version without the source (verdicts of any account)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(readiness)").fetchall()]
+        if len(columns) > 0 and 'source' not in columns:
+            self.connection.execute("DROP TABLE readiness")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS readiness (
+                source TEXT NOT NULL,
+                check_type TEXT NOT NULL,
+                name TEXT NOT NULL,
+                day TEXT NOT NULL,
+                end_time TEXT,
+                is_ready INTEGER NOT NULL,
+                checked_at REAL NOT NULL,
+                PRIMARY KEY (source, check_type, name, day)
+            )
+        """)
+
+    def get(self, check_type, names, day):
+        ''' {name: (end_time, is_ready)} of the names with a usable verdict for the day (READY or recent WAITING) '''
+        if len(names) == 0:
+            return {}
+        rows = self.connection.execute("""
+            SELECT name, end_time, is_ready
+            FROM readiness
+            WHERE source = ? AND check_type = ? AND day = ? AND name IN ({params})
+            AND (is_ready = 1 OR checked_at >= ?)
+        """.format(params=", ".join(['?'] * len(names))),
+            [self.source, check_type, day] + list(names) + [time.time() - self.waiting_ttl]).fetchall()
+        return {name: (end_time, bool(is_ready)) for (name, end_time, is_ready) in rows}
+
+    def put(self, check_type, verdicts, day):
+        ''' Store the verdicts {name: (end_time, is_ready)} of the day (a READY verdict is never overwritten) '''
+        if len(verdicts) == 0:
+            return
+        checked_at = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.executemany("""
+                INSERT INTO readiness (source, check_type, name, day, end_time, is_ready, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (source, check_type, name, day) DO UPDATE SET
+                    end_time = excluded.end_time,
+                    is_ready = excluded.is_ready,
+                    checked_at = excluded.checked_at
+                WHERE readiness.is_ready = 0
+            """, [(self.source, check_type, name, day, end_time, int(is_ready), checked_at)
+                for name, (end_time, is_ready) in verdicts.items()])
+            # Verdicts of the previous days are not used anymore
+            self.connection.execute("DELETE FROM readiness WHERE day < ?", [day])
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,198 @@
+import re
+import json
+import time
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+
+def normalize_sql(sql):
+    ''' SQL key of a recorded statement (whitespace and run keys, ie: dq_key epoch, are not compared) '''
+    sql = re.sub(r'\s+', ' ', sql).strip().rstrip(';').strip()
+    return re.sub(r'\d{10,}', '<key>', sql)
+
+
+def encode_value(value):
+    ''' JSON value of a result column (keep the type of dates and decimals for the replay) '''
+    if isinstance(value, datetime):
+        return {'__type__': 'datetime', 'value': value.isoformat()}
+    if isinstance(value, date):
+        return {'__type__': 'date', 'value': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'__type__': 'decimal', 'value': str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {'__type__': 'bytes', 'value': value.hex()}
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, dict) and '__type__' in value:
+        if value['__type__'] == 'datetime':
+            return datetime.fromisoformat(value['value'])
+        if value['__type__'] == 'date':
+            return date.fromisoformat(value['value'])
+        if value['__type__'] == 'decimal':
+            return Decimal(value['value'])
+        if value['__type__'] == 'bytes':
+            return bytes.fromhex(value['value'])
+    return value
+
+
+class RecordingCursor:
+    ''' DB-API cursor which appends each statement, its result and latency to the recording '''
+    def __init__(self, connection, cursor):
+        self.connection = connection
+        self.cursor = cursor
+        self.description = None
+        self.rowcount = -1
+        self.result = None
+
+    def execute(self, sql, *args, **kwargs):
+        record = {'sql': sql}
+        start = time.perf_counter()
+        try:
+            self.cursor.execute(sql, *args, **kwargs)
+            self.description = self.cursor.description
+            # Fetch now to include the transfer of the result in the latency (as seen by the caller)
+            self.result = self.cursor.fetchall() if self.description is not None else None
+            self.rowcount = self.cursor.rowcount
+        except(Exception) as error:
+            record['latency'] = time.perf_counter() - start
+            record['error'] = str(error)
+            self.connection.write(record)
+            raise
+        record['latency'] = time.perf_counter() - start
+        record['columns'] = [desc[0] for desc in self.description] if self.description is not None else None
+        record['rows'] = [[encode_value(v) for v in row] for row in self.result] if self.result is not None else None
+        record['rowcount'] = self.rowcount
+        self.connection.write(record)
+        return self
+
+    def fetchall(self):
+        result = self.result if self.result is not None else []
+        self.result = None
+        return result
+
+    def close(self):
+        self.cursor.close()
+
+
+class RecordingConnection:
+    ''' DB-API connection which records all the statements of a real connection to a JSONL file '''
+    def __init__(self, connection, path):
+        self.connection = connection
+        self.file = open(path, 'a')
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def cursor(self):
+        return RecordingCursor(self, self.connection.cursor())
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.file.close()
+        self.connection.close()
+
+
+class ReplayCursor:
+    ''' DB-API cursor which plays back the recorded result of each statement '''
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self.result = None
+
+    def execute(self, sql, *args, **kwargs):
+        record = self.connection.next_record(sql)
+        if record is None:
+            # Not recorded (ie: not strict), behave as a statement without result
+            self.description = None
+            self.result = None
+            self.rowcount = -1
+            return self
+        self.connection.sleep(record['latency'])
+        if 'error' in record:
+            raise Exception(record['error'])
+        if record['columns'] is not None:
+            self.description = [(c, None, None, None, None, None, None) for c in record['columns']]
+            self.result = [tuple(decode_value(v) for v in row) for row in record['rows']]
+        else:
+            self.description = None
+            self.result = None
+        self.rowcount = record['rowcount']
+        return self
+
+    def fetchall(self):
+        result = self.result if self.result is not None else []
+        self.result = None
+        return result
+
+    def close(self):
+        pass
+
+
+class ReplayConnection:
+    ''' DB-API connection which replays a recording with the real (or scaled) latency '''
+    def __init__(self, path, latency_scale=1.0, strict=True):
+        # Same statement can be run many times (ie: retries, polling), replay them in order
+        self.records = {}
+        with open(path) as f:
+            for line in f:
+                if len(line.strip()) == 0:
+                    continue
+                record = json.loads(line)
+                self.records.setdefault(normalize_sql(record['sql']), []).append(record)
+        self.positions = {}
+        # Cursors can be used from many threads (ie: checks running in parallel)
+        self.lock = threading.Lock()
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self.num_statements = 0
+        self.total_latency = 0.0
+
+    def next_record(self, sql):
+        ''' Next recorded run of the statement (the last one is repeated once all are played) '''
+        key = normalize_sql(sql)
+        if key not in self.records:
+            if self.strict:
+                raise Exception("No recording for SQL: {s}".format(s=key[:200]))
+            return None
+        with self.lock:
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            self.num_statements += 1
+        records = self.records[key]
+        return records[min(position, len(records) - 1)]
+
+    def sleep(self, latency):
+        latency = latency * self.latency_scale
+        with self.lock:
+            self.total_latency += latency
+        if latency > 0:
+            time.sleep(latency)
+
+    def cursor(self):
+        return ReplayCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def record(db, path):
+    ''' Record all the next statements of a Snowflake/Presto object (ie: Detector.db) to a JSONL file '''
+    db.connection = RecordingConnection(db.connection, path)
+    db.cursor = db.connection.cursor()
+    return db
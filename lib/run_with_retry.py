@@ -1,6 +1,8 @@
 from typing import Callable, Any
 import time
 
+from lib.tracing import get_tracer
+
 
 def run_with_retry(fn: Callable[[], Any],
                    retry_number: int,
@@ -29,6 +31,7 @@ def run_with_retry(fn: Callable[[], Any],
         print(f"Retry: Failed run {current}/{retry_number}")
 
         if current < retry_number:
+            get_tracer().set_attribute(retries=current + 1)
             print(f"Retry: Sleeping for {delay} seconds...")
             time.sleep(delay)
             delay *= 2
@@ -0,0 +1,115 @@
+''' Stand-in of the Watcher dependency sources with scripted arrivals on a virtual clock
+
+A Watcher reads its dependencies from two sources, both injected in Watcher():
+    db:     query(sql) of the upload_history/task_log/INFORMATION_SCHEMA checks (and the Snowflake properties)
+    presto: query(sql) of the $partitions checks
+ScriptedSource is both: the arrivals of the script are only visible once the clock passed their time.
+
+Script (YAML file or dict):
+    arrivals:
+      - {type: table, name: schema.table, time: '06:15'}
+      - {type: task, name: schema.task, time: '2024-01-01 06:30:00'}
+      - {type: metadata, name: database.schema.table, time: '07:00'}
+      - {type: partition, name: catalog.schema.table, time: '07:10', partition: {dl_partition_hour: '23'}}
+'''
+import re
+import threading
+from datetime import datetime
+
+import yaml
+
+from lib.local_db import LocalDB
+from lib.watcher import get_partition_values
+
+
+class ScriptedSource(LocalDB):
+    # INFORMATION_SCHEMA of the stand-in (cannot be created in DuckDB)
+    METADATA_TABLE = 'COMMON.SHARED.TABLE_METADATA'
+    # Database of the upload_history arrivals (one of watcher_databases)
+    DB_NAME = 'DB1'
+
+    def __init__(self, clock, script=None, database=':memory:'):
+        super().__init__(database=database)
+        self.clock = clock
+        # Arrivals not visible yet (time, type, name, partition), in time order
+        self.pending = []
+        self.num_queries = 0
+        # One DuckDB cursor for db and presto (queried from two threads by Watcher.watch_async)
+        self.lock = threading.Lock()
+        self.load_table(self.shared_schema + '.UPLOAD_HISTORY', columns={
+            'db_name': 'VARCHAR', 'schema_name': 'VARCHAR', 'table_name': 'VARCHAR', 'last_update_time': 'TIMESTAMP'})
+        self.load_table(self.shared_schema + '.TASK_LOG', columns={
+            'db_schema': 'VARCHAR', 'task': 'VARCHAR', 'action': 'VARCHAR', 'log_time': 'TIMESTAMP'})
+        self.load_table(self.METADATA_TABLE, columns={
+            'table_catalog': 'VARCHAR', 'table_schema': 'VARCHAR', 'table_name': 'VARCHAR', 'last_altered': 'TIMESTAMP'})
+        if script is not None:
+            self.load_script(script)
+
+    def load_script(self, script):
+        ''' Add the arrivals of a script YAML file (or dict) '''
+        if isinstance(script, str):
+            with open(script) as f:
+                script = yaml.load(f, Loader=yaml.FullLoader)
+        for arrival in script.get('arrivals', []):
+            self.add_arrival(arrival['type'], arrival['name'], arrival['time'], arrival.get('partition'))
+
+    def add_arrival(self, check_type, name, arrival_time, partition=None):
+        ''' Make a dependency arrive at a time (datetime, 'YYYY-MM-DD HH:MM[:SS]' or 'HH:MM[:SS]' of the clock's day) '''
+        if isinstance(arrival_time, str):
+            if len(arrival_time) <= 8:
+                day = self.clock.now().strftime("%Y-%m-%d")
+                arrival_time = "{d} {t}".format(d=day, t=arrival_time)
+            arrival_time = datetime.fromisoformat(arrival_time)
+        if check_type not in ('table', 'task', 'metadata', 'partition'):
+            raise Exception("Unknown arrival type '{t}'".format(t=check_type))
+        if check_type == 'partition':
+            # Table exists before its partition arrives (waiting, not an error)
+            self.__create_partitions_table(name.split('.'), self.__get_partition(arrival_time, partition))
+        self.pending.append((arrival_time, check_type, name, partition))
+        self.pending.sort(key=lambda a: a[0])
+
+    def translate(self, sql):
+        ''' Read INFORMATION_SCHEMA.TABLES of any database from the metadata table of the stand-in '''
+        sql = super().translate(sql)
+        return re.sub(r'\b\w+\.INFORMATION_SCHEMA\.TABLES\b', self.METADATA_TABLE, sql, flags=re.IGNORECASE)
+
+    def query(self, sql, header=False):
+        with self.lock:
+            self.__release()
+            self.num_queries += 1
+            return super().query(sql, header)
+
+    def __release(self):
+        ''' Insert the arrivals the clock has passed '''
+        now = self.clock.now()
+        while len(self.pending) > 0 and self.pending[0][0] <= now:
+            (arrival_time, check_type, name, partition) = self.pending.pop(0)
+            parts = name.split('.')
+            if check_type == 'table':
+                self.cursor.execute("INSERT INTO {s}.UPLOAD_HISTORY VALUES (?, ?, ?, ?)".format(s=self.shared_schema),
+                    [self.DB_NAME, parts[-2].upper(), parts[-1].upper(), arrival_time])
+            elif check_type == 'task':
+                self.cursor.execute("INSERT INTO {s}.TASK_LOG VALUES (?, ?, 'end', ?)".format(s=self.shared_schema),
+                    [parts[-2], parts[-1], arrival_time])
+            elif check_type == 'metadata':
+                # Any database of the checks is read from the same table (see translate)
+                self.cursor.execute("INSERT INTO {m} VALUES (?, ?, ?, ?)".format(m=self.METADATA_TABLE),
+                    [parts[0].upper(), parts[1].upper(), parts[2].upper(), arrival_time])
+            else:
+                self.__add_partition(parts, arrival_time, partition)
+
+    def __get_partition(self, arrival_time, partition):
+        # Same default columns as the Watcher
+        return get_partition_values(arrival_time, {c: str(v) for c, v in (partition or {}).items()})
+
+    def __create_partitions_table(self, parts, values):
+        self.create_schema('.'.join(parts[0:2]))
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS {c}.{s}.\"{t}$partitions\" ({cols})".format(
+            c=parts[0], s=parts[1], t=parts[2],
+            cols=", ".join(["{c} {t}".format(c=c, t='BIGINT' if v.isdigit() else 'VARCHAR') for c, v in values.items()])))
+
+    def __add_partition(self, parts, arrival_time, partition):
+        values = self.__get_partition(arrival_time, partition)
+        table = '{c}.{s}."{t}$partitions"'.format(c=parts[0], s=parts[1], t=parts[2])
+        self.cursor.execute("INSERT INTO {t} ({cols}) VALUES ({params})".format(
+            t=table, cols=", ".join(values), params=", ".join(['?'] * len(values))), list(values.values()))
@@ -0,0 +1,124 @@
+import numpy as np
+
+class SeasonalBaseline:
+    ''' Seasonal median/MAD baseline of many metrics at once (vectorized over all history rows) '''
+    # Scale of the MAD to be comparable to a standard deviation (normal distribution)
+    MAD_SCALE = 1.4826
+    # Minimum spread of the bounds relative to the median (ie: constant metrics with MAD of 0)
+    MIN_RELATIVE_SCALE = 0.01
+    # Number of seasons of a metric (weekday * 24 + hour)
+    NUM_SEASONS = 7 * 24
+    SEASONS = ['weekday_hour', 'weekday', 'hour', 'none']
+
+    def __init__(self, season='weekday_hour', min_points=4):
+        if season not in self.SEASONS:
+            raise Exception("Unknown season '{s}' (only {l})".format(s=season, l='/'.join(self.SEASONS)))
+        self.season = season
+        self.min_points = min_points
+        self.metric_names = np.array([], dtype=str)
+        self.season_groups = self.__fit_groups(np.array([], dtype=np.int64), np.array([], dtype=float))
+        self.metric_groups = self.season_groups
+
+    def __get_seasons(self, run_hours):
+        ''' Season of each run hour (Monday is weekday 0) '''
+        hours = np.array(run_hours, dtype='datetime64[h]').astype(np.int64)
+        # 1970-01-01 is a Thursday
+        weekday = ((hours // 24) + 3) % 7
+        hour = hours % 24
+        if self.season == 'weekday_hour':
+            return weekday * 24 + hour
+        elif self.season == 'weekday':
+            return weekday
+        elif self.season == 'hour':
+            return hour
+        return np.zeros(len(hours), dtype=np.int64)
+
+    def __group_median(self, group_ids, values):
+        ''' Median of each group (group_ids and values have to be sorted by group and value) '''
+        groups, starts, counts = np.unique(group_ids, return_index=True, return_counts=True)
+        if len(groups) == 0:
+            return (groups, np.array([], dtype=float), counts)
+        medians = (values[starts + (counts - 1) // 2] + values[starts + counts // 2]) / 2.0
+        return (groups, medians, counts)
+
+    def __fit_groups(self, group_ids, values):
+        ''' Median, MAD and number of points of each group '''
+        order = np.lexsort((values, group_ids))
+        group_ids = group_ids[order]
+        values = values[order]
+        (groups, medians, counts) = self.__group_median(group_ids, values)
+        deviations = np.abs(values - np.repeat(medians, counts))
+        order = np.lexsort((deviations, group_ids))
+        (_, mads, _) = self.__group_median(group_ids[order], deviations[order])
+        return (groups, medians, mads, counts)
+
+    def __lookup(self, fitted, keys):
+        ''' Median, MAD and number of points of the groups of the keys (0 points if not found) '''
+        (groups, medians, mads, counts) = fitted
+        if len(groups) == 0:
+            zeros = np.zeros(len(keys))
+            return (zeros, zeros, zeros.astype(np.int64))
+        idx = np.minimum(np.searchsorted(groups, keys), len(groups) - 1)
+        found = groups[idx] == keys
+        return (
+            np.where(found, medians[idx], 0.0),
+            np.where(found, mads[idx], 0.0),
+            np.where(found, counts[idx], 0),
+            )
+
+    def fit(self, metrics, run_hours, values):
+        ''' Fit the baseline from the history rows (metric name, run hour, value) of all metrics '''
+        values = np.asarray(values, dtype=float)
+        self.metric_names, metric_ids = np.unique(np.asarray(metrics, dtype=str), return_inverse=True)
+        metric_ids = metric_ids.astype(np.int64)
+        seasons = self.__get_seasons(run_hours)
+        valid = ~np.isnan(values)
+        self.season_groups = self.__fit_groups((metric_ids * self.NUM_SEASONS + seasons)[valid], values[valid])
+        self.metric_groups = self.__fit_groups(metric_ids[valid], values[valid])
+        return self
+
+    def evaluate(self, metrics, run_hour, values, threshold, direction=None):
+        ''' Bounds and verdict of the current values (direction: None for both, upward or downward) '''
+        values = np.asarray(values, dtype=float)
+        metrics = np.asarray(metrics, dtype=str)
+        if len(self.metric_names) > 0:
+            metric_ids = np.minimum(np.searchsorted(self.metric_names, metrics), len(self.metric_names) - 1)
+            known = self.metric_names[metric_ids] == metrics
+        else:
+            metric_ids = np.zeros(len(metrics), dtype=np.int64)
+            known = np.zeros(len(metrics), dtype=bool)
+        season = self.__get_seasons([run_hour])[0]
+
+        # Seasonal group first and the whole history of the metric if not enough points
+        (s_median, s_mad, s_count) = self.__lookup(self.season_groups, metric_ids * self.NUM_SEASONS + season)
+        (m_median, m_mad, m_count) = self.__lookup(self.metric_groups, metric_ids)
+        is_seasonal = known & (s_count >= self.min_points)
+        median = np.where(is_seasonal, s_median, m_median)
+        mad = np.where(is_seasonal, s_mad, m_mad)
+        count = np.where(is_seasonal, s_count, np.where(known, m_count, 0))
+        has_baseline = count >= self.min_points
+
+        scale = np.maximum(self.MAD_SCALE * mad, self.MIN_RELATIVE_SCALE * np.abs(median))
+        lower = median - threshold * scale
+        upper = median + threshold * scale
+        with np.errstate(invalid='ignore'):
+            above = values > upper
+            below = values < lower
+        if direction == 'upward':
+            is_fail = above
+        elif direction == 'downward':
+            is_fail = below
+        else:
+            is_fail = above | below
+        # Pass without baseline (ie: new metric) and fail on missing value
+        is_pass = ~has_baseline | (~is_fail & ~np.isnan(values))
+        return {
+            'median': median,
+            'mad': mad,
+            'lower': lower,
+            'upper': upper,
+            'count': count,
+            'is_seasonal': is_seasonal,
+            'has_baseline': has_baseline,
+            'is_pass': is_pass,
+            }
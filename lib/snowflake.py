@@ -1,15 +1,30 @@
 import snowflake.connector
 import os
+import time
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives.asymmetric import dsa
 from cryptography.hazmat.primitives import serialization
+from lib.query_log import QueryLog
 
 class Snowflake:
     def __init__(self, SNOWSQL_SSO='SNOWSQL_SSO', SNOWSQL_ACCOUNT='SNOWSQL_ACCOUNT', SNOWSQL_USER='SNOWSQL_USER',
         SNOWSQL_PRIVATE_KEY_PASSPHRASE='SNOWSQL_PRIVATE_KEY_PASSPHRASE', SNOWSQL_PRIVATE_KEY_PATH='SNOWSQL_PRIVATE_KEY_PATH',
         SNOWSQL_PRIVATE_KEY_P8='SNOWSQL_PRIVATE_KEY_P8', SNOWSQL_PASSWORD='SNOWSQL_PASSWORD',
-        SNOWSQL_DATABASE='SNOWSQL_DATABASE', SNOWSQL_WAREHOUSE='SNOWSQL_WAREHOUSE', SNOWSQL_ROLE='SNOWSQL_ROLE'):
+        SNOWSQL_DATABASE='SNOWSQL_DATABASE', SNOWSQL_WAREHOUSE='SNOWSQL_WAREHOUSE', SNOWSQL_ROLE='SNOWSQL_ROLE',
+        connection=None):
+        # Tag and timing of each query (QUERY_TAG and bytes scanned from the query history)
+        self.query_log = QueryLog('snowflake')
+
+        if connection is not None:
+            # DB-API connection from the caller (ie: ReplayConnection for offline runs and benchmarks)
+            self.connection = connection
+            self.cursor = self.connection.cursor()
+            self.account = os.environ.get(SNOWSQL_ACCOUNT, 'replay')
+            self.db_host = "{a}.snowflakecomputing.com".format(a=self.account)
+            self.db_user = os.environ.get(SNOWSQL_USER, 'replay')
+            return
+
         if SNOWSQL_ACCOUNT not in os.environ:
             raise Exception("Missing {v} as environment variable".format(v=SNOWSQL_ACCOUNT))
         if SNOWSQL_USER not in os.environ:
@@ -152,14 +167,51 @@ class Snowflake:
     def dq_table(self) -> str:
         return f"{self.shared_schema}.dq_data_result"
 
+    @property
+    def dq_archive_table(self) -> str:
+        return f"{self.shared_schema}.dq_data_result_archive"
+
+    @property
+    def dq_state_table(self) -> str:
+        return f"{self.shared_schema}.dq_incremental_state"
+
+    def __execute(self, sql):
+        ''' Execute a statement with the tag of the query log and record its timing '''
+        tag = self.query_log.get_tag()
+        start = time.perf_counter()
+        try:
+            if tag is None:
+                self.cursor.execute(sql)
+            else:
+                # Statement parameter instead of ALTER SESSION (no extra round trip when the tag changes)
+                self.cursor.execute(sql, _statement_params={'QUERY_TAG': tag})
+        except(Exception) as error:
+            self.query_log.record(sql, getattr(self.cursor, 'sfqid', None), time.perf_counter() - start, None,
+                error=str(error))
+            raise error
+        self.query_log.record(sql, getattr(self.cursor, 'sfqid', None), time.perf_counter() - start,
+            self.cursor.rowcount)
+
     def execute(self, sql):
         try:
-            self.cursor.execute(sql)
+            self.__execute(sql)
         except(Exception) as error:
             print("ERROR ==> {e}".format(e=error))
             raise Exception(error)
         self.commit()
 
+    def execute_transaction(self, sqls):
+        ''' To execute a list of statements as a single transaction '''
+        try:
+            self.cursor.execute("BEGIN")
+            for sql in sqls:
+                self.__execute(sql)
+        except(Exception) as error:
+            print("ERROR ==> {e}".format(e=error))
+            self.connection.rollback()
+            raise Exception(error)
+        self.commit()
+
     def query(self, sql, header=False):
         self.execute(sql)
         if self.cursor.description is None:
@@ -183,6 +235,35 @@ class Snowflake:
     def get_user(self):
         return self.db_user
 
+    def backfill_query_log(self):
+        ''' Bytes scanned of the logged queries from the query history of the session (single query) '''
+        # No extra query when the records are not written anywhere
+        if not self.query_log.enabled:
+            return
+        query_ids = self.query_log.get_missing()
+        if len(query_ids) == 0:
+            return
+        id_filter = "','".join(query_ids)
+        sql = f"""
+            SELECT query_id, bytes_scanned, rows_produced, total_elapsed_time
+            FROM TABLE(INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION(RESULT_LIMIT => 10000))
+            WHERE query_id IN ('{id_filter}')
+        """
+        try:
+            # Not part of the log itself
+            self.cursor.execute(sql)
+            for (query_id, bytes_scanned, rows_produced, total_elapsed_time) in self.cursor.fetchall():
+                self.query_log.update(query_id, bytes_scanned=bytes_scanned, rows_produced=rows_produced,
+                    server_elapsed=total_elapsed_time / 1000 if total_elapsed_time is not None else None)
+        except(Exception) as error:
+            # Timings are still logged without the bytes scanned
+            print("Unable to backfill the query log ({e})".format(e=error))
+
+    def flush_query_log(self):
+        ''' Back-fill and write the query log (DQ_QUERY_LOG) '''
+        self.backfill_query_log()
+        self.query_log.flush()
+
     def use_cached_result(self, use_cache=True):
         sql = "alter session set use_cached_result={use_cache};".format(**locals())
         print("*** USE_CACHE={use_cache} ***".format(**locals()))
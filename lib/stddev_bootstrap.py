@@ -0,0 +1,95 @@
+''' Seed the std_dev history of all the DQ configs of a directory (one INSERT per database)
+
+Usage:
+    python -m lib.stddev_bootstrap <config_dir>
+    python -m lib.stddev_bootstrap <config_dir> --dry-run
+    python -m lib.stddev_bootstrap <config_dir> --variables env=prod date=2020-01-01
+'''
+import argparse
+import glob
+import os
+
+import yaml
+
+from lib.detector import Detector
+
+
+def replace_variables(str, variables):
+    ''' Same variables replacement as the Detector (ie: :env in the table name) '''
+    for variable in variables:
+        var_name = variable.split('=')[0]
+        var_value = variable.split('=')[1]
+        str = str.replace(":{vn}".format(vn=var_name), var_value)
+    return str
+
+
+def get_config_files(config_dir):
+    ''' All YAML files of the directory (and sub directories) '''
+    files = []
+    for ext in ('yml', 'yaml'):
+        files.extend(glob.glob(os.path.join(config_dir, '**', '*.' + ext), recursive=True))
+    return sorted(files)
+
+
+def get_database_key(config_data):
+    ''' Configs with the same key share the connection and DQ table '''
+    database = config_data.get('database', {})
+    return (
+        database.get('type', 'snowflake').lower(),
+        database.get('catalog', 'hive'),
+        database.get('schema', 'default'),
+        )
+
+
+def get_targets(config_data, variables):
+    ''' (table, column) of all the std_dev checks of a config '''
+    targets = []
+    if 'target_table' not in config_data:
+        return targets
+    table = replace_variables(config_data['target_table']['name'], variables)
+    for dq_name in config_data.get('dq', {}):
+        if dq_name.startswith('std_dev') and 'columns' in config_data['dq'][dq_name]:
+            for column in config_data['dq'][dq_name]['columns']:
+                targets.append((table, replace_variables(column, variables)))
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the std_dev history of a directory of DQ configs")
+    parser.add_argument('config_dir', help="Directory of the DQ configs (YAML)")
+    parser.add_argument('--dry-run', action='store_true', help="Print the SQLs only")
+    parser.add_argument('--variables', nargs='*', default=[], help="Variables of the configs (name=value)")
+    args = parser.parse_args()
+
+    # Group the targets by database so each one is seeded by a single statement
+    groups = {}
+    for config_file in get_config_files(args.config_dir):
+        with open(config_file) as f:
+            config_data = yaml.load(f, Loader=yaml.FullLoader)
+        if not isinstance(config_data, dict):
+            continue
+        targets = get_targets(config_data, args.variables)
+        if len(targets) == 0:
+            continue
+        key = get_database_key(config_data)
+        if key not in groups:
+            groups[key] = {'config_file': config_file, 'targets': []}
+        for target in targets:
+            if target not in groups[key]['targets']:
+                groups[key]['targets'].append(target)
+
+    if len(groups) == 0:
+        raise Exception("No std_dev check found in {d}".format(d=args.config_dir))
+
+    for key, group in groups.items():
+        print("*** {db}: {n} columns from {t} tables ***".format(
+            db='.'.join(key),
+            n=len(group['targets']),
+            t=len(set([t for (t, c) in group['targets']])),
+            ))
+        detector = Detector(group['config_file'], is_dry_run=args.dry_run, variables=args.variables)
+        detector.run_setup_stddev(is_exit=False, targets=group['targets'])
+
+
+if __name__ == '__main__':
+    main()
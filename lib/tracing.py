@@ -0,0 +1,144 @@
+''' Nested timing spans of a run (run -> phase -> step/check -> SQL statement)
+
+Enabled by DQ_TRACE (file of the trace):
+    DQ_TRACE=/tmp/etl.jsonl   one JSON per span (appended)
+    DQ_TRACE=/tmp/etl.json    Chrome trace events (chrome://tracing, Perfetto), rewritten at the end of each run
+                              (keeps all the spans of the process: use .jsonl for the watcher service)
+'''
+import os
+import json
+import time
+import threading
+import itertools
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+
+# Span the next spans are nested in (copied to the threads of asyncio.to_thread)
+_current_span = contextvars.ContextVar('current_span', default=None)
+_tracer = None
+
+
+class Span:
+    ''' Timed operation with its attributes (ie: rows, query_id, retries) '''
+    def __init__(self, span_id, parent, category, name, attributes, start=None):
+        self.span_id = span_id
+        self.parent_id = parent.span_id if parent is not None else None
+        self.category = category
+        self.name = name
+        self.attributes = attributes
+        # Wall time for the export and monotonic time for the duration
+        self.start_time = time.time() if start is None else start
+        self.start = time.perf_counter()
+        self.duration = None
+        self.thread_id = threading.get_ident()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+
+class Tracer:
+    # Environment variable of the trace file (tracing is off without it)
+    TRACE_FILE_ENV = 'DQ_TRACE'
+
+    def __init__(self, trace_file=None):
+        self.trace_file = trace_file
+        self.spans = []
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.trace_file is not None
+
+    @contextmanager
+    def span(self, category, name, **attributes):
+        ''' Span of the block, nested in the current one (written to the trace file when a root span ends) '''
+        parent = _current_span.get()
+        span = Span(next(self.ids), parent, category, name, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as error:
+            span.set(error=str(error))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+            self.__add(span)
+            if parent is None:
+                self.export()
+
+    def add_span(self, category, name, duration, attributes):
+        ''' Span of an operation which just ended (ie: SQL statement timed by the query log) '''
+        if not self.enabled:
+            return
+        span = Span(next(self.ids), _current_span.get(), category, name, attributes, start=time.time() - duration)
+        span.duration = duration
+        self.__add(span)
+
+    def set_attribute(self, **attributes):
+        ''' Set attributes of the current span '''
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def __add(self, span):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.spans.append(span)
+
+    def export(self):
+        ''' Write the spans to the trace file (JSON lines or Chrome trace events) '''
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.trace_file.endswith('.jsonl'):
+                with open(self.trace_file, 'a') as f:
+                    for span in self.spans:
+                        f.write(json.dumps(self.__to_record(span), default=str) + "\n")
+                self.spans = []
+            else:
+                # Whole trace of the process (the viewers need a single JSON document)
+                tmp_file = "{f}.{pid}".format(f=self.trace_file, pid=os.getpid())
+                with open(tmp_file, 'w') as f:
+                    json.dump({'traceEvents': [self.__to_event(s) for s in self.spans]}, f, default=str)
+                os.replace(tmp_file, self.trace_file)
+
+    def __to_record(self, span):
+        return {
+            'span_id': span.span_id,
+            'parent_id': span.parent_id,
+            'category': span.category,
+            'name': span.name,
+            'start': datetime.fromtimestamp(span.start_time).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            'duration': round(span.duration, 6),
+            'pid': os.getpid(),
+            'thread_id': span.thread_id,
+            'attributes': span.attributes,
+            }
+
+    def __to_event(self, span):
+        # Complete event ('X') in microseconds
+        return {
+            'name': span.name,
+            'cat': span.category,
+            'ph': 'X',
+            'ts': int(span.start_time * 1000000),
+            'dur': int(span.duration * 1000000),
+            'pid': os.getpid(),
+            'tid': span.thread_id,
+            'args': dict(span.attributes, span_id=span.span_id, parent_id=span.parent_id),
+            }
+
+
+def get_tracer():
+    ''' Tracer of the process (from DQ_TRACE) '''
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(os.environ.get(Tracer.TRACE_FILE_ENV))
+    return _tracer
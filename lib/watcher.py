@@ -1,13 +1,35 @@
 import yaml
-import time
 import re
-from datetime import datetime
+import os
+import asyncio
+import sqlite3
+from datetime import timedelta
 from lib import Snowflake
+from lib.arrival import ArrivalProfile
+from lib.clock import SystemClock
+from lib.dialect import PrestoDialect
+from lib.readiness_cache import ReadinessCache
+from lib.tracing import get_tracer
 
 class Watcher:
-    def __init__(self, yaml_file, is_dry_run=False, is_unit_test=False, variables=[]):
+    # Partition columns of a presto_partitions dependency (today's year/month/day unless set in the config)
+    # and the attribute of the date for each one (unpadded numbers, ie: dl_partition_month = 9)
+    DEFAULT_PARTITIONS = {'dl_partition_year': 'year', 'dl_partition_month': 'month', 'dl_partition_day': 'day'}
+    # Types of the partition columns (values are numbers when they are digits only unless declared)
+    PARTITION_TYPES = ['number', 'string']
+    # Default shortest/longest wait between polls (in minutes)
+    MIN_SLEEP_TIME = 1
+    MAX_SLEEP_TIME = 30
+    # Growth of the wait between polls once the expected time is passed
+    BACKOFF_FACTOR = 2
+
+    def __init__(self, yaml_file, is_dry_run=False, is_unit_test=False, variables=[], db=None, presto=None,
+        clock=None):
         self.snowflake_tables = []
         self.snowflake_tasks = []
+        # Metadata only dependencies (INFORMATION_SCHEMA last_altered, Presto partitions)
+        self.snowflake_table_metadata = []
+        self.presto_partitions = []
         self.total_count = 0
         self.env = 'NON-PROD'
 
@@ -17,30 +39,67 @@ class Watcher:
         self.is_unit_test = is_unit_test
 
         if self.is_unit_test:
+            self.min_sleep_time = 5/60 # 5 secs
             self.sleep_time = 5/60 # 5 secs
             self.max_retry = 2
         else:
-            self.sleep_time = 30 # DEFAULT: 30 mins
-            self.max_retry = 3 # DEFAULT: num retries
+            self.min_sleep_time = self.MIN_SLEEP_TIME # DEFAULT: 1 min
+            self.sleep_time = self.MAX_SLEEP_TIME # DEFAULT: 30 mins (longest wait between polls)
+            self.max_retry = 3 # DEFAULT: num retries (deadline of sleep_time * max_retry)
         self.retry = 1 # keep track of retry number
+        # Total time to wait for (in minutes) and time of the day the dependencies are expected (HH:MM)
+        self.deadline = None
+        self.expected_time = None
+        self.backoff_factor = self.BACKOFF_FACTOR
+        # Predict the arrival of the dependencies from their history (ie: instead of expected_time)
+        self.predict_arrival = False
+        self.arrival_cache = None
+        # Unix socket of the watcher service (shared polling with the other jobs of the host)
+        self.daemon_socket = None
+        self.arrival_profile = None
+        # Verdicts shared with the other Watchers of the host (not for unit_test, always checked against the DB)
+        self.use_readiness_cache = not self.is_unit_test
+        self.readiness_file = None
+        self.readiness_ttl = ReadinessCache.WAITING_TTL
+        self.readiness_cache = None
+        # Latest time of each task/table seen so far ({'table': {name: time}, 'task': {name: time}})
+        self.check_status = {'table': {}, 'task': {}, 'metadata': {}, 'partition': {}}
+        # Tasks/tables still waiting and the ones already warned as late
+        self.waiting = set()
+        self.late_warned = set()
 
         # Variables replacement (ie: rundeck repo)
         self.variables = variables
+        # Time of the polls and sleeps (ie: VirtualClock to simulate the polling with a stand-in source)
+        self.clock = clock if clock is not None else SystemClock()
 
         # Load .yaml config
         self.__setup_config(yaml_file)
 
         # For Snowflake connection
-        # (Use environment variables to setup connection)
-        print("Snowflake Configuration:")
-        self.db = Snowflake()
+        # (Use environment variables to setup connection or the one from the caller, ie: LocalDB)
+        if db is not None:
+            print("Injected Configuration:")
+            self.db = db
+        else:
+            print("Snowflake Configuration:")
+            self.db = Snowflake()
         print("HOST = {host}".format(host=self.db.get_host()))
         print("USER = {user}".format(user=self.db.get_user()))
         print("")
         self.env = self.db.env
+        # Presto connection is only needed for the partitions (connected on the first check)
+        self.presto = presto
+        # Tag of all the queries of this Watcher (QUERY_TAG and query log)
+        self.query_tag = {'job': os.path.basename(yaml_file), 'step': 'watcher'}
+        self.__set_query_tag(self.db)
+        if self.presto is not None:
+            self.__set_query_tag(self.presto)
 
-        print("MAX RETRY  = {r}".format(r=self.max_retry))
-        print("SLEEP TIME = {r}".format(r=self.sleep_time))
+        print("SLEEP TIME = {r1} to {r2}".format(r1=self.min_sleep_time, r2=self.sleep_time))
+        print("DEADLINE   = {r}".format(r=self.deadline))
+        if self.expected_time is not None:
+            print("EXPECTED   = {r}".format(r=self.expected_time))
         print("\n")
 
         if self.is_dry_run:
@@ -70,11 +129,20 @@ class Watcher:
             if 'sleep_time' in self.config_data:
                 self.sleep_time = self.config_data['sleep_time']
 
-            # This is the valid sleep wait time (in minutes)
-            if self.sleep_time >= 15 and self.sleep_time <= 60:
+            # This is the valid (longest) sleep wait time (in minutes)
+            if self.sleep_time >= 1 and self.sleep_time <= 60:
                 pass
             else:
-                raise Exception("Sleep Time can only between 15 to 60 mins")
+                raise Exception("Sleep Time can only between 1 to 60 mins")
+
+            if 'min_sleep_time' in self.config_data:
+                self.min_sleep_time = self.config_data['min_sleep_time']
+
+            # This is the valid shortest sleep wait time (in minutes)
+            if self.min_sleep_time >= 1 and self.min_sleep_time <= self.sleep_time:
+                pass
+            else:
+                raise Exception("Min Sleep Time can only between 1 min and Sleep Time")
 
             if 'max_retry' in self.config_data:
                 self.max_retry = self.config_data['max_retry']
@@ -85,109 +153,603 @@ class Watcher:
             else:
                 raise Exception("Max Retry can only between 0 and 20 times")
 
+            if 'deadline' in self.config_data:
+                self.deadline = self.config_data['deadline']
+
+                # This is the valid total wait time (in minutes)
+                if self.deadline >= 0 and self.deadline <= 24 * 60:
+                    pass
+                else:
+                    raise Exception("Deadline can only between 0 and 1440 mins")
+
+            if 'expected_time' in self.config_data:
+                self.expected_time = str(self.config_data['expected_time'])
+                if re.match(r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$', self.expected_time) is None:
+                    raise Exception("Expected Time has to be HH:MM")
+
+            if 'backoff_factor' in self.config_data:
+                self.backoff_factor = self.config_data['backoff_factor']
+
+                if self.backoff_factor >= 1 and self.backoff_factor <= 10:
+                    pass
+                else:
+                    raise Exception("Backoff Factor can only between 1 and 10")
+
+        if 'predict_arrival' in self.config_data:
+            self.predict_arrival = self.config_data['predict_arrival']
+
+        if 'arrival_cache' in self.config_data:
+            self.arrival_cache = self.__replace_variables(self.config_data['arrival_cache'])
+
+        if 'daemon_socket' in self.config_data:
+            self.daemon_socket = self.__replace_variables(self.config_data['daemon_socket'])
+
+        if 'readiness_cache' in self.config_data:
+            # Either a file of the cache or true/false to enable/disable the default one
+            if isinstance(self.config_data['readiness_cache'], bool):
+                self.use_readiness_cache = self.config_data['readiness_cache']
+            else:
+                self.use_readiness_cache = True
+                self.readiness_file = self.__replace_variables(self.config_data['readiness_cache'])
+
+        if 'readiness_ttl' in self.config_data:
+            self.readiness_ttl = self.config_data['readiness_ttl']
+
+            # This is the valid reuse of a WAITING verdict (in seconds)
+            if self.readiness_ttl >= 0 and self.readiness_ttl <= 3600:
+                pass
+            else:
+                raise Exception("Readiness TTL can only between 0 and 3600 secs")
+
+        # Same total wait as the fixed interval polling if no deadline
+        if self.deadline is None:
+            self.deadline = self.sleep_time * self.max_retry
+
         if 'snowflake_tables' in self.config_data:
             self.snowflake_tables = self.config_data['snowflake_tables']
 
         if 'snowflake_tasks' in self.config_data:
             self.snowflake_tasks = self.config_data['snowflake_tasks']
 
-        self.total_count = len(self.snowflake_tables) + len(self.snowflake_tasks)
+        if 'snowflake_table_metadata' in self.config_data:
+            self.snowflake_table_metadata = [self.__replace_variables(t) for t in self.config_data['snowflake_table_metadata']]
+            for table in self.snowflake_table_metadata:
+                if len(table.split('.')) != 3:
+                    raise Exception("Snowflake Table Metadata has to be database.schema.table: '{t}'".format(t=table))
+
+        if 'presto_partitions' in self.config_data:
+            for partition in self.config_data['presto_partitions']:
+                # Either the table only (today's partition) or {table: ..., partition: {column: value}}
+                # with partition_format {column: strftime format} instead of the default year/month/day columns
+                # and partition_types {column: number|string}
+                if isinstance(partition, str):
+                    partition = {'table': partition}
+                table = self.__replace_variables(partition['table'])
+                if len(table.split('.')) != 3:
+                    raise Exception("Presto Partitions table has to be catalog.schema.table: '{t}'".format(t=table))
+                values = {c: self.__replace_variables(str(v)) for c, v in (partition.get('partition') or {}).items()}
+                types = {c: str(t).lower() for c, t in (partition.get('partition_types') or {}).items()}
+                for (column, column_type) in types.items():
+                    if column_type not in self.PARTITION_TYPES:
+                        raise Exception("Unknown type '{t}' of partition column {c} of '{table}' ({types})".format(
+                            t=column_type, c=column, table=table, types="|".join(self.PARTITION_TYPES)))
+                self.presto_partitions.append({'table': table, 'partition': values,
+                    'format': partition.get('partition_format'), 'types': types})
+
+        self.total_count = len(self.snowflake_tables) + len(self.snowflake_tasks) + \
+            len(self.snowflake_table_metadata) + len(self.presto_partitions)
 
     def run_watcher(self):
         ''' Main function to see if upstream tasks/tables are done '''
-        wait_count = 0
+        with get_tracer().span('run', self.query_tag['job']):
+            for _ in self.watch():
+                pass
+
+    async def run_watcher_async(self):
+        ''' Same as run_watcher() for an asyncio event loop (cancel the task to stop waiting) '''
+        with get_tracer().span('run', self.query_tag['job']):
+            async for _ in self.watch_async():
+                pass
+
+    def watch(self):
+        ''' Yield each task/table as soon as it is ready ({'type', 'name', 'end_time'}) until all of them are '''
+        start_time = self.clock.now()
+        deadline_time = start_time + timedelta(minutes=self.deadline)
+        # Number of polls since the expected time (for the backoff)
+        self.num_late_polls = 0
+        # Tasks/tables already yielded
+        released = set()
+
+        # Wait through the watcher service if it is running (otherwise poll from this job)
+        # (the service only watches the upload_history tables and task_log tasks)
+        if self.daemon_socket is not None and not self.is_dry_run and \
+                len(self.snowflake_table_metadata) + len(self.presto_partitions) == 0:
+            if (yield from self.__wait_for_daemon(released)):
+                return
+
+        if self.use_readiness_cache and not self.is_dry_run:
+            self.__setup_readiness_cache()
+
+        self.clock.sleep(self.__get_first_sleep(start_time, deadline_time))
+
+        while True:
+            self.__print_try(deadline_time)
+            today = self.clock.now().strftime("%Y-%m-%d")
+            # Poll span ends before the events are yielded (the consumer runs in between)
+            with get_tracer().span('poll', "try #{n}".format(n=self.retry)) as span:
+                for (check, args) in self.__get_checks(today):
+                    check(*args)
+                wait_count = self.__get_wait_count(today)
+                span.set(waiting=wait_count)
+            if self.arrival_profile is not None:
+                self.__warn_late(self.clock.now())
+            for event in self.__get_ready(released):
+                yield event
+
+            # Determine if we have the tasks/tables ready to proceed or not
+            # If not, continue to wait
+            if wait_count == 0:
+                self.__flush_query_log()
+                return
+            self.clock.sleep(self.__get_next_sleep(deadline_time, wait_count))
+
+    async def watch_async(self):
+        ''' Same as watch() without blocking the event loop (each source is queried in its own thread concurrently) '''
+        start_time = self.clock.now()
+        deadline_time = start_time + timedelta(minutes=self.deadline)
+        self.num_late_polls = 0
+        released = set()
+
+        if self.daemon_socket is not None and not self.is_dry_run and \
+                len(self.snowflake_table_metadata) + len(self.presto_partitions) == 0:
+            # Imported here as the watcher service uses the query helpers of this module
+            from lib.watcher_daemon import watch_events_async
+            print("[{t}] Wait through watcher service {s}\n".format(
+                t=self.clock.now().strftime("%Y-%m-%d %H:%M:%S"), s=self.daemon_socket))
+            try:
+                async for event in watch_events_async(self.snowflake_tables, self.snowflake_tasks, self.deadline,
+                        socket_path=self.daemon_socket):
+                    yield self.__release_daemon_event(event, released)
+                return
+            except OSError as error:
+                print("Watcher service is not available ({e}), poll from this job".format(e=error))
 
-        print("[{t}] Try #{n} (out of {m}):\n".format(
-            t=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        if self.use_readiness_cache and not self.is_dry_run:
+            self.__setup_readiness_cache()
+
+        await self.clock.sleep_async(await asyncio.to_thread(self.__get_first_sleep, start_time, deadline_time))
+
+        while True:
+            self.__print_try(deadline_time)
+            today = self.clock.now().strftime("%Y-%m-%d")
+            # Snowflake logs/metadata and Presto partitions at the same time (the drivers are blocking)
+            with get_tracer().span('poll', "try #{n}".format(n=self.retry)) as span:
+                await asyncio.gather(*[asyncio.to_thread(check, *args) for (check, args) in self.__get_checks(today)])
+                wait_count = self.__get_wait_count(today)
+                span.set(waiting=wait_count)
+            if self.arrival_profile is not None:
+                self.__warn_late(self.clock.now())
+            for event in self.__get_ready(released):
+                yield event
+
+            if wait_count == 0:
+                self.__flush_query_log()
+                return
+            await self.clock.sleep_async(self.__get_next_sleep(deadline_time, wait_count))
+
+    def __get_first_sleep(self, start_time, deadline_time):
+        ''' Seconds to sleep before the first poll '''
+        # First poll when the earliest dependency usually starts to arrive (p10 of today)
+        if self.predict_arrival and not self.is_dry_run:
+            self.__setup_arrival_profile(start_time)
+            first_poll = self.__get_predicted_time(start_time, self.__get_dependencies(), 'p10')
+            if first_poll is not None and first_poll > start_time:
+                sleep_time = min((first_poll - start_time).total_seconds(), (deadline_time - start_time).total_seconds())
+                print("[{t}] First poll at {p} (predicted arrival)\n".format(
+                    t=start_time.strftime("%Y-%m-%d %H:%M:%S"),
+                    p=(start_time + timedelta(seconds=sleep_time)).strftime("%Y-%m-%d %H:%M:%S"),
+                    ))
+                return sleep_time
+        return 0
+
+    def __print_try(self, deadline_time):
+        print("[{t}] Try #{n} (deadline {d}):\n".format(
+            t=self.clock.now().strftime("%Y-%m-%d %H:%M:%S"),
             n=self.retry,
-            m=self.max_retry,
+            d=deadline_time.strftime("%Y-%m-%d %H:%M:%S"),
         ))
 
-        # Check all published tables from snowflake upload_history table
-        if len(self.snowflake_tables) > 0:
-            table_filter = "','".join(self.snowflake_tables).lower()
+    def __get_next_sleep(self, deadline_time, wait_count):
+        ''' Seconds to sleep before the next poll (raise if the deadline is reached) '''
+        now = self.clock.now()
+        if now >= deadline_time:
+            print("\n")
+            self.__flush_query_log()
+            raise Exception("Deadline ({m} mins) is reached. Exit now.".format(m=self.deadline))
+
+        # Never sleep past the deadline (last poll right at the deadline)
+        sleep_time = min(self.__get_sleep_time(now), (deadline_time - now).total_seconds() / 60)
+        self.retry += 1
+        print("\n")
+        print("[{t}] Continue to wait...".format(
+            t=now.strftime("%Y-%m-%d %H:%M:%S"),
+            ))
+        print("{n1} Ready; {n2} Waiting; next poll in {s:.1f} mins".format(
+            n1=self.total_count-wait_count,
+            n2=wait_count,
+            s=sleep_time,
+            ))
+        print("\n")
+        return sleep_time*60
+
+    def __get_checks(self, today):
+        ''' Check of each source with the tasks/tables still waiting ([(function, args)], independent of each other) '''
+        checks = []
+        # Only the tasks/tables not ready yet
+        tables = [t.lower() for t in self.snowflake_tables if not is_ready(self.check_status, 'table', t.lower(), today)]
+        tasks = [t.lower() for t in self.snowflake_tasks if not is_ready(self.check_status, 'task', t.lower(), today)]
+        metadata = [t.lower() for t in self.snowflake_table_metadata
+            if not is_ready(self.check_status, 'metadata', t.lower(), today)]
+        if len(tables) + len(tasks) + len(metadata) > 0:
+            checks.append((self.__check_snowflake_table, (tables, tasks, metadata, today)))
+        partitions = [p for p in self.presto_partitions
+            if not is_ready(self.check_status, 'partition', p['table'].lower(), today)]
+        if len(partitions) > 0:
+            checks.append((self.__check_presto_partitions, (partitions,)))
+        return checks
+
+    def __setup_readiness_cache(self):
+        ''' Open the readiness cache of the host (poll without it if it is not available) '''
+        try:
+            # Verdicts are only shared between the Watchers of the same account and databases
+            source = "{h}|{u}|{d}".format(h=self.db.get_host(), u=self.db.get_user(), d=self.db.watcher_databases)
+            self.readiness_cache = ReadinessCache(cache_file=self.readiness_file, waiting_ttl=self.readiness_ttl,
+                source=source)
+        except (OSError, sqlite3.Error) as error:
+            print("Readiness cache is not available ({e}), poll without it".format(e=error))
+            self.readiness_cache = None
+
+    def __get_cached(self, tables, tasks, metadata, today):
+        ''' Take the verdicts of the other Watchers of the host and return the tables/tasks still to query '''
+        to_query = []
+        try:
+            for (check_type, names) in (('table', tables), ('task', tasks), ('metadata', metadata)):
+                cached = self.readiness_cache.get(check_type, names, today)
+                for (name, (end_time, _)) in cached.items():
+                    update_status(self.check_status, (check_type, name, end_time))
+                to_query.append([n for n in names if n not in cached])
+        except sqlite3.Error as error:
+            print("Readiness cache is not available ({e}), poll without it".format(e=error))
+            self.readiness_cache = None
+            return (tables, tasks, metadata)
+        return tuple(to_query)
+
+    def __put_cached(self, tables, tasks, metadata, today):
+        ''' Share the verdicts of the queried tables/tasks with the other Watchers of the host '''
+        try:
+            for (check_type, names) in (('table', tables), ('task', tasks), ('metadata', metadata)):
+                self.readiness_cache.put(check_type, {
+                    n: (self.check_status[check_type][n], is_ready(self.check_status, check_type, n, today))
+                    for n in names if self.check_status[check_type].get(n) is not None
+                    }, today)
+        except sqlite3.Error as error:
+            print("Readiness cache is not available ({e}), poll without it".format(e=error))
+            self.readiness_cache = None
+
+    def __wait_for_daemon(self, released):
+        ''' Yield the tasks/tables made ready by the watcher service (False if it is not available) '''
+        # Imported here as the watcher service uses the query helpers of this module
+        from lib.watcher_daemon import watch_events
+        print("[{t}] Wait through watcher service {s}\n".format(
+            t=self.clock.now().strftime("%Y-%m-%d %H:%M:%S"), s=self.daemon_socket))
+        try:
+            for event in watch_events(self.snowflake_tables, self.snowflake_tasks, self.deadline,
+                    socket_path=self.daemon_socket):
+                yield self.__release_daemon_event(event, released)
+        except OSError as error:
+            print("Watcher service is not available ({e}), poll from this job".format(e=error))
+            return False
+        return True
+
+    def __release_daemon_event(self, event, released):
+        ''' Keep the task/table made ready by the watcher service and return its event '''
+        print("{n} => READY [{t}]".format(n=event['name'], t=event['end_time']))
+        self.check_status[event['type']][event['name']] = event['end_time']
+        released.add((event['type'], event['name']))
+        return {'type': event['type'], 'name': event['name'], 'end_time': event['end_time']}
+
+    def __get_ready(self, released):
+        ''' Events of the tasks/tables ready and not yielded yet '''
+        today = self.clock.now().strftime("%Y-%m-%d")
+        events = []
+        for (check_type, name) in self.__get_all_dependencies():
+            if (check_type, name) not in released and is_ready(self.check_status, check_type, name, today):
+                released.add((check_type, name))
+                events.append({'type': check_type, 'name': name, 'end_time': self.check_status[check_type][name]})
+        return events
+
+    def __get_all_dependencies(self):
+        ''' (check_type, name) of all the tasks/tables '''
+        return [('table', t.lower()) for t in self.snowflake_tables] + \
+            [('task', t.lower()) for t in self.snowflake_tasks] + \
+            [('metadata', t.lower()) for t in self.snowflake_table_metadata] + \
+            [('partition', p['table'].lower()) for p in self.presto_partitions]
+
+    def get_dependencies(self):
+        ''' Names of all the tasks/tables to wait for (as in the events of watch()) '''
+        return [name for (_, name) in self.__get_all_dependencies()]
+
+    def __get_dependencies(self):
+        return [d.lower() for d in self.snowflake_tables + self.snowflake_tasks]
+
+    def __setup_arrival_profile(self, now):
+        ''' Load the arrival profiles from the local cache and rebuild the ones not built today '''
+        self.arrival_profile = ArrivalProfile(cache_file=self.arrival_cache)
+        stale = self.arrival_profile.get_stale(self.__get_dependencies(), now)
+        if len(stale) == 0:
+            return
+        # First arrival of each day (a dependency is ready from its first update of the day)
+        arrivals = []
+        days = ArrivalProfile.HISTORY_DAYS
+        tables = [d for d in self.snowflake_tables if d.lower() in stale]
+        if len(tables) > 0:
+            table_filter = "','".join(tables).lower()
             sql = f"""
-                SELECT LOWER(schema_name || '.' || table_name), MAX(last_update_time)::VARCHAR AS end_time
+                SELECT LOWER(schema_name || '.' || table_name), MIN(last_update_time)::VARCHAR AS arrival_time
                 FROM {self.db.shared_schema}.UPLOAD_HISTORY
-                WHERE last_update_time::date > current_date - 10
+                WHERE last_update_time >= DATEADD(day, -{days}, current_date)
                 AND db_name IN ({self.db.watcher_databases})
                 AND LOWER(schema_name || '.' || table_name) in ('{table_filter}')
-                GROUP BY 1
+                GROUP BY 1, last_update_time::date
             """
-            wait_count = self.__check_snowflake_table(sql, self.snowflake_tables, "snowflake tables", wait_count)
-
-        # Check job/task end time from snowflake task_log table
-        if len(self.snowflake_tasks) > 0:
-            task_filter = "','".join(self.snowflake_tasks).lower()
+            arrivals.extend(self.db.query(sql) or [])
+        tasks = [d for d in self.snowflake_tasks if d.lower() in stale]
+        if len(tasks) > 0:
+            task_filter = "','".join(tasks).lower()
             sql = f"""
-                SELECT LOWER(db_schema || '.' || task), MAX(log_time)::VARCHAR AS end_time
+                SELECT LOWER(db_schema || '.' || task), MIN(log_time)::VARCHAR AS arrival_time
                 FROM {self.db.shared_schema}.TASK_LOG
-                WHERE log_time::date > current_date - 10
+                WHERE log_time >= DATEADD(day, -{days}, current_date)
                 AND action = 'end'
                 AND LOWER(db_schema || '.' || task) in ('{task_filter}')
-                GROUP BY 1
+                GROUP BY 1, log_time::date
             """
-            wait_count = self.__check_snowflake_table(sql, self.snowflake_tasks, "snowflake tasks", wait_count)
-
-        # Determine if we have the tasks/tables ready to proceed or not
-        # If not, continue to wait
-        if wait_count > 0:
-            if self.retry < self.max_retry:
-                self.retry += 1
-                print("\n")
-                print("[{t}] Continue to wait...".format(
-                    t=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    ))
-                print("{n1} Ready; {n2} Waiting".format(
-                    n1=self.total_count-wait_count,
-                    n2=wait_count,
+            arrivals.extend(self.db.query(sql) or [])
+        # Today's arrival is not part of the profile (it is what we are waiting for)
+        today = now.strftime("%Y-%m-%d")
+        arrivals = [(d, t) for (d, t) in arrivals if t is not None and str(t)[:10] < today]
+        self.arrival_profile.fit(stale, arrivals, now).save()
+
+    def __get_predicted_time(self, now, dependencies, quantile):
+        ''' Predicted time of the earliest dependency (None without history) '''
+        if self.arrival_profile is None:
+            return None
+        predicted = [self.arrival_profile.predict(d, now, quantile) for d in dependencies]
+        predicted = [p for p in predicted if p is not None]
+        if len(predicted) == 0:
+            return None
+        return min(predicted)
+
+    def __warn_late(self, now):
+        ''' Warn once for each waiting task/table which is later than 90% of its past arrivals '''
+        for dependency in sorted(self.waiting - self.late_warned):
+            p90 = self.arrival_profile.predict(dependency, now, 'p90')
+            if p90 is not None and now > p90:
+                print("WARNING: '{d}' is late (90% arrived by {t}, median {m})".format(
+                    d=dependency,
+                    t=p90.strftime("%H:%M"),
+                    m=self.arrival_profile.predict(dependency, now, 'p50').strftime("%H:%M"),
                     ))
-                print("\n")
-                time.sleep(self.sleep_time*60)
-                self.run_watcher()
-            else:
-                print("\n")
-                raise Exception("Max retry ({m}) is reached. Exit now.".format(m=self.max_retry))
-        else:
+                self.late_warned.add(dependency)
+
+    def __get_expected_time(self, now):
+        ''' Today's expected time of the dependencies (None if not set) '''
+        if self.expected_time is None:
+            # Median arrival of the earliest waiting task/table if predicted
+            return self.__get_predicted_time(now, sorted(self.waiting), 'p50')
+        (hour, minute) = self.expected_time.split(':')
+        return now.replace(hour=int(hour), minute=int(minute), second=0, microsecond=0)
+
+    def __get_sleep_time(self, now):
+        ''' Minutes to sleep before the next poll '''
+        expected = self.__get_expected_time(now)
+        # Before the expected time: wake up right at the expected time (at most sleep_time)
+        if expected is not None and now < expected:
+            to_expected = (expected - now).total_seconds() / 60
+            return max(self.min_sleep_time, min(self.sleep_time, to_expected))
+        # After the expected time (or none): frequent polls first then exponential backoff
+        sleep_time = self.min_sleep_time * (self.backoff_factor ** self.num_late_polls)
+        self.num_late_polls += 1
+        # Still wake up at the median arrival of the next waiting task/table if predicted
+        if self.expected_time is None and self.arrival_profile is not None:
+            upcoming = [p for p in [self.arrival_profile.predict(d, now, 'p50') for d in sorted(self.waiting)]
+                if p is not None and p > now]
+            if len(upcoming) > 0:
+                sleep_time = min(sleep_time, max(self.min_sleep_time, (min(upcoming) - now).total_seconds() / 60))
+        return min(self.sleep_time, sleep_time)
+
+    def __check_snowflake_table(self, tables, tasks, metadata, today):
+        ''' Internal function to do the checking against Snowflake table (readiness cache of the host first) '''
+        if self.readiness_cache is not None:
+            (tables, tasks, metadata) = self.__get_cached(tables, tasks, metadata, today)
+            if len(tables) + len(tasks) + len(metadata) == 0:
+                print("-------------> (readiness cache)")
+                return
+
+        check_sql = get_check_sql(self.db, tables, tasks, self.check_status, metadata)
+        if self.is_dry_run:
+            print("*** From check_table() ***")
+            print(check_sql)
+            return
+
+        # Print check query for the first try only
+        if self.retry == 1:
+            print(check_sql)
+        result = self.db.query(check_sql)
+        print("------------->")
+        for row in result or []:
+            update_status(self.check_status, row)
+
+        if self.readiness_cache is not None:
+            self.__put_cached(tables, tasks, metadata, today)
+
+    def __check_presto_partitions(self, partitions):
+        ''' Check that the expected partition of each Presto table exists (partitions metadata only) '''
+        now = self.clock.now()
+        expected = []
+        for partition in partitions:
+            values = get_partition_values(now, partition['partition'], partition['format'])
+            expected.append((partition['table'].lower(), values, partition['types']))
+        check_sql = get_partition_sql(expected)
+        if self.is_dry_run:
+            print("*** From check_presto_partitions() ***")
+            print(check_sql)
             return
 
-    def __check_snowflake_table(self, check_sql, check_list, check_type, wait_count):
-        ''' Internal function to do the checking against Snowflake table '''
-        check_status = {}
-        today = datetime.now().strftime("%Y-%m-%d")
+        if self.presto is None:
+            # Imported here as the Presto client is only needed for this dependency type
+            from lib.presto import Presto
+            self.presto = Presto()
+            self.__set_query_tag(self.presto)
+        if self.retry == 1:
+            print(check_sql)
+        for (name, num_partitions) in self.presto.query(check_sql) or []:
+            # Ready from the time the partition is seen
+            if num_partitions > 0:
+                self.check_status['partition'][name] = now.strftime("%Y-%m-%d %H:%M:%S")
+
+    def __set_query_tag(self, db):
+        if hasattr(db, 'query_log'):
+            db.query_log.set_tag(**self.query_tag)
+
+    def __flush_query_log(self):
+        ''' Write the timing of the queries of the polls (with bytes scanned) '''
+        for db in (self.db, self.presto):
+            if db is not None and hasattr(db, 'flush_query_log'):
+                db.flush_query_log()
 
-        if len(check_list) > 0:
-            # Preset status for a list of tasks/tables
+    def __get_wait_count(self, today):
+        ''' Print the status of all the tasks/tables and return the number of the ones still waiting '''
+        wait_count = 0
+        self.waiting = set()
+        if self.is_dry_run:
+            return wait_count
+        for (check_type, check_list) in (('table', self.snowflake_tables), ('task', self.snowflake_tasks),
+                ('metadata', self.snowflake_table_metadata), ('partition', [p['table'] for p in self.presto_partitions])):
             for task in check_list:
                 task = task.lower()
-                if task not in check_status:
-                    check_status[task] = None
-
-            if self.is_dry_run:
-                print("*** From check_table() ***")
-                print(check_sql)
-            else:
-                # Print check query for the first try only
-                if self.retry == 1:
-                    print(check_sql)
-                result = self.db.query(check_sql)
-                print("------------->")
-                if len(result) > 0:
-                    for row in result:
-                        check_status[row[0]] = row[1]
-
-                    for task in check_status:
-                        # If task/table not found, raise an exception
-                        if check_status[task] is None:
-                            raise Exception("Unable to get time for '{t}'".format(t=task))
-                        status_date = (check_status[task])[:10]
-                        if status_date >= today:
-                            status = 'READY [{t}]'.format(t=check_status[task])
-                        else:
-                            status = 'WAITING [current={t1} not >= today={t2}]'.format(
-                                t1=status_date, t2=today)
-                            wait_count += 1
-                        print(task + " => " + status)
+                end_time = self.check_status[check_type].get(task)
+                # Partition not there yet (the table itself exists in Presto)
+                if end_time is None and check_type == 'partition':
+                    print(task + " => WAITING [partition of today not found]")
+                    wait_count += 1
+                    self.waiting.add(task)
+                    continue
+                # If task/table not found, raise an exception
+                if end_time is None:
+                    raise Exception("Unable to get time for '{t}'".format(t=task))
+                status_date = end_time[:10]
+                if status_date >= today:
+                    status = 'READY [{t}]'.format(t=end_time)
                 else:
-                    raise Exception("Unable to find all the {ct}!".format(ct=check_type))
+                    status = 'WAITING [current={t1} not >= today={t2}]'.format(
+                        t1=status_date, t2=today)
+                    wait_count += 1
+                    self.waiting.add(task)
+                print(task + " => " + status)
         return wait_count
+
+
+def is_ready(check_status, check_type, name, today):
+    ''' If the task/table has been updated today '''
+    end_time = check_status[check_type].get(name)
+    return end_time is not None and end_time[:10] >= today
+
+
+def update_status(check_status, row):
+    ''' Keep the latest time of a (check_type, name, end_time) row (no row if nothing new since the high-water mark) '''
+    (check_type, name, end_time) = row
+    if end_time is not None and (check_status[check_type].get(name) or '') < end_time:
+        check_status[check_type][name] = end_time
+
+
+def get_since_filter(check_status, check_type, names, column):
+    ''' Range of the time column to look at (sargable, no cast of the column) '''
+    seen = [check_status[check_type].get(n) for n in names]
+    if None in seen:
+        # Last 10 days for the first poll (same as last_update_time::date > current_date - 10)
+        return "{c} >= DATEADD(day, -9, current_date)".format(c=column)
+    # Only the updates after the ones already seen (high-water mark)
+    return "{c} > '{t}'".format(c=column, t=min(seen))
+
+
+def get_check_sql(db, tables, tasks, check_status, metadata=[]):
+    ''' Single query of the latest time of the tables (upload_history), tasks (task_log) and metadata tables '''
+    sqls = []
+    if len(tables) > 0:
+        table_filter = "','".join(tables)
+        sqls.append(f"""
+                SELECT 'table' AS check_type, LOWER(schema_name || '.' || table_name) AS name, MAX(last_update_time)::VARCHAR AS end_time
+                FROM {db.shared_schema}.UPLOAD_HISTORY
+                WHERE {get_since_filter(check_status, 'table', tables, 'last_update_time')}
+                AND db_name IN ({db.watcher_databases})
+                AND LOWER(schema_name || '.' || table_name) in ('{table_filter}')
+                GROUP BY 1, 2
+            """)
+    if len(tasks) > 0:
+        task_filter = "','".join(tasks)
+        sqls.append(f"""
+                SELECT 'task' AS check_type, LOWER(db_schema || '.' || task) AS name, MAX(log_time)::VARCHAR AS end_time
+                FROM {db.shared_schema}.TASK_LOG
+                WHERE {get_since_filter(check_status, 'task', tasks, 'log_time')}
+                AND action = 'end'
+                AND LOWER(db_schema || '.' || task) in ('{task_filter}')
+                GROUP BY 1, 2
+            """)
+    # INFORMATION_SCHEMA is per database (metadata only, no scan of the log tables)
+    databases = {}
+    for table in metadata:
+        databases.setdefault(table.split('.')[0], []).append(table)
+    for (database, database_tables) in sorted(databases.items()):
+        metadata_filter = "','".join(database_tables)
+        sqls.append(f"""
+                SELECT 'metadata' AS check_type, LOWER(table_catalog || '.' || table_schema || '.' || table_name) AS name, MAX(last_altered)::VARCHAR AS end_time
+                FROM {database}.INFORMATION_SCHEMA.TABLES
+                WHERE LOWER(table_catalog || '.' || table_schema || '.' || table_name) in ('{metadata_filter}')
+                GROUP BY 1, 2
+            """)
+    return "UNION ALL".join(sqls)
+
+
+def get_partition_values(now, values=None, formats=None):
+    ''' Expected partition {column: value} of a Presto table at a time (today's year/month/day by default) '''
+    if formats is None:
+        partition = {c: str(getattr(now, a)) for c, a in Watcher.DEFAULT_PARTITIONS.items()}
+    else:
+        partition = {c: now.strftime(f) for c, f in formats.items()}
+    partition.update(values or {})
+    return partition
+
+
+def get_partition_literal(value, column_type=None):
+    ''' SQL literal of a partition value (numbers unquoted so they can be compared to integer columns) '''
+    if column_type is None:
+        column_type = 'number' if value.isdigit() else 'string'
+    if column_type == 'number':
+        return value
+    return "'{v}'".format(v=value.replace("'", "''"))
+
+
+def get_partition_sql(partitions):
+    ''' Single query of the number of expected partitions of each Presto table (name, {column: value}, {column: type}) '''
+    dialect = PrestoDialect()
+    sqls = []
+    for (name, values, types) in partitions:
+        partition_filter = " AND ".join(["{c} = {v}".format(c=c, v=get_partition_literal(v, types.get(c)))
+            for c, v in values.items()])
+        sqls.append(f"""
+                SELECT '{name}' AS name, count(*) AS num_partitions
+                FROM {dialect.partitions_table(name)}
+                WHERE {partition_filter}
+            """)
+    return "UNION ALL".join(sqls)
@@ -0,0 +1,263 @@
+''' Watcher service polling the dependencies of many jobs once (requests over a local Unix socket)
+
+Usage:
+    python -m lib.watcher_daemon --socket /tmp/dq_watcher.sock --interval 60
+
+Protocol (one JSON per line):
+    request:  {"tables": ["schema.table"], "tasks": ["schema.task"], "deadline": 120}
+    events:   {"event": "ready", "type": "table", "name": "schema.table", "end_time": "..."}
+              {"event": "done"} | {"event": "timeout", "waiting": [...]} | {"event": "error", "message": "..."}
+'''
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import selectors
+from datetime import datetime, timedelta
+
+from lib import Snowflake
+from lib.watcher import is_ready, update_status, get_check_sql
+from lib.tracing import get_tracer
+
+# Default socket of the watcher service
+SOCKET_PATH = '/tmp/dq_watcher.sock'
+
+
+class WatchRequest:
+    ''' Dependencies a job is waiting for '''
+    def __init__(self, conn, tables, tasks, deadline):
+        self.conn = conn
+        self.buffer = b''
+        self.pending = set([('table', t.lower()) for t in tables] + [('task', t.lower()) for t in tasks])
+        self.deadline_time = datetime.now() + timedelta(minutes=deadline)
+
+
+class WatcherDaemon:
+    # Default wait between polls (in seconds)
+    POLL_INTERVAL = 60
+    # Default deadline of a request (in minutes)
+    DEFAULT_DEADLINE = 90
+
+    def __init__(self, socket_path=SOCKET_PATH, interval=POLL_INTERVAL, db=None):
+        self.socket_path = socket_path
+        self.interval = interval
+        self.db = db if db is not None else Snowflake()
+        if hasattr(self.db, 'query_log'):
+            self.db.query_log.set_tag(job='watcher_daemon', step='watcher')
+        # Latest time of each task/table seen so far (shared by all the requests)
+        self.check_status = {'table': {}, 'task': {}}
+        self.requests = []
+        self.next_poll = None
+        self.num_polls = 0
+        self.selector = selectors.DefaultSelector()
+
+    def run(self):
+        ''' Serve the watch requests until stopped '''
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen()
+        server.setblocking(False)
+        self.selector.register(server, selectors.EVENT_READ, None)
+        print("*** WATCHER DAEMON on {s} (poll every {i} secs) ***".format(s=self.socket_path, i=self.interval))
+        try:
+            while True:
+                self.serve_once()
+        finally:
+            self.selector.close()
+            server.close()
+            os.remove(self.socket_path)
+
+    def serve_once(self):
+        ''' Wait for requests until the next poll is due, then poll '''
+        timeout = None
+        if self.next_poll is not None:
+            timeout = max(0, self.next_poll - time.monotonic())
+        for key, _ in self.selector.select(timeout):
+            if key.data is None:
+                self.__accept(key.fileobj)
+            else:
+                self.__read(key.data)
+        if self.next_poll is not None and time.monotonic() >= self.next_poll:
+            self.poll()
+
+    def __accept(self, server):
+        (conn, _) = server.accept()
+        conn.setblocking(False)
+        request = WatchRequest(conn, [], [], 0)
+        self.selector.register(conn, selectors.EVENT_READ, request)
+
+    def __read(self, request):
+        try:
+            data = request.conn.recv(65536)
+        except OSError:
+            data = b''
+        if len(data) == 0:
+            # Client is gone (ie: job killed)
+            self.__close(request)
+            return
+        request.buffer += data
+        if b'\n' not in request.buffer:
+            return
+        line = request.buffer.split(b'\n')[0]
+        try:
+            message = json.loads(line)
+            tables = message.get('tables', [])
+            tasks = message.get('tasks', [])
+            deadline = message.get('deadline', self.DEFAULT_DEADLINE)
+        except (ValueError, AttributeError) as error:
+            self.__send(request, {'event': 'error', 'message': "Invalid request: {e}".format(e=error)})
+            self.__close(request)
+            return
+        watch = WatchRequest(request.conn, tables, tasks, deadline)
+        self.selector.modify(request.conn, selectors.EVENT_READ, watch)
+        self.requests.append(watch)
+        print("[{t}] Request for {n} dependencies ({r} requests)".format(
+            t=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), n=len(watch.pending), r=len(self.requests)))
+        # Dependencies not seen yet are checked right away (others are answered from the last poll)
+        if any([self.check_status[c].get(n) is None for (c, n) in watch.pending]):
+            self.next_poll = time.monotonic()
+        else:
+            self.notify([watch])
+            if self.next_poll is None and len(self.requests) > 0:
+                self.next_poll = time.monotonic() + self.interval
+
+    def __send(self, request, message):
+        try:
+            request.conn.setblocking(True)
+            request.conn.sendall((json.dumps(message) + "\n").encode())
+            request.conn.setblocking(False)
+        except OSError:
+            pass
+
+    def __close(self, request):
+        if request in self.requests:
+            self.requests.remove(request)
+        try:
+            self.selector.unregister(request.conn)
+        except (KeyError, ValueError):
+            pass
+        request.conn.close()
+
+    def poll(self):
+        ''' Check the distinct dependencies still waiting for any request in a single query '''
+        today = datetime.now().strftime("%Y-%m-%d")
+        pending = set()
+        for request in self.requests:
+            pending |= request.pending
+        waiting = [d for d in sorted(pending) if not is_ready(self.check_status, d[0], d[1], today)]
+        tables = [name for (check_type, name) in waiting if check_type == 'table']
+        tasks = [name for (check_type, name) in waiting if check_type == 'task']
+        error = None
+        if len(waiting) > 0:
+            # Root span of each poll (the trace is written as the service keeps running)
+            with get_tracer().span('poll', "poll #{n}".format(n=self.num_polls + 1), waiting=len(waiting)):
+                try:
+                    for row in self.db.query(get_check_sql(self.db, tables, tasks, self.check_status)) or []:
+                        update_status(self.check_status, row)
+                    self.num_polls += 1
+                except Exception as e:
+                    error = str(e)
+                if hasattr(self.db, 'flush_query_log'):
+                    self.db.flush_query_log()
+        print("[{t}] Poll #{n}: {w} waiting dependencies for {r} requests".format(
+            t=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), n=self.num_polls, w=len(waiting), r=len(self.requests)))
+        # A failed poll is retried on the next one (each request still waits until its own deadline)
+        if error is not None:
+            print("[{t}] Poll failed: {e}".format(t=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), e=error))
+        self.notify(self.requests, is_poll_failed=error is not None)
+        self.next_poll = time.monotonic() + self.interval if len(self.requests) > 0 else None
+
+    def notify(self, requests, is_poll_failed=False):
+        ''' Send the ready dependencies to each request and close the ones done, timed out or failed '''
+        today = datetime.now().strftime("%Y-%m-%d")
+        now = datetime.now()
+        for request in list(requests):
+            for (check_type, name) in sorted(request.pending):
+                if is_ready(self.check_status, check_type, name, today):
+                    self.__send(request, {'event': 'ready', 'type': check_type, 'name': name,
+                        'end_time': self.check_status[check_type][name]})
+                    request.pending.remove((check_type, name))
+                elif self.check_status[check_type].get(name) is None and not is_poll_failed:
+                    # Unknown dependency (not only missing because the poll failed)
+                    self.__send(request, {'event': 'error', 'message': "Unable to get time for '{t}'".format(t=name)})
+                    request.pending = set()
+                    self.__close(request)
+                    break
+            else:
+                if len(request.pending) == 0:
+                    self.__send(request, {'event': 'done'})
+                    self.__close(request)
+                elif now >= request.deadline_time:
+                    self.__send(request, {'event': 'timeout', 'waiting': [n for (c, n) in sorted(request.pending)]})
+                    self.__close(request)
+
+
+def wait_for(tables, tasks, deadline, socket_path=SOCKET_PATH, on_ready=None):
+    ''' Wait for the dependencies through the watcher service (on_ready is called for each ready dependency) '''
+    for message in watch_events(tables, tasks, deadline, socket_path):
+        if on_ready is not None:
+            on_ready(message)
+
+
+def watch_events(tables, tasks, deadline, socket_path=SOCKET_PATH):
+    ''' Yield the ready events of the dependencies from the watcher service until all of them are ready '''
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(socket_path)
+    try:
+        conn.sendall((json.dumps({'tables': tables, 'tasks': tasks, 'deadline': deadline}) + "\n").encode())
+        stream = conn.makefile('r')
+        for line in stream:
+            message = get_ready_event(json.loads(line), deadline)
+            if message is None:
+                return
+            yield message
+        raise Exception("Watcher daemon closed the connection")
+    finally:
+        conn.close()
+
+
+async def watch_events_async(tables, tasks, deadline, socket_path=SOCKET_PATH):
+    ''' Same as watch_events() without blocking the event loop '''
+    (reader, writer) = await asyncio.open_unix_connection(socket_path)
+    try:
+        writer.write((json.dumps({'tables': tables, 'tasks': tasks, 'deadline': deadline}) + "\n").encode())
+        await writer.drain()
+        while True:
+            line = await reader.readline()
+            if len(line) == 0:
+                raise Exception("Watcher daemon closed the connection")
+            message = get_ready_event(json.loads(line), deadline)
+            if message is None:
+                return
+            yield message
+    finally:
+        writer.close()
+
+
+def get_ready_event(message, deadline):
+    ''' Ready event of a message from the watcher service (None once all the dependencies are ready) '''
+    if message['event'] == 'ready':
+        return message
+    elif message['event'] == 'done':
+        return None
+    elif message['event'] == 'timeout':
+        raise Exception("Deadline ({m} mins) is reached while waiting for {w}".format(
+            m=deadline, w=", ".join(message['waiting'])))
+    else:
+        raise Exception(message.get('message', 'Watcher daemon error'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watcher service for the dependencies of many jobs")
+    parser.add_argument('--socket', default=SOCKET_PATH, help="Unix socket of the requests")
+    parser.add_argument('--interval', type=int, default=WatcherDaemon.POLL_INTERVAL, help="Seconds between polls")
+    args = parser.parse_args()
+    WatcherDaemon(socket_path=args.socket, interval=args.interval).run()
+
+
+if __name__ == '__main__':
+    main()